@@ -6,7 +6,9 @@ Fraud detection and analysis endpoints for corruption pattern identification
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+import httpx
 
+from app.config.settings import get_settings
 from app.schemas.base import (
     FraudAnalysisRequest, FraudAnalysisResponse, FraudAlert,
     ClaimResponse, ResponseSchema, RiskLevel
@@ -450,9 +452,16 @@ async def update_fraud_scoring_rules(
     """
     logger.info("Updating fraud scoring rules")
     
+    # Fraud engine service compiles and atomically swaps in the new rule plan
+    engine_url = get_settings().fraud_scoring_endpoint or "http://localhost:8080"
+    
     try:
-        # TODO: Validate and update scoring rules
-        # TODO: Apply new rules to future analyses
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.post(f"{engine_url}/scoring/update", json=scoring_rules)
+        if response.status_code == 400:
+            raise HTTPException(status_code=400, detail=response.json().get("detail", "Invalid scoring rules"))
+        response.raise_for_status()
+        plan = response.json()
         
         log_user_action(
             user_principal=user["principal"],
@@ -465,10 +474,13 @@ async def update_fraud_scoring_rules(
             message="Fraud scoring rules updated",
             data={
                 "updated_rules": scoring_rules,
+                "evaluation_plan": plan,
                 "effective_date": datetime.utcnow()
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating scoring rules: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update scoring rules")
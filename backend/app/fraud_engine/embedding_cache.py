@@ -0,0 +1,209 @@
+"""
+Content-Addressed Embedding Cache
+Embeddings keyed by model name plus a SHA-256 of the text, so each distinct
+claim document is embedded once per model across requests and restarts.
+
+Recent vectors are held in an in-memory LRU; every vector is also appended
+to a float32 matrix on disk (one per model) that is read back through a
+memory map. CachedEmbeddings wraps any LangChain embedder with the cache,
+and HashingEmbeddings is a deterministic local stand-in for tests.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # The cache and the stand-in embedder work without LangChain
+    Embeddings = object
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = os.environ.get("FRAUD_ENGINE_EMBEDDING_CACHE_DIR", "embedding_cache")
+
+# Vectors kept in memory per model
+EMBEDDING_CACHE_MEMORY_ITEMS = 4096
+
+def text_key(text: str, kind: str = "document") -> str:
+    """Cache key of a text; queries and documents may embed differently, so they are kept apart"""
+    return hashlib.sha256(f"{kind}\0{text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Embeddings of one model: an LRU over an append-only on-disk matrix
+    Row i of the matrix belongs to line i of the key file. Each vector row is
+    written before its key, and loading truncates both files to the rows that
+    have a complete key, so a crash mid-write loses only that write.
+    Assumes a single writing process.
+    """
+
+    def __init__(self, directory: str, model_name: str, memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.model_name = model_name
+        self.path = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.keys_path = os.path.join(self.path, "keys.txt")
+        self.memory_items = memory_items
+
+        self.memory: OrderedDict = OrderedDict()
+        self.rows: Dict[str, int] = {}
+        self.dimension: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path) as f:
+            header = f.readline()
+            fields = header.split()
+            if len(fields) != 2 or fields[0] != "dimension" or not header.endswith("\n"):
+                logger.warning(f"Ignoring embedding cache with bad header at {self.path}")
+                return
+            self.dimension = int(fields[1])
+            complete_rows = os.path.getsize(self.vectors_path) // self._row_bytes
+            keys = []
+            for line in f:
+                if len(keys) >= complete_rows or not line.endswith("\n"):
+                    break
+                keys.append(line[:-1])
+        self.rows = {key: row for row, key in enumerate(keys)}
+
+        # Drop what an interrupted put_many left behind: vector rows without
+        # keys (including a partial row) and keys without complete rows
+        self._truncate(len(keys), len(header) + sum(len(key) + 1 for key in keys))
+        logger.info(f"Embedding cache for {self.model_name}: {len(self.rows)} vectors on disk")
+
+    @property
+    def _row_bytes(self) -> int:
+        return 4 * self.dimension
+
+    def _truncate(self, n_rows: int, keys_bytes: int):
+        """Cut both files back to the first n_rows entries"""
+        for path, size in ((self.vectors_path, n_rows * self._row_bytes), (self.keys_path, keys_bytes)):
+            if os.path.getsize(path) > size:
+                os.truncate(path, size)
+        self._matrix = None
+
+    def _disk_row(self, row: int) -> np.ndarray:
+        if self._matrix is None or row >= len(self._matrix):
+            # Remap to cover rows appended since the last mapping
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(-1, self.dimension)
+        return np.array(self._matrix[row])
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return vector
+        row = self.rows.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+        vector = self._disk_row(row)
+        self._remember(key, vector)
+        self.hits += 1
+        return vector
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        """Store vectors (rows of a 2-D array) for keys not already cached"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            os.makedirs(self.path, exist_ok=True)
+            open(self.vectors_path, "wb").close()
+            with open(self.keys_path, "w") as f:
+                f.write(f"dimension {self.dimension}\n")
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"{self.model_name} embeddings have dimension {self.dimension}, got {vectors.shape[1]}")
+
+        new = list(OrderedDict((key, vector) for key, vector in zip(keys, vectors) if key not in self.rows).items())
+        if new:
+            # Row i of the matrix belongs to line i of the key file, so a failed
+            # write is rolled back rather than leaving the two files out of step
+            keys_bytes = os.path.getsize(self.keys_path)
+            try:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(np.stack([vector for _, vector in new]).tobytes())
+                with open(self.keys_path, "a") as f:
+                    f.writelines(f"{key}\n" for key, _ in new)
+            except Exception:
+                self._truncate(len(self.rows), keys_bytes)
+                raise
+            for key, _ in new:
+                self.rows[key] = len(self.rows)
+        for key, vector in zip(keys, vectors):
+            self._remember(key, vector)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_memory": len(self.memory), "on_disk": len(self.rows), "hits": self.hits, "misses": self.misses}
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings that only call the wrapped embedder for texts never seen before"""
+
+    def __init__(self, embedder, model_name: str, directory: str = EMBEDDING_CACHE_DIR,
+                 memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.embedder = embedder
+        self.cache = EmbeddingCache(directory, model_name, memory_items)
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [text_key(text, kind) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+
+        # Embed each distinct missing text once
+        missing = OrderedDict((key, text) for key, text, vector in zip(keys, texts, vectors) if vector is None)
+        if missing:
+            if kind == "query":
+                computed = [self.embedder.embed_query(text) for text in missing.values()]
+            else:
+                computed = self.embedder.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), np.asarray(computed, dtype=np.float32))
+            vectors = [vector if vector is not None else self.cache.get(key) for key, vector in zip(keys, vectors)]
+
+        # Values are the stored float32 vectors, so hits and misses return identical embeddings
+        return [vector.tolist() for vector in vectors]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic local embedder (hashed character trigrams) standing in for a model in tests"""
+
+    def __init__(self, dimension: int = 64):
+        self.dimension = dimension
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        padded = f"  {text.lower()}  "
+        for i in range(len(padded) - 2):
+            digest = hashlib.md5(padded[i:i + 3].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
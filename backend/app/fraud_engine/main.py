@@ -25,9 +25,12 @@ async def lifespan(app: FastAPI):
     """Initialize fraud detection service on startup"""
     logger.info("🤖 CorruptGuard Fraud Detection Engine Starting...")
     app.state.fraud_service = FraudDetectionService()
+    app.state.fraud_service.ml_detector.warm_up()
     logger.info(f"📊 Loaded {len(app.state.fraud_service.rules_engine.historical_claims)} historical claims")
     logger.info("✅ Fraud Detection Engine Ready")
     yield
+    app.state.fraud_service.ml_detector.save_index()
+    await app.state.fraud_service.http_client.aclose()
 
 app = FastAPI(
     title="H.E.L.I.X. Fraud Detection Engine",
@@ -82,7 +85,10 @@ class FraudDetectionService:
         self.rules_engine = FraudRulesEngine()
         self.ml_detector = MLFraudDetector()
         self.icp_canister_url = "http://localhost:8000"  # Backend API endpoint
+        # Shared keep-alive connection pool for backend score updates and alerts
+        self.http_client = httpx.AsyncClient(timeout=5.0)
         self._initialize_demo_data()
+        self.ml_detector.build_index(self.rules_engine.historical_claims)
     
     def _initialize_demo_data(self):
         """Initialize with realistic demo data"""
@@ -163,6 +169,7 @@ class FraudDetectionService:
             )
             
             self.rules_engine.add_historical_claim(claim_data)
+            self.ml_detector.add_claims([claim_data])
             await self._update_backend_fraud_score(final_fraud_score)
             
             if final_score >= 70:
@@ -183,11 +190,10 @@ class FraudDetectionService:
     async def _update_backend_fraud_score(self, fraud_score: FinalFraudScore):
         """Send fraud score back to backend API"""
         try:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    f"{self.icp_canister_url}/api/v1/fraud/update-score",
-                    json=fraud_score.model_dump(), timeout=5.0
-                )
+            await self.http_client.post(
+                f"{self.icp_canister_url}/api/v1/fraud/update-score",
+                json=fraud_score.model_dump()
+            )
         except Exception as e:
             logger.error(f"Failed to update backend fraud score: {str(e)}")
     
@@ -200,11 +206,10 @@ class FraudDetectionService:
             timestamp=datetime.now()
         )
         try:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    f"{self.icp_canister_url}/api/v1/fraud/alert",
-                    json=alert.model_dump(), timeout=5.0
-                )
+            await self.http_client.post(
+                f"{self.icp_canister_url}/api/v1/fraud/alert",
+                json=alert.model_dump()
+            )
             logger.warning(f"🚨 FRAUD ALERT: Claim {claim_data.claim_id} - {fraud_score.score}/100 risk")
         except Exception as e:
             logger.error(f"Failed to generate fraud alert: {str(e)}")
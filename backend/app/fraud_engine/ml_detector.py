@@ -4,31 +4,229 @@ Utilizes a dynamic RAG pipeline that incorporates rule-based analysis for hybrid
 """
 
 import logging
-from typing import List, Dict, Any
+import os
+import re
+import shutil
+from typing import List, Dict, Any, Iterable, Optional
+
+import httpx
 
 # LangChain and vector store components
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain.prompts import PromptTemplate
-from langchain.schema import Document
-from langchain.schema.output_parser import StrOutputParser
-from langchain.schema.runnable import RunnablePassthrough
+from langchain_core.prompts import PromptTemplate
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnablePassthrough
+
+from embedding_cache import CachedEmbeddings, EMBEDDING_CACHE_DIR
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "nomic-embed-text"
+
+# Persistent FAISS index of historical claims, reused across restarts
+VECTOR_INDEX_DIR = os.environ.get("FRAUD_ENGINE_VECTOR_INDEX_DIR", "vector_index")
+
+# Newly indexed claims between index saves
+INDEX_SAVE_INTERVAL = 100
+
+LLM_MODEL = "gemma3:4b"
+
+# How long the Ollama server keeps the models loaded after a request, as an
+# Ollama duration ("30m", "1h30m", "-1" to keep forever; bare numbers are seconds)
+OLLAMA_KEEP_ALIVE = os.environ.get("FRAUD_ENGINE_OLLAMA_KEEP_ALIVE", "30m")
+
+_DURATION_UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001, "": 1}
+
+# Pooled keep-alive connections to the Ollama server, shared by every call of one client
+OLLAMA_CLIENT_KWARGS = {
+    "limits": httpx.Limits(max_connections=16, max_keepalive_connections=8, keepalive_expiry=300)
+}
+
+RAG_PROMPT = PromptTemplate(
+    template="""
+**System Prompt:** You are an expert fraud detection analyst.
+Your task is to provide a final, definitive fraud probability score.
+You will be given a primary analysis from a rules-based system and retrieved historical context.
+Your response MUST be a single floating-point number between 0.0 and 1.0.
+
+**Primary Analysis (from Rules Engine):**
+- Flags Triggered: {rules_flags}
+- Reasoning: {rules_reasoning}
+
+**Retrieved Context (Similar Historical Claims):**
+{context}
+
+**New Claim to Analyze:**
+- Amount: {amount}
+- Area: {area}
+
+**Analysis Task:**
+Synthesize all the information to produce a final fraud score.
+If the rule flags are severe (e.g., DUPLICATE_INVOICE, SHELL_COMPANY), the score should be high (>0.85).
+If the claim amount is a major outlier compared to the context, that also increases the score.
+If the rule flags are minor and the amount is consistent with the context, the score should be lower.
+
+**Final Fraud Probability Score:**
+""",
+    input_variables=["context", "rules_flags", "rules_reasoning", "amount", "area"]
+)
+
+def keep_alive_seconds(duration: str) -> int:
+    """Whole seconds of an Ollama keep-alive duration (OllamaEmbeddings only accepts integers)"""
+    text = str(duration).strip()
+    sign = -1 if text.startswith("-") else 1
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s|)", text.lstrip("+-"))
+    if not parts or "".join(number + unit for number, unit in parts) != text.lstrip("+-"):
+        raise ValueError(f"Invalid Ollama keep-alive duration: {duration!r}")
+    return sign * int(sum(float(number) * _DURATION_UNIT_SECONDS[unit] for number, unit in parts))
+
+def _claim_document(claim: Any) -> Document:
+    return Document(
+        page_content=f"Historical claim in '{claim.area}' for amount {claim.amount:.2f}",
+        metadata={'claim_id': claim.claim_id, 'area': claim.area, 'amount': claim.amount}
+    )
+
 class MLFraudDetector:
     """
     ML fraud detector that builds a dynamic RAG pipeline, enhanced with inputs
     from a traditional rules engine for more accurate, context-aware predictions.
     """
 
-    def __init__(self):
+    def __init__(self, index_dir: str = VECTOR_INDEX_DIR, embedder=None, embedding_cache_dir: str = EMBEDDING_CACHE_DIR,
+                 llm=None):
+        """
+        embedder, llm: LangChain embeddings and LLM to use instead of Ollama
+        (e.g. local stand-ins in tests)
+        """
         self.model_version = "gemma-ollama-hybrid-rag-1.0"
+        self.index_dir = index_dir
+        # Every claim document and query is embedded through the content-addressed cache
+        embedder = embedder or OllamaEmbeddings(
+            model=EMBEDDING_MODEL, keep_alive=keep_alive_seconds(OLLAMA_KEEP_ALIVE), client_kwargs=OLLAMA_CLIENT_KWARGS
+        )
+        model_name = getattr(embedder, "model", type(embedder).__name__)
+        self.embeddings = CachedEmbeddings(embedder, model_name, embedding_cache_dir)
+        
+        # One long-lived index: built or loaded once, then appended per ingested claim
+        self.vector_store: Optional[FAISS] = None
+        self.indexed_claim_ids = set()
+        self.unsaved_claims = 0
+        
+        # One LLM client and chain for the detector's lifetime; each call only runs it
+        self.llm = llm or OllamaLLM(model=LLM_MODEL, keep_alive=OLLAMA_KEEP_ALIVE, client_kwargs=OLLAMA_CLIENT_KWARGS)
+        self.chain = (
+            RunnablePassthrough.assign(context=self._retrieve_context)
+            | RAG_PROMPT
+            | self.llm
+            | StrOutputParser()
+        )
         logger.info(f"MLFraudDetector initialized with version: {self.model_version}")
+    
+    def warm_up(self) -> bool:
+        """
+        Load both models on the Ollama server and open pooled connections
+        before the first claim arrives; returns False if Ollama is unreachable
+        """
+        try:
+            self.embeddings.embedder.embed_query("warm-up")
+            self.llm.invoke("Reply with 0.0")
+            logger.info("Ollama models warmed up")
+            return True
+        except Exception as e:
+            logger.warning(f"Ollama warm-up failed: {e}. Is Ollama running?")
+            return False
+    
+    # ------------------------------------------------------------------
+    # Vector index
+    # ------------------------------------------------------------------
+    
+    def load_index(self) -> bool:
+        """Load the saved vector index; returns False when there is none or it is unreadable"""
+        if not os.path.exists(os.path.join(self.index_dir, "index.faiss")):
+            return False
+        try:
+            # The index was written by this service, so its pickled docstore is trusted
+            self.vector_store = FAISS.load_local(self.index_dir, self.embeddings, allow_dangerous_deserialization=True)
+            self.indexed_claim_ids = {
+                self.vector_store.docstore.search(doc_id).metadata.get('claim_id')
+                for doc_id in self.vector_store.index_to_docstore_id.values()
+            }
+            self.unsaved_claims = 0
+            logger.info(f"Loaded vector index with {len(self.indexed_claim_ids)} claims from {self.index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load vector index: {e}")
+            self.vector_store = None
+            self.indexed_claim_ids = set()
+            return False
+    
+    def save_index(self):
+        """
+        Write the vector index to disk
+        It is written next to the live copy and renamed into place, so a crash
+        mid-save leaves the previous index loadable.
+        """
+        if self.vector_store is None:
+            return
+        try:
+            staging = f"{self.index_dir}.tmp"
+            shutil.rmtree(staging, ignore_errors=True)
+            self.vector_store.save_local(staging)
+            previous = f"{self.index_dir}.old"
+            shutil.rmtree(previous, ignore_errors=True)
+            if os.path.exists(self.index_dir):
+                os.replace(self.index_dir, previous)
+            os.replace(staging, self.index_dir)
+            shutil.rmtree(previous, ignore_errors=True)
+            self.unsaved_claims = 0
+        except Exception as e:
+            logger.error(f"Failed to save vector index: {e}")
+    
+    def add_claims(self, claims: Iterable[Any]) -> int:
+        """Embed and index claims not already in the index; returns how many were added"""
+        new_claims = []
+        for claim in claims:
+            if claim.claim_id not in self.indexed_claim_ids:
+                self.indexed_claim_ids.add(claim.claim_id)
+                new_claims.append(claim)
+        if not new_claims:
+            return 0
+        
+        try:
+            documents = [_claim_document(c) for c in new_claims]
+            ids = [str(c.claim_id) for c in new_claims]
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_documents(documents, self.embeddings, ids=ids)
+            else:
+                self.vector_store.add_documents(documents, ids=ids)
+        except Exception as e:
+            self.indexed_claim_ids.difference_update(c.claim_id for c in new_claims)
+            logger.error(f"Failed to index claims: {e}")
+            return 0
+        
+        self.unsaved_claims += len(new_claims)
+        if self.unsaved_claims >= INDEX_SAVE_INTERVAL:
+            self.save_index()
+        return len(new_claims)
+    
+    def build_index(self, historical_data: List[Any]):
+        """Load the saved index, then index any historical claims it is missing"""
+        self.load_index()
+        added = self.add_claims(historical_data)
+        if added:
+            logger.info(f"Indexed {added} historical claims")
+            self.save_index()
+
+    def _retrieve_context(self, chain_input: Dict[str, Any]):
+        if not chain_input["use_rag"] or self.vector_store is None:
+            return "Context from RAG is not available."
+        return self.vector_store.similarity_search(f"Claim in {chain_input['area']}")
 
     def predict_fraud_probability(self, claim: Any, historical_data: List[Any], rules_analysis: Any, use_rag: bool = False) -> float:
         """
-        Builds a dynamic RAG pipeline that considers both historical data and the
+        Runs the hybrid pipeline, which considers both historical data and the
         output of a rules engine to predict fraud probability.
         The RAG functionality can be disabled.
         """
@@ -36,69 +234,23 @@ class MLFraudDetector:
             logger.warning("No historical data for RAG context, but RAG is enabled.")
 
         try:
-            logger.info(f"Building dynamic hybrid pipeline for claim {claim.claim_id} (RAG enabled: {use_rag})...")
-
-            # 1. Create documents for the vector store from historical claims
-            documents = [
-                Document(
-                    page_content=f"Historical claim in '{c.area}' for amount {c.amount:.2f}",
-                    metadata={'area': c.area, 'amount': c.amount}
-                ) for c in historical_data
-            ]
-            retriever = FAISS.from_documents(documents, OllamaEmbeddings(model="nomic-embed-text")).as_retriever() if documents else None
-
-            # 2. Define the enhanced RAG prompt template
-            template = """
-            **System Prompt:** You are an expert fraud detection analyst.
-            Your task is to provide a final, definitive fraud probability score.
-            You will be given a primary analysis from a rules-based system and retrieved historical context.
-            Your response MUST be a single floating-point number between 0.0 and 1.0.
-
-            **Primary Analysis (from Rules Engine):**
-            - Flags Triggered: {rules_flags}
-            - Reasoning: {rules_reasoning}
-
-            **Retrieved Context (Similar Historical Claims):**
-            {context}
-
-            **New Claim to Analyze:**
-            - Amount: {amount}
-            - Area: {area}
-
-            **Analysis Task:**
-            Synthesize all the information to produce a final fraud score.
-            If the rule flags are severe (e.g., DUPLICATE_INVOICE, SHELL_COMPANY), the score should be high (>0.85).
-            If the claim amount is a major outlier compared to the context, that also increases the score.
-            If the rule flags are minor and the amount is consistent with the context, the score should be lower.
-
-            **Final Fraud Probability Score:**
-            """
-            prompt = PromptTemplate(template=template, input_variables=["context", "rules_flags", "rules_reasoning", "amount", "area"])
-
-            # 3. Initialize the Ollama LLM
-            llm = OllamaLLM(model="gemma3:4b")
-
-            # 4. Prepare the input for the chain
+            logger.info(f"Running hybrid pipeline for claim {claim.claim_id} (RAG enabled: {use_rag})...")
+
+            # 1. Index the history on first use if the service has not built it yet
+            if use_rag and self.vector_store is None and historical_data:
+                self.add_claims(historical_data)
+
+            # 2. Run the long-lived chain; retrieval happens inside it only when RAG is on
             chain_input = {
                 "amount": claim.amount,
                 "area": claim.area,
                 "rules_flags": ", ".join(rules_analysis.flags) if rules_analysis.flags else "None",
-                "rules_reasoning": rules_analysis.reasoning
+                "rules_reasoning": rules_analysis.reasoning,
+                "use_rag": use_rag
             }
-
-            # 5. Build and invoke the LCEL RAG chain
-            rag_chain = (
-                RunnablePassthrough.assign(
-                    context=lambda x: retriever.invoke(f"Claim in {x['area']}") if use_rag and retriever else "Context from RAG is not available."
-                )
-                | prompt
-                | llm
-                | StrOutputParser()
-            )
-
-            response_text = rag_chain.invoke(chain_input)
+            response_text = self.chain.invoke(chain_input)
             
-            # 6. Parse the response
+            # 3. Parse the response
             fraud_prob = float(response_text.strip())
             logger.info(f"Hybrid pipeline executed. Predicted fraud probability: {fraud_prob}")
             
@@ -112,5 +264,6 @@ class MLFraudDetector:
         """Get basic model statistics."""
         return {
             "model_version": self.model_version,
-            "pipeline_strategy": "Dynamic Hybrid (Rules + LLM) with optional RAG, built on-demand",
+            "pipeline_strategy": "Dynamic Hybrid (Rules + LLM) with optional RAG over a persistent vector index",
+            "indexed_claims": len(self.indexed_claim_ids),
         }
@@ -0,0 +1,69 @@
+"""
+Unit tests for the content-addressed embedding cache
+Run with: pytest test_embedding_cache.py (no Ollama or LangChain needed)
+"""
+
+import numpy as np
+
+from embedding_cache import CachedEmbeddings, HashingEmbeddings
+
+def test_each_distinct_text_is_embedded_once(tmp_path):
+    embedder = HashingEmbeddings()
+    embeddings = CachedEmbeddings(embedder, "hashing", str(tmp_path))
+
+    texts = ["claim in 'North' for 100.00", "claim in 'South' for 250.00", "claim in 'North' for 100.00"]
+    first = embeddings.embed_documents(texts)
+    assert embedder.texts_embedded == 2
+    assert first[0] == first[2]
+
+    assert embeddings.embed_documents(texts[:2]) == first[:2]
+    assert embedder.texts_embedded == 2
+
+    # Queries are cached separately from documents
+    query = embeddings.embed_query(texts[0])
+    assert embedder.texts_embedded == 3
+    np.testing.assert_allclose(query, first[0], rtol=1e-6)
+
+def test_cache_survives_restart_and_memory_eviction(tmp_path):
+    texts = [f"claim {i}" for i in range(20)]
+    expected = CachedEmbeddings(HashingEmbeddings(), "hashing", str(tmp_path)).embed_documents(texts)
+
+    # A fresh process with a tiny LRU reads every vector back from the memory-mapped matrix
+    embedder = HashingEmbeddings()
+    embeddings = CachedEmbeddings(embedder, "hashing", str(tmp_path), memory_items=4)
+    assert embeddings.embed_documents(texts) == expected
+    assert embedder.texts_embedded == 0
+    assert embeddings.cache.stats()["in_memory"] == 4
+
+    # Vectors appended after the matrix was mapped are still readable
+    embeddings.embed_documents(["claim 20"])
+    embeddings.embed_documents([f"claim {i}" for i in range(5)])
+    assert embeddings.embed_documents(["claim 20"]) == HashingEmbeddings().embed_documents(["claim 20"])
+    assert embedder.texts_embedded == 1
+
+    # Another model never sees these vectors
+    other = HashingEmbeddings()
+    CachedEmbeddings(other, "other-model", str(tmp_path)).embed_documents(texts[:3])
+    assert other.texts_embedded == 3
+
+def test_crash_between_vector_and_key_writes_is_recovered(tmp_path):
+    embeddings = CachedEmbeddings(HashingEmbeddings(), "hashing", str(tmp_path))
+    embeddings.embed_documents(["a", "b"])
+    cache = embeddings.cache
+
+    # A crash after writing vectors but before their keys: one orphan row and half a row
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.ones(cache.dimension, dtype=np.float32).tobytes())
+        f.write(np.ones(cache.dimension // 2, dtype=np.float32).tobytes())
+    with open(cache.keys_path, "a") as f:
+        f.write("partial-key")
+
+    embedder = HashingEmbeddings()
+    reloaded = CachedEmbeddings(embedder, "hashing", str(tmp_path))
+    assert reloaded.cache.stats()["on_disk"] == 2
+    reloaded.embed_documents(["c"])
+
+    expected = HashingEmbeddings().embed_documents(["a", "b", "c"])
+    restarted = CachedEmbeddings(HashingEmbeddings(), "hashing", str(tmp_path))
+    assert restarted.embed_documents(["a", "b", "c"]) == expected
+    assert embedder.texts_embedded == 1
@@ -0,0 +1,47 @@
+"""
+Unit tests for the RAG fraud detector
+Run with: pytest test_ml_detector.py (needs the LangChain packages, not a running Ollama)
+"""
+
+from types import SimpleNamespace
+
+from langchain_core.language_models import FakeListLLM
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
+
+import ml_detector
+from embedding_cache import HashingEmbeddings
+from ml_detector import MLFraudDetector, keep_alive_seconds
+
+def _claim(claim_id, area="Road Construction", amount=100000.0):
+    return SimpleNamespace(claim_id=claim_id, area=area, amount=amount)
+
+def test_default_detector_builds_ollama_clients(tmp_path):
+    detector = MLFraudDetector(index_dir=str(tmp_path / "index"), embedding_cache_dir=str(tmp_path / "cache"))
+
+    embedder = detector.embeddings.embedder
+    assert isinstance(embedder, OllamaEmbeddings)
+    assert isinstance(detector.llm, OllamaLLM)
+    # OllamaEmbeddings only accepts whole seconds; OllamaLLM takes the duration string
+    assert embedder.keep_alive == keep_alive_seconds(ml_detector.OLLAMA_KEEP_ALIVE)
+    assert detector.llm.keep_alive == ml_detector.OLLAMA_KEEP_ALIVE
+
+def test_keep_alive_seconds():
+    assert keep_alive_seconds("30m") == 1800
+    assert keep_alive_seconds("1h30m") == 5400
+    assert keep_alive_seconds("300") == 300
+    assert keep_alive_seconds("-1") == -1
+
+def test_chain_is_reused_across_predictions(tmp_path):
+    llm = FakeListLLM(responses=["0.9", "0.2"])
+    detector = MLFraudDetector(
+        index_dir=str(tmp_path / "index"), embedder=HashingEmbeddings(),
+        embedding_cache_dir=str(tmp_path / "cache"), llm=llm
+    )
+    history = [_claim(i, amount=100000.0 + i) for i in range(10)]
+    detector.build_index(history)
+    chain = detector.chain
+
+    rules = SimpleNamespace(flags=["DUPLICATE_INVOICE"], reasoning="Duplicate invoice hash")
+    assert detector.predict_fraud_probability(_claim(10), history, rules, use_rag=True) == 0.9
+    assert detector.predict_fraud_probability(_claim(11), history, rules) == 0.2
+    assert detector.chain is chain
@@ -81,6 +81,11 @@ class FraudRule:
 class FraudRulesEngine:
     """Advanced rule-based fraud detection for government procurement"""
     
+    # Claims older than the longest rule window are dropped from history
+    HISTORY_RETENTION_DAYS = 730
+    # Additions between retention sweeps, so eviction stays amortized O(1)
+    EVICTION_INTERVAL = 1000
+    
     def __init__(self):
         self.rules = {
             "cost_variance": FraudRule("Cost Variance", 0.25, 0.30, "Cost significantly different from similar projects"),
@@ -95,9 +100,31 @@ class FraudRulesEngine:
             "duplicate_invoice": FraudRule("Duplicate Invoice", 0.30, 0.95, "Similar invoice hash detected"),
         }
         self.historical_claims = []
+        self.claim_ids = set()
         self.vendor_stats = {}
         self._init_demo_data()
     
+    def add_historical_claim(self, claim: ClaimData) -> bool:
+        """Add a claim to history once per claim_id, periodically evicting expired claims"""
+        if claim.claim_id in self.claim_ids:
+            return False
+        
+        self.historical_claims.append(claim)
+        self.claim_ids.add(claim.claim_id)
+        if len(self.historical_claims) % self.EVICTION_INTERVAL == 0:
+            self.evict_expired()
+        return True
+    
+    def evict_expired(self) -> int:
+        """Drop claims older than the retention horizon; returns the number evicted"""
+        cutoff = datetime.now() - timedelta(days=self.HISTORY_RETENTION_DAYS)
+        retained = [c for c in self.historical_claims if c.timestamp > cutoff]
+        evicted = len(self.historical_claims) - len(retained)
+        if evicted:
+            self.historical_claims = retained
+            self.claim_ids = {c.claim_id for c in retained}
+        return evicted
+    
     def _init_demo_data(self):
         """Initialize with synthetic training data"""
         import random
@@ -117,7 +144,7 @@ class FraudRulesEngine:
                 area=random.choice(areas),
                 timestamp=base_date + timedelta(days=random.randint(0, 365))
             )
-            self.historical_claims.append(claim)
+            self.add_historical_claim(claim)
         
         # Initialize vendor statistics
         for vendor in vendors:
@@ -371,18 +398,49 @@ class MLFraudDetector:
         avg_amount = np.mean([c.amount for c in vendor_history])
         return claim.amount / avg_amount if avg_amount > 0 else 1.0
     
+    def prepare_feature_matrix(self, historical_data: List[ClaimData]) -> np.ndarray:
+        """
+        Feature rows for every historical claim, equal to calling
+        prepare_features(claim, historical_data) per claim, in one grouped pass
+        """
+        amounts = np.array([c.amount for c in historical_data], dtype=float)
+        timestamps = np.array([c.timestamp for c in historical_data], dtype="datetime64[us]")
+        vendor_ids, vendor_codes = np.unique([c.vendor_id for c in historical_data], return_inverse=True)
+        
+        # Group rows by vendor, keeping history order within each vendor
+        order = np.argsort(vendor_codes, kind="stable")
+        bounds = np.searchsorted(vendor_codes[order], np.arange(len(vendor_ids) + 1))
+        counts = np.diff(bounds)
+        vendor_means = np.empty(len(vendor_ids))
+        vendor_last = np.empty(len(vendor_ids), dtype="datetime64[us]")
+        for code in range(len(vendor_ids)):
+            rows = order[bounds[code]:bounds[code + 1]]
+            vendor_means[code] = np.mean(amounts[rows])
+            vendor_last[code] = timestamps[rows].max()
+        
+        avg_amount = vendor_means[vendor_codes]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amount_vs_avg = np.where(avg_amount > 0, amounts / avg_amount, 1.0)
+        days_since_last = (timestamps - vendor_last[vendor_codes]) // np.timedelta64(1, "D")
+        weekdays = (timestamps.astype("datetime64[D]").astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        
+        columns = {
+            'amount': amounts,
+            'vendor_submissions_count': counts[vendor_codes],
+            'time_since_last_submission': np.minimum(days_since_last, 365.0),
+            'amount_vs_avg': amount_vs_avg,
+            'approval_speed': np.ones(len(amounts)),
+            'weekend_submission': (weekdays >= 5).astype(float)
+        }
+        return np.column_stack([np.asarray(columns[col], dtype=float) for col in self.feature_columns])
+    
     def train(self, historical_data: List[ClaimData], fraud_labels: List[bool]):
         """Train the ML model on historical data"""
         if len(historical_data) < 10:
             logger.warning("Insufficient training data for ML model")
             return
         
-        features_list = []
-        for claim in historical_data:
-            features = self.prepare_features(claim, historical_data)
-            features_list.append(features.flatten())
-        
-        X = np.array(features_list)
+        X = self.prepare_feature_matrix(historical_data)
         X_scaled = self.scaler.fit_transform(X)
         
         self.model = IsolationForest(
@@ -713,8 +771,8 @@ async def analyze_claim_endpoint(
         
         fraud_score = await fraud_service.analyze_claim(claim_data)
         
-        # Add to historical data for future analysis
-        fraud_service.rules_engine.historical_claims.append(claim_data)
+        # Add to historical data for future analysis (ignored if already recorded)
+        fraud_service.rules_engine.add_historical_claim(claim_data)
         
         # Persist result
         try:
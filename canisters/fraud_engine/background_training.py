@@ -0,0 +1,137 @@
+"""
+Background Model Retraining
+Fits new ML models in a separate process against a frozen copy of engine
+history, then hot-swaps the resulting model artifact into the serving detector
+
+The event loop only copies the claim store into shared memory and, once the
+worker has written and published the artifact, memory-maps it back in;
+fitting never runs on the serving process.
+"""
+
+import asyncio
+import inspect
+import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional
+
+from claim_store import ClaimStore
+from ml_detector import MLFraudDetector
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for the status endpoint
+RETRAIN_JOBS_TO_KEEP = 20
+
+def _train_worker(store_descriptor: Dict, fraud_labels: List[bool], model_dir: str) -> Optional[str]:
+    """Train on shared history in a worker process; returns the published artifact name"""
+    ml_detector = MLFraudDetector(model_dir=model_dir)
+    ml_detector.train(ClaimStore.attach(store_descriptor), fraud_labels)
+    return ml_detector.artifact if ml_detector.is_trained else None
+
+@dataclass
+class RetrainJob:
+    job_id: str
+    claim_count: int
+    status: str = "queued"  # queued, running, succeeded or failed
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    artifact: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> Dict:
+        job = asdict(self)
+        for key in ("created_at", "started_at", "finished_at"):
+            job[key] = job[key].isoformat() if job[key] else None
+        return job
+
+class BackgroundTrainer:
+    """
+    Runs at most one retraining job at a time for an ML detector
+    start() must be called from the event loop thread that mutates the claim
+    store, so the shared copy is consistent. on_swap runs on the event loop
+    after new models are live (e.g. to write a snapshot); it may be a coroutine
+    function, which is awaited, so slow work can be handed off to a thread.
+    Jobs run in spawned processes, which re-run the __main__ module's top level:
+    create the trainer (and the service it serves) at startup, not on import.
+    """
+
+    def __init__(self, ml_detector: MLFraudDetector, on_swap: Optional[Callable[[], Any]] = None):
+        self.ml_detector = ml_detector
+        self.on_swap = on_swap
+        self.jobs: Dict[str, RetrainJob] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def active_job(self) -> Optional[RetrainJob]:
+        return next((job for job in self.jobs.values() if job.active), None)
+
+    def start(self, historical_claims: ClaimStore, fraud_labels: List[bool]) -> RetrainJob:
+        """Queue a retrain on a copy of historical_claims, or return the job already running"""
+        active = self.active_job
+        if active is not None:
+            return active
+
+        blocks, descriptor = historical_claims.share()
+        job = RetrainJob(job_id=uuid.uuid4().hex[:12], claim_count=len(historical_claims))
+        self.jobs[job.job_id] = job
+        self.tasks[job.job_id] = asyncio.get_running_loop().create_task(
+            self._run(job, blocks, descriptor, list(fraud_labels))
+        )
+        self._prune_jobs()
+        return job
+
+    async def wait(self, job_id: str) -> RetrainJob:
+        """Wait for a job to finish and return it"""
+        task = self.tasks.get(job_id)
+        if task is not None:
+            await task
+        return self.jobs[job_id]
+
+    async def _run(self, job: RetrainJob, blocks, descriptor: Dict, fraud_labels: List[bool]):
+        loop = asyncio.get_running_loop()
+        try:
+            job.status = "running"
+            job.started_at = datetime.now()
+            # Spawned workers start clean instead of inheriting the service's event loop and threads
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                artifact = await loop.run_in_executor(
+                    executor, _train_worker, descriptor, fraud_labels, self.ml_detector.model_dir
+                )
+            if artifact is None:
+                raise RuntimeError("training did not produce a model")
+            if not self.ml_detector.load_models() or self.ml_detector.artifact != artifact:
+                raise RuntimeError(f"could not swap in model artifact {artifact}")
+
+            job.artifact = artifact
+            job.status = "succeeded"
+            logger.info(f"Retrain job {job.job_id} swapped in {artifact} ({job.claim_count} claims)")
+            if self.on_swap is not None:
+                swapped = self.on_swap()
+                if inspect.isawaitable(swapped):
+                    await swapped
+
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Retrain job {job.job_id} failed: {e}")
+
+        finally:
+            job.finished_at = datetime.now()
+            self.tasks.pop(job.job_id, None)
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def _prune_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:-RETRAIN_JOBS_TO_KEEP]:
+            del self.jobs[job_id]
@@ -0,0 +1,472 @@
+"""
+Incremental Indexes over Historical Claims
+Keeps rule lookups against claim history sub-linear as the claim book grows
+"""
+
+import numpy as np
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+SECONDS_PER_DAY = 86400.0
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch_seconds(timestamp: datetime) -> float:
+    """Convert a naive claim timestamp to seconds since the epoch"""
+    return (timestamp - EPOCH).total_seconds()
+
+Moments = Tuple[int, float, float]  # (count, mean, M2: sum of squared deviations from the mean)
+
+EMPTY_MOMENTS: Moments = (0, 0.0, 0.0)
+
+def merge_moments(a: Moments, b: Moments) -> Moments:
+    """Combine the moments of two disjoint sets (Chan et al.'s parallel update)"""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    if n_a == 0:
+        return b
+    if n_b == 0:
+        return a
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+def _moments_of(values: np.ndarray) -> Moments:
+    if len(values) == 0:
+        return EMPTY_MOMENTS
+    mean = float(values.mean())
+    return len(values), mean, float(((values - mean) ** 2).sum())
+
+class _AmountBucket:
+    """
+    Claims from one time bucket, kept amount-sorted under a segment tree of
+    (count, mean, M2) nodes, so the moments of any amount range merge from
+    O(log n) nodes without the cancellation of raw sums of squares
+    """
+
+    MERGE_THRESHOLD = 256  # Pending inserts before re-sorting the bucket
+
+    __slots__ = ("amounts", "times", "levels", "pending", "max_time")
+
+    def __init__(self):
+        self.amounts = np.empty(0)
+        self.times = np.empty(0)
+        self.levels: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self.pending: List[Tuple[float, float]] = []  # Unsorted recent inserts
+        self.max_time = float("-inf")
+
+    def add(self, amount: float, time: float):
+        self.pending.append((amount, time))
+        self.max_time = max(self.max_time, time)
+        if len(self.pending) >= self.MERGE_THRESHOLD:
+            self._merge_pending()
+
+    @classmethod
+    def from_arrays(cls, amounts: np.ndarray, times: np.ndarray) -> "_AmountBucket":
+        bucket = cls()
+        bucket._index(amounts, times)
+        return bucket
+
+    def _merge_pending(self):
+        """Fold pending inserts into the sorted arrays and rebuild the segment tree"""
+        pending = np.array(self.pending, dtype=float)
+        self.pending = []
+        self._index(np.concatenate((self.amounts, pending[:, 0])), np.concatenate((self.times, pending[:, 1])))
+
+    def _index(self, amounts: np.ndarray, times: np.ndarray):
+        order = np.argsort(amounts, kind="stable")
+        self.amounts = amounts[order]
+        self.times = times[order]
+        if len(times):
+            self.max_time = max(self.max_time, float(times.max()))
+
+        # Level 0 holds single amounts; each level above merges adjacent pairs
+        counts, means, m2 = np.ones(len(self.amounts)), self.amounts, np.zeros(len(self.amounts))
+        self.levels = [(counts, means, m2)]
+        while len(counts) > 1:
+            if len(counts) % 2:
+                counts, means, m2 = (np.append(a, 0.0) for a in (counts, means, m2))
+            n_a, n_b = counts[0::2], counts[1::2]
+            n = n_a + n_b
+            delta = means[1::2] - means[0::2]
+            weight = np.divide(n_b, n, out=np.zeros_like(n), where=n > 0)
+            means = means[0::2] + delta * weight
+            m2 = m2[0::2] + m2[1::2] + delta * delta * n_a * weight
+            counts = n
+            self.levels.append((counts, means, m2))
+
+    def _sorted_moments(self, lo: int, hi: int) -> Moments:
+        """Moments of sorted amounts[lo:hi], merged from the segment tree"""
+        moments = EMPTY_MOMENTS
+        for counts, means, m2 in self.levels:
+            if lo >= hi:
+                break
+            if lo % 2:
+                moments = merge_moments(moments, (int(counts[lo]), float(means[lo]), float(m2[lo])))
+                lo += 1
+            if hi % 2:
+                hi -= 1
+                moments = merge_moments(moments, (int(counts[hi]), float(means[hi]), float(m2[hi])))
+            lo //= 2
+            hi //= 2
+        return moments
+
+    def range_stats(self, low: float, high: float, cutoff: float = None) -> Moments:
+        """
+        Moments of amounts strictly inside (low, high), restricted to claims
+        newer than cutoff when one is given
+        """
+        lo = int(np.searchsorted(self.amounts, low, side="right"))
+        hi = int(np.searchsorted(self.amounts, high, side="left"))
+
+        if cutoff is None:
+            moments = self._sorted_moments(lo, hi)
+        else:
+            # Bucket straddles the horizon: filter its amount range by time
+            moments = _moments_of(self.amounts[lo:hi][self.times[lo:hi] > cutoff])
+
+        for amount, time in self.pending:
+            if low < amount < high and (cutoff is None or time > cutoff):
+                moments = merge_moments(moments, (1, amount, 0.0))
+
+        return moments
+
+class AreaAmountIndex:
+    """
+    Per-area rolling index for cost-variance scoring
+    Claims are grouped into fixed-width time buckets; each bucket is amount-sorted
+    with mergeable (count, mean, M2) accumulators. Buckets that fall
+    entirely behind the horizon are dropped as they expire.
+    """
+
+    def __init__(self, horizon_days: int = 730, bucket_days: int = 30):
+        self.horizon_seconds = horizon_days * SECONDS_PER_DAY
+        self.bucket_seconds = bucket_days * SECONDS_PER_DAY
+        self.areas: Dict[str, Dict[int, _AmountBucket]] = {}
+
+    @classmethod
+    def from_columns(cls, area_codes: np.ndarray, area_values: List[str], amounts: np.ndarray,
+                     timestamps: np.ndarray, horizon_days: int = 730, bucket_days: int = 30) -> "AreaAmountIndex":
+        """Index existing history, sorting each (area, bucket) group once"""
+        index = cls(horizon_days, bucket_days)
+        times = timestamps.astype("datetime64[us]").astype(np.int64) / 1e6
+        keys = np.floor_divide(times, index.bucket_seconds).astype(np.int64)
+        order = np.lexsort((keys, area_codes))
+        group_starts = np.flatnonzero(np.diff(area_codes[order]) | np.diff(keys[order])) + 1
+        for group in np.split(order, group_starts) if len(order) else []:
+            area = area_values[area_codes[group[0]]]
+            key = int(keys[group[0]])
+            index.areas.setdefault(area, {})[key] = _AmountBucket.from_arrays(amounts[group], times[group])
+        return index
+
+    def add(self, area: str, amount: float, timestamp: datetime):
+        """Index a claim amount under its area and time bucket"""
+        time = to_epoch_seconds(timestamp)
+        buckets = self.areas.setdefault(area, {})
+        key = int(time // self.bucket_seconds)
+
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _AmountBucket()
+        bucket.add(amount, time)
+
+    def expire(self, now: datetime):
+        """Drop every bucket that lies entirely past the horizon"""
+        cutoff = to_epoch_seconds(now) - self.horizon_seconds
+        for area, buckets in list(self.areas.items()):
+            for key in [k for k, b in buckets.items() if b.max_time <= cutoff]:
+                del buckets[key]
+            if not buckets:
+                del self.areas[area]
+
+    def window_stats(self, area: str, low: float, high: float, now: datetime) -> Tuple[int, float, float]:
+        """
+        Count, mean and population std of amounts in (low, high) for claims
+        in this area submitted within the horizon before now
+        """
+        buckets = self.areas.get(area)
+        if not buckets:
+            return 0, 0.0, 0.0
+
+        cutoff = to_epoch_seconds(now) - self.horizon_seconds
+        moments = EMPTY_MOMENTS
+
+        for key in list(buckets):
+            bucket = buckets[key]
+            if bucket.max_time <= cutoff:
+                del buckets[key]  # Entirely past the horizon
+                continue
+
+            straddles = key * self.bucket_seconds <= cutoff
+            moments = merge_moments(moments, bucket.range_stats(low, high, cutoff if straddles else None))
+
+        count, mean, m2 = moments
+        if count == 0:
+            return 0, 0.0, 0.0
+        return count, mean, float(np.sqrt(max(m2, 0.0) / count))
+
+class InvoiceHashIndex:
+    """Exact invoice hash lookups: invoice_hash -> claim_ids"""
+
+    def __init__(self):
+        self.claim_ids: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_columns(cls, invoice_hashes: List[str], claim_ids: np.ndarray) -> "InvoiceHashIndex":
+        index = cls()
+        claim_ids = np.asarray(claim_ids).tolist()
+        index.claim_ids = {invoice_hash: [claim_id] for invoice_hash, claim_id in zip(invoice_hashes, claim_ids)}
+        if len(index.claim_ids) < len(invoice_hashes):
+            # Some hashes repeat: collect every claim_id in row order
+            index.claim_ids = {}
+            for invoice_hash, claim_id in zip(invoice_hashes, claim_ids):
+                index.claim_ids.setdefault(invoice_hash, []).append(claim_id)
+        return index
+
+    def add(self, invoice_hash: str, claim_id: int):
+        self.claim_ids.setdefault(invoice_hash, []).append(claim_id)
+
+    def remove(self, invoice_hash: str, claim_id: int):
+        claim_ids = self.claim_ids.get(invoice_hash)
+        if claim_ids and claim_id in claim_ids:
+            claim_ids.remove(claim_id)
+            if not claim_ids:
+                del self.claim_ids[invoice_hash]
+
+    def has_duplicate(self, invoice_hash: str, claim_id: int) -> bool:
+        """Whether a different claim was submitted with the same invoice hash"""
+        return any(other != claim_id for other in self.claim_ids.get(invoice_hash, ()))
+
+class VendorAmountIndex:
+    """
+    Per-vendor claims kept amount-sorted so amount-range lookups are a bisect
+    Each vendor holds a sorted amounts list and an aligned (timestamp, claim_id) list
+    """
+
+    def __init__(self):
+        self.vendors: Dict[str, Tuple[List[float], List[Tuple[datetime, int]]]] = {}
+
+    @classmethod
+    def from_columns(cls, vendor_codes: np.ndarray, vendor_values: List[str], amounts: np.ndarray,
+                     timestamps: np.ndarray, claim_ids: np.ndarray) -> "VendorAmountIndex":
+        """Index existing history; equal amounts keep row order, as repeated add() would"""
+        index = cls()
+        order = np.lexsort((amounts, vendor_codes))
+        codes = vendor_codes[order]
+        starts = np.flatnonzero(np.diff(codes)) + 1
+        sorted_amounts = amounts[order].tolist()
+        entries = list(zip(timestamps[order].astype("datetime64[us]").tolist(), claim_ids[order].tolist()))
+        for lo, hi in zip([0] + starts.tolist(), starts.tolist() + [len(order)]):
+            if lo < hi:
+                index.vendors[vendor_values[codes[lo]]] = (sorted_amounts[lo:hi], entries[lo:hi])
+        return index
+
+    def add(self, vendor_id: str, amount: float, timestamp: datetime, claim_id: int):
+        amounts, entries = self.vendors.setdefault(vendor_id, ([], []))
+        position = bisect_right(amounts, amount)
+        amounts.insert(position, amount)
+        entries.insert(position, (timestamp, claim_id))
+
+    def remove(self, vendor_id: str, amount: float, claim_id: int):
+        if vendor_id not in self.vendors:
+            return
+
+        amounts, entries = self.vendors[vendor_id]
+        position = bisect_left(amounts, amount)
+        while position < len(amounts) and amounts[position] == amount:
+            if entries[position][1] == claim_id:
+                del amounts[position]
+                del entries[position]
+                break
+            position += 1
+
+        if not amounts:
+            del self.vendors[vendor_id]
+
+    def in_range(self, vendor_id: str, low: float, high: float) -> List[Tuple[float, datetime, int]]:
+        """(amount, timestamp, claim_id) for the vendor's claims with amount strictly inside (low, high)"""
+        if vendor_id not in self.vendors:
+            return []
+
+        amounts, entries = self.vendors[vendor_id]
+        lo = bisect_right(amounts, low)
+        hi = bisect_left(amounts, high)
+        return [(amounts[i],) + entries[i] for i in range(lo, hi)]
+
+# Polynomial hash packing a band's characters into one uint64 table key (FNV-64 prime)
+BAND_KEY_MULTIPLIER = 1099511628211
+
+_UINT64_MASK = (1 << 64) - 1
+
+def _string_matrix(strings: List[str], length: int) -> np.ndarray:
+    """Code points of equal-length strings as a (rows, length) matrix"""
+    return np.array(strings, dtype=f"U{length}").view(np.uint32).reshape(len(strings), length)
+
+class _HashBands:
+    """
+    Invoice hashes of one length with a lookup table per position band
+    Each band's table is a sorted array of (band key, position) pairs covering
+    the hashes up to `indexed`, plus a dict for hashes added since; the dict is
+    folded into the arrays (one vectorized pass) once it outgrows a fraction of
+    them. Removed hashes are tombstoned and dropped when the tables are compacted.
+    """
+
+    MERGE_MIN = 256
+    MERGE_FRACTION = 0.25
+
+    def __init__(self, length: int, layout: List[List[int]]):
+        self.length = length
+        self.layout = layout
+        self.hashes: List[Optional[str]] = []
+        self.claim_ids: List[Optional[int]] = []
+        self.keys = [np.empty(0, dtype=np.uint64) for _ in layout]
+        self.positions = [np.empty(0, dtype=np.int64) for _ in layout]
+        self.recent: List[Dict[int, List[int]]] = [{} for _ in layout]
+        self.indexed = 0
+        self.removed = 0
+
+    def band_keys(self, invoice_hash: str) -> List[int]:
+        keys = []
+        for band in self.layout:
+            key = 0
+            for i in band:
+                key = (key * BAND_KEY_MULTIPLIER + ord(invoice_hash[i])) & _UINT64_MASK
+            keys.append(key)
+        return keys
+
+    def candidates(self, band: int, key: int) -> List[int]:
+        """Positions whose band key equals key (hash collisions included; callers verify)"""
+        keys = self.keys[band]
+        lo = np.searchsorted(keys, np.uint64(key), side="left")
+        hi = np.searchsorted(keys, np.uint64(key), side="right")
+        found = self.positions[band][lo:hi].tolist()
+        return found + self.recent[band].get(key, []) if self.recent[band] else found
+
+    def add(self, invoice_hash: str, claim_id: int):
+        position = len(self.hashes)
+        self.hashes.append(invoice_hash)
+        self.claim_ids.append(claim_id)
+        for table, key in zip(self.recent, self.band_keys(invoice_hash)):
+            table.setdefault(key, []).append(position)
+        if position + 1 - self.indexed > max(self.MERGE_MIN, self.MERGE_FRACTION * self.indexed):
+            self.reindex()
+
+    def remove(self, invoice_hash: str, claim_id: int):
+        key = self.band_keys(invoice_hash)[0]
+        for position in self.candidates(0, key):
+            if self.claim_ids[position] == claim_id and self.hashes[position] == invoice_hash:
+                break
+        else:
+            return
+
+        self.hashes[position] = None
+        self.claim_ids[position] = None
+        self.removed += 1
+        if self.removed * 2 > len(self.hashes):
+            # Compact: drop tombstones, which renumbers positions
+            live = [(h, c) for h, c in zip(self.hashes, self.claim_ids) if h is not None]
+            self.hashes = [h for h, _ in live]
+            self.claim_ids = [c for _, c in live]
+            self.removed = 0
+            self.reindex()
+
+    def reindex(self):
+        """Rebuild every band's sorted table over the live hashes"""
+        positions = np.array([p for p, h in enumerate(self.hashes) if h is not None], dtype=np.int64)
+        columns = np.ascontiguousarray(_string_matrix([self.hashes[p] for p in positions], self.length).T)
+        multiplier = np.uint64(BAND_KEY_MULTIPLIER)
+        for b, band in enumerate(self.layout):
+            keys = np.zeros(len(positions), dtype=np.uint64)
+            for i in band:
+                keys *= multiplier  # uint64 arithmetic wraps like the scalar key
+                keys += columns[i]
+            order = np.argsort(keys)
+            self.keys[b] = keys[order]
+            self.positions[b] = positions[order]
+        self.recent = [{} for _ in self.layout]
+        self.indexed = len(self.hashes)
+
+class InvoiceSimilarityIndex:
+    """
+    Near-duplicate invoice hash search by positional (Hamming) similarity
+    Hashes of each length are split into strided position bands. Two hashes that
+    match on more than `threshold` of their positions differ in at most k places,
+    so by the pigeonhole principle they agree exactly on at least one of k + 1
+    bands: probing each band's table finds every match without a corpus scan.
+    Configuring fewer bands trades recall for speed, as longer band keys
+    produce fewer candidates to verify.
+    """
+
+    def __init__(self, threshold: float = 0.8, bands: Optional[int] = None):
+        self.threshold = threshold
+        self.bands = bands
+        self.lengths: Dict[int, _HashBands] = {}
+
+    @classmethod
+    def from_columns(cls, invoice_hashes: List[str], claim_ids: np.ndarray, threshold: float = 0.8,
+                     bands: Optional[int] = None) -> "InvoiceSimilarityIndex":
+        """Index existing history in one vectorized pass per hash length"""
+        index = cls(threshold, bands)
+        lengths = np.fromiter(map(len, invoice_hashes), dtype=np.int64, count=len(invoice_hashes))
+        claim_ids = np.asarray(claim_ids).tolist()
+        for length in np.unique(lengths).tolist():
+            if length == 0:
+                continue
+            rows = np.flatnonzero(lengths == length).tolist()
+            block = index._bands(length)
+            block.hashes = [invoice_hashes[row] for row in rows]
+            block.claim_ids = [claim_ids[row] for row in rows]
+            block.reindex()
+        return index
+
+    def _max_mismatches(self, length: int) -> int:
+        """Largest number of differing positions that still clears the threshold"""
+        mismatches = 0
+        while mismatches < length and (length - mismatches - 1) / length > self.threshold:
+            mismatches += 1
+        return mismatches
+
+    def _bands(self, length: int) -> _HashBands:
+        block = self.lengths.get(length)
+        if block is None:
+            band_count = self._max_mismatches(length) + 1
+            if self.bands is not None:
+                band_count = self.bands
+            band_count = max(1, min(band_count, length))
+            # Strided bands so shared prefixes don't land in a single band
+            layout = [list(range(b, length, band_count)) for b in range(band_count)]
+            block = self.lengths[length] = _HashBands(length, layout)
+        return block
+
+    def add(self, invoice_hash: str, claim_id: int):
+        if invoice_hash:
+            self._bands(len(invoice_hash)).add(invoice_hash, claim_id)
+
+    def remove(self, invoice_hash: str, claim_id: int):
+        """Tombstone a stored hash; a length's tables are compacted once half are tombstones"""
+        block = self.lengths.get(len(invoice_hash))
+        if block is not None:
+            block.remove(invoice_hash, claim_id)
+
+    def has_similar(self, invoice_hash: str, claim_id: int) -> bool:
+        """Whether a different claim has an invoice hash above the similarity threshold"""
+        block = self.lengths.get(len(invoice_hash))
+        if block is None:
+            return False
+
+        length = block.length
+        checked = set()
+        for band, key in enumerate(block.band_keys(invoice_hash)):
+            for position in block.candidates(band, key):
+                if position in checked:
+                    continue
+                checked.add(position)
+                other = block.hashes[position]
+                if other is None or block.claim_ids[position] == claim_id:
+                    continue
+
+                matches = sum(1 for a, b in zip(invoice_hash, other) if a == b)
+                if matches / length > self.threshold:
+                    return True
+
+        return False
@@ -0,0 +1,389 @@
+"""
+Columnar Historical Claim Store
+Compact, append-only storage of historical claims for the fraud engine
+"""
+
+import numpy as np
+import os
+import pickle
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from feature_store import FeatureStore
+
+class ClaimRecord(NamedTuple):
+    """Lightweight read-only view of one stored claim"""
+    claim_id: int
+    vendor_id: str
+    amount: float
+    budget_id: int
+    allocation_id: int
+    invoice_hash: str
+    deputy_id: str
+    area: str
+    timestamp: datetime
+
+class CategoryCodes:
+    """Integer coding for a categorical column (vendor, area, deputy)"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        """Code for value, assigning the next free code to unseen values"""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value: str) -> int:
+        """Code for value, or -1 if it has never been stored"""
+        return self.codes.get(value, -1)
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+class ClaimStore:
+    """
+    Columnar store of historical claims
+    Amounts and timestamps live in NumPy arrays, vendor/area/deputy as integer
+    codes. Columns grow geometrically on append; the properties below return
+    views over the filled rows that rules and feature extraction use directly.
+    Iterating the store yields ClaimRecord rows for code that needs claim objects.
+    Rows are only removed in bulk by retention (remove_rows).
+    """
+
+    _COLUMNS = ("_claim_ids", "_amounts", "_timestamps", "_vendor_codes",
+                "_area_codes", "_deputy_codes", "_budget_ids", "_allocation_ids")
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._capacity = max(1, capacity)
+        self._claim_ids = np.empty(self._capacity, dtype=np.int64)
+        self._amounts = np.empty(self._capacity, dtype=np.float64)
+        self._timestamps = np.empty(self._capacity, dtype="datetime64[us]")
+        self._vendor_codes = np.empty(self._capacity, dtype=np.int32)
+        self._area_codes = np.empty(self._capacity, dtype=np.int32)
+        self._deputy_codes = np.empty(self._capacity, dtype=np.int32)
+        self._budget_ids = np.empty(self._capacity, dtype=np.int32)
+        self._allocation_ids = np.empty(self._capacity, dtype=np.int32)
+        self.invoice_hashes: List[str] = []
+        self._rows_by_claim: Dict[int, int] = {}
+
+        self.vendors = CategoryCodes()
+        self.areas = CategoryCodes()
+        self.deputies = CategoryCodes()
+        self.features = FeatureStore()
+
+    @classmethod
+    def from_claims(cls, claims) -> "ClaimStore":
+        store = cls(capacity=len(claims))
+        store.extend(claims)
+        return store
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, directory: str):
+        """Write each column as a .npy file plus the string columns and codes"""
+        self.write(directory, self._filled_columns(), self._strings())
+
+    def capture(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Copies of the filled columns and string state, for write() to save from another thread"""
+        columns = {name: column.copy() for name, column in self._filled_columns().items()}
+        strings = {key: list(values) for key, values in self._strings().items()}
+        return columns, strings
+
+    def _filled_columns(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name)[:self._size] for name in self._COLUMNS}
+
+    @staticmethod
+    def write(directory: str, columns: Dict[str, np.ndarray], strings: Dict):
+        """Write captured columns and strings in the layout load() reads"""
+        os.makedirs(directory, exist_ok=True)
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f"{name.lstrip('_')}.npy"), column)
+
+        with open(os.path.join(directory, "strings.pkl"), "wb") as f:
+            pickle.dump(strings, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ClaimStore":
+        """
+        Load a saved store; with mmap the numeric columns are copy-on-write
+        memory maps, so loading is O(1) and pages are read on first access.
+        The first append copies the columns into memory as the store grows.
+        """
+        store = cls.__new__(cls)
+        for name in cls._COLUMNS:
+            path = os.path.join(directory, f"{name.lstrip('_')}.npy")
+            setattr(store, name, np.load(path, mmap_mode="c" if mmap else None))
+        store._size = store._capacity = len(store._claim_ids)
+
+        with open(os.path.join(directory, "strings.pkl"), "rb") as f:
+            store._init_derived(pickle.load(f))
+        return store
+
+    def share(self) -> Tuple[List[SharedMemory], Dict]:
+        """
+        Copy the store into shared memory blocks for worker processes
+        Returns the blocks (the caller closes and unlinks them when done) and a
+        small picklable descriptor that workers pass to attach().
+        """
+        blocks = []
+        columns = {}
+        for name in self._COLUMNS:
+            column = getattr(self, name)[:self._size]
+            block = SharedMemory(create=True, size=max(column.nbytes, 1))
+            np.ndarray(column.shape, dtype=column.dtype, buffer=block.buf)[:] = column
+            blocks.append(block)
+            columns[name] = (block.name, column.dtype.str)
+
+        strings = pickle.dumps(self._strings(), protocol=pickle.HIGHEST_PROTOCOL)
+        block = SharedMemory(create=True, size=len(strings))
+        block.buf[:len(strings)] = strings
+        blocks.append(block)
+
+        descriptor = {"size": self._size, "columns": columns, "strings": (block.name, len(strings))}
+        return blocks, descriptor
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "ClaimStore":
+        """Read-only store over shared memory blocks created by share()"""
+        store = cls.__new__(cls)
+        store._shared_blocks = []
+        size = descriptor["size"]
+        for name, (block_name, dtype) in descriptor["columns"].items():
+            block = SharedMemory(name=block_name)
+            store._shared_blocks.append(block)  # Keeps the mapping alive
+            setattr(store, name, np.ndarray(size, dtype=np.dtype(dtype), buffer=block.buf))
+        store._size = store._capacity = size
+
+        block_name, length = descriptor["strings"]
+        block = SharedMemory(name=block_name)
+        strings = pickle.loads(bytes(block.buf[:length]))
+        block.close()
+        store._init_derived(strings)
+        return store
+
+    def _strings(self) -> Dict:
+        """Non-numeric state: invoice hashes and category code tables"""
+        return {
+            "invoice_hashes": self.invoice_hashes,
+            "vendors": self.vendors.values,
+            "areas": self.areas.values,
+            "deputies": self.deputies.values
+        }
+
+    def _init_derived(self, strings: Dict):
+        """Restore string columns and rebuild lookup tables and feature aggregates"""
+        self.invoice_hashes = strings["invoice_hashes"]
+        self._rows_by_claim = {claim_id: row for row, claim_id in enumerate(self._claim_ids[:self._size].tolist())}
+        for attribute in ("vendors", "areas", "deputies"):
+            codes = CategoryCodes()
+            codes.values = strings[attribute]
+            codes.codes = {value: code for code, value in enumerate(codes.values)}
+            setattr(self, attribute, codes)
+        self._rebuild_features()
+
+    def _rebuild_features(self):
+        self.features = FeatureStore.rebuild(self.vendor_codes, self.area_codes, self.amounts, self.timestamps)
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def append(self, claim) -> int:
+        """Append a claim and return its row index"""
+        if self._size == self._capacity:
+            self._resize(max(1, self._capacity) * 2)
+
+        row = self._size
+        timestamp = np.datetime64(claim.timestamp, "us")
+        vendor_code = self.vendors.encode(claim.vendor_id)
+        area_code = self.areas.encode(claim.area)
+
+        self._claim_ids[row] = claim.claim_id
+        self._amounts[row] = claim.amount
+        self._timestamps[row] = timestamp
+        self._vendor_codes[row] = vendor_code
+        self._area_codes[row] = area_code
+        self._deputy_codes[row] = self.deputies.encode(claim.deputy_id)
+        self._budget_ids[row] = claim.budget_id
+        self._allocation_ids[row] = claim.allocation_id
+        self.invoice_hashes.append(claim.invoice_hash)
+        self._rows_by_claim[claim.claim_id] = row
+        self.features.add(vendor_code, area_code, float(claim.amount), timestamp)
+
+        self._size += 1
+        return row
+
+    def extend(self, claims):
+        for claim in claims:
+            self.append(claim)
+
+    def has_claim(self, claim_id: int) -> bool:
+        return claim_id in self._rows_by_claim
+
+    def rows_before(self, cutoff: datetime) -> np.ndarray:
+        """Row indices of claims submitted at or before cutoff"""
+        return np.flatnonzero(self.timestamps <= np.datetime64(cutoff, "us"))
+
+    def remove_rows(self, rows: np.ndarray):
+        """Drop rows and compact the columns; remaining rows keep their order"""
+        if len(rows) == 0:
+            return
+        self.swap_in(self.compact(rows, self._size))
+
+    def compact(self, rows: np.ndarray, size: int) -> Dict:
+        """
+        Compacted copies of the first size rows without rows, for swap_in()
+        Reads only rows below size, which appends never touch, so this can run
+        in a worker thread while the event loop keeps ingesting claims.
+        """
+        keep = np.ones(size, dtype=bool)
+        keep[rows] = False
+        kept = int(keep.sum())
+
+        # Release memory once the store is mostly empty
+        capacity = self._capacity
+        if capacity > 1024 and kept < capacity // 4:
+            capacity = max(1024, kept * 2)
+
+        columns = {}
+        for name in self._COLUMNS:
+            column = np.empty(capacity, dtype=getattr(self, name).dtype)
+            column[:kept] = getattr(self, name)[:size][keep]
+            columns[name] = column
+
+        invoice_hashes = [h for h, k in zip(self.invoice_hashes[:size], keep) if k]
+        claim_ids = columns["_claim_ids"][:kept]
+        return {
+            "size": size,
+            "kept": kept,
+            "columns": columns,
+            "invoice_hashes": invoice_hashes,
+            "rows_by_claim": {claim_id: row for row, claim_id in enumerate(claim_ids.tolist())},
+            "features": FeatureStore.rebuild(
+                columns["_vendor_codes"][:kept], columns["_area_codes"][:kept],
+                columns["_amounts"][:kept], columns["_timestamps"][:kept]
+            )
+        }
+
+    def swap_in(self, compaction: Dict):
+        """Install a compact() result, carrying over rows appended since it was computed"""
+        size, kept = compaction["size"], compaction["kept"]
+        total = kept + self._size - size
+
+        for name, column in compaction["columns"].items():
+            if len(column) < total:
+                grown = np.empty(total * 2, dtype=column.dtype)
+                grown[:kept] = column[:kept]
+                column = grown
+            column[kept:total] = getattr(self, name)[size:self._size]
+            setattr(self, name, column)
+        self._capacity = len(self._claim_ids)
+
+        self.invoice_hashes = compaction["invoice_hashes"] + self.invoice_hashes[size:]
+        self._rows_by_claim = compaction["rows_by_claim"]
+        self.features = compaction["features"]
+        for row in range(kept, total):
+            self._rows_by_claim[int(self._claim_ids[row])] = row
+            self.features.add(int(self._vendor_codes[row]), int(self._area_codes[row]),
+                              float(self._amounts[row]), self._timestamps[row])
+        self._size = total
+
+    def _resize(self, capacity: int):
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+
+    # ------------------------------------------------------------------
+    # Column views (valid until the next append)
+    # ------------------------------------------------------------------
+
+    @property
+    def claim_ids(self) -> np.ndarray:
+        return self._claim_ids[:self._size]
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._amounts[:self._size]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._size]
+
+    @property
+    def vendor_codes(self) -> np.ndarray:
+        return self._vendor_codes[:self._size]
+
+    @property
+    def area_codes(self) -> np.ndarray:
+        return self._area_codes[:self._size]
+
+    @property
+    def deputy_codes(self) -> np.ndarray:
+        return self._deputy_codes[:self._size]
+
+    @property
+    def budget_ids(self) -> np.ndarray:
+        return self._budget_ids[:self._size]
+
+    @property
+    def allocation_ids(self) -> np.ndarray:
+        return self._allocation_ids[:self._size]
+
+    def vendor_rows(self, vendor_id: str) -> np.ndarray:
+        """Row indices of all claims from a vendor"""
+        code = self.vendors.get(vendor_id)
+        if code < 0:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.vendor_codes == code)
+
+    def area_count(self, area: str) -> int:
+        """Number of stored claims in an area"""
+        return self.features.area_count(self.areas.get(area))
+
+    # ------------------------------------------------------------------
+    # Row access
+    # ------------------------------------------------------------------
+
+    def record(self, row: int) -> ClaimRecord:
+        return ClaimRecord(
+            claim_id=int(self._claim_ids[row]),
+            vendor_id=self.vendors.decode(self._vendor_codes[row]),
+            amount=float(self._amounts[row]),
+            budget_id=int(self._budget_ids[row]),
+            allocation_id=int(self._allocation_ids[row]),
+            invoice_hash=self.invoice_hashes[row],
+            deputy_id=self.deputies.decode(self._deputy_codes[row]),
+            area=self.areas.decode(self._area_codes[row]),
+            timestamp=self._timestamps[row].item()
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[ClaimRecord]:
+        for row in range(self._size):
+            yield self.record(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.record(row) for row in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("claim store index out of range")
+        return self.record(index)
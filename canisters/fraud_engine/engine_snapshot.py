@@ -0,0 +1,160 @@
+"""
+Fraud Engine State Snapshots
+Binary snapshots of rules engine history, aggregates and ML models so a
+restarted service can serve traffic without re-ingesting and retraining.
+Claim indexes are not stored: they are rebuilt from the memory-mapped claim
+columns on load, which is faster than unpickling them.
+"""
+
+import copy
+import json
+import logging
+import os
+import pickle
+import shutil
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import joblib
+
+from claim_store import ClaimStore
+from ml_detector import MLFraudDetector
+from rules_engine import EvaluationPlan, FraudRulesEngine
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the on-disk layout or pickled engine state changes
+SNAPSHOT_FORMAT_VERSION = 6
+
+# Completed snapshots kept on disk; older ones are deleted after each write
+SNAPSHOTS_TO_KEEP = 2
+
+CURRENT_POINTER = "CURRENT"
+
+# Rules engine attributes captured alongside the claim store. The claim indexes
+# are not captured: restore_state rebuilds them from the store's columns.
+ENGINE_STATE = ("vendor_stats",)
+
+# ML detector attributes captured in the model artifact
+MODEL_STATE = (
+    "anomaly_model", "classification_model", "scaler",
+    "is_trained", "model_version", "last_training", "online_model"
+)
+
+def capture_state(rules_engine: FraudRulesEngine, ml_detector: MLFraudDetector) -> Dict:
+    """Engine and model state other than the claim store and its indexes, as picklable references"""
+    return {
+        "rules": rules_engine.rules,
+        "engine": {attribute: getattr(rules_engine, attribute) for attribute in ENGINE_STATE},
+        "hash_similarity_bands": rules_engine.invoice_similarity_index.bands,
+        "models": {attribute: getattr(ml_detector, attribute) for attribute in MODEL_STATE}
+    }
+
+def restore_state(state: Dict, historical_claims: ClaimStore,
+                  clock=None) -> Tuple[FraudRulesEngine, MLFraudDetector]:
+    """Build a rules engine and ML detector from captured state and a claim store"""
+    rules_engine = FraudRulesEngine(hash_similarity_bands=state["hash_similarity_bands"], clock=clock)
+    rules_engine.plan = EvaluationPlan(state["rules"])
+    for attribute, value in state["engine"].items():
+        setattr(rules_engine, attribute, value)
+    rules_engine.historical_claims = historical_claims
+    rules_engine.rebuild_indexes()
+
+    ml_detector = MLFraudDetector(clock=clock)
+    for attribute, value in state["models"].items():
+        setattr(ml_detector, attribute, value)
+    return rules_engine, ml_detector
+
+def capture_snapshot(rules_engine: FraudRulesEngine, ml_detector: MLFraudDetector) -> Dict:
+    """
+    Copy the state a snapshot stores, so write_snapshot can run off the event loop
+    Claim columns and mutable aggregates are copied; trained models are replaced
+    rather than mutated on retrain, so they are captured by reference.
+    """
+    captured = capture_state(rules_engine, ml_detector)
+    captured["rules"] = copy.deepcopy(captured["rules"])
+    captured["engine"] = copy.deepcopy(captured["engine"])
+    models = captured["models"]
+    models["online_model"] = copy.deepcopy(models["online_model"])  # Learns from every ingested claim
+    captured["claims"] = rules_engine.historical_claims.capture()
+    return captured
+
+def save_snapshot(directory: str, rules_engine: FraudRulesEngine, ml_detector: MLFraudDetector) -> str:
+    """Capture and write a snapshot in one step"""
+    return write_snapshot(directory, capture_snapshot(rules_engine, ml_detector))
+
+def write_snapshot(directory: str, captured: Dict) -> str:
+    """
+    Write a captured snapshot under directory and return its path
+    Each snapshot is written to its own subdirectory; the CURRENT pointer is
+    replaced atomically only after every file is on disk, so a crash mid-write
+    leaves the previous snapshot in place.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+    path = os.path.join(directory, name)
+
+    columns, strings = captured["claims"]
+    ClaimStore.write(os.path.join(path, "claims"), columns, strings)
+
+    with open(os.path.join(path, "engine_state.pkl"), "wb") as f:
+        engine_state = {key: captured[key] for key in ("rules", "engine", "hash_similarity_bands")}
+        pickle.dump(engine_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # joblib stores model arrays unpickled so they can be memory-mapped on load
+    joblib.dump(captured["models"], os.path.join(path, "models.joblib"))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "claim_count": len(columns["_claim_ids"]),
+        "model_version": captured["models"]["model_version"]
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    pointer = os.path.join(directory, CURRENT_POINTER)
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(name)
+    os.replace(f"{pointer}.tmp", pointer)
+
+    _prune_snapshots(directory, keep=name)
+    logger.info(f"Wrote engine snapshot {name} ({manifest['claim_count']} claims)")
+    return path
+
+def _prune_snapshots(directory: str, keep: str):
+    snapshots = sorted(d for d in os.listdir(directory) if d.startswith("snapshot-"))
+    for name in snapshots[:-SNAPSHOTS_TO_KEEP]:
+        if name != keep:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+def load_snapshot(directory: str, mmap: bool = True) -> Optional[Tuple[FraudRulesEngine, MLFraudDetector]]:
+    """
+    Restore a rules engine and ML detector from the current snapshot
+    Returns None when there is no usable snapshot, so callers fall back to a full rebuild.
+    """
+    pointer = os.path.join(directory, CURRENT_POINTER)
+    if not os.path.exists(pointer):
+        return None
+
+    try:
+        with open(pointer) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            logger.warning(f"Ignoring snapshot with format version {manifest.get('format_version')}")
+            return None
+
+        store = ClaimStore.load(os.path.join(path, "claims"), mmap=mmap)
+        with open(os.path.join(path, "engine_state.pkl"), "rb") as f:
+            state = pickle.load(f)
+        state["models"] = joblib.load(os.path.join(path, "models.joblib"), mmap_mode="r" if mmap else None)
+        rules_engine, ml_detector = restore_state(state, store)
+
+        logger.info(f"Loaded engine snapshot from {manifest['created_at']} ({manifest['claim_count']} claims)")
+        return rules_engine, ml_detector
+
+    except Exception as e:
+        logger.error(f"Failed to load engine snapshot: {e}")
+        return None
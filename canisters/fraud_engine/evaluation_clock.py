@@ -0,0 +1,34 @@
+"""
+Evaluation Clocks
+Source of "now" for time-based fraud rules, so claims can be scored
+as of their own submission time when replaying history
+"""
+
+from datetime import datetime
+from typing import Optional
+
+class SystemClock:
+    """Wall-clock time; the default for live scoring"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+class ReplayClock:
+    """
+    Manually advanced clock for deterministic historical replay
+    Time only moves forward: engine windows (30-day vendor counts, cost-variance
+    buckets) discard entries as the clock passes them, so going back would
+    silently lose history.
+    """
+
+    def __init__(self, start: Optional[datetime] = None):
+        self.current = start or datetime.min
+
+    def now(self) -> datetime:
+        return self.current
+
+    def advance_to(self, timestamp: datetime):
+        """Move the clock to timestamp; raises ValueError if that is in the past"""
+        if timestamp < self.current:
+            raise ValueError(f"Replay clock cannot move backwards: {timestamp} < {self.current}")
+        self.current = timestamp
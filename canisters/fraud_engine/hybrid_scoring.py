@@ -0,0 +1,37 @@
+"""
+Hybrid Score Combination
+Blends rules engine and ML detector outputs into the service's final fraud score
+"""
+
+from typing import NamedTuple
+
+from rules_engine import FraudScore, risk_level_for
+
+class HybridScore(NamedTuple):
+    score: int
+    risk_level: str
+    confidence: float
+    reasoning: str
+
+def combine_scores(rules_score: FraudScore, ml_probability: float) -> HybridScore:
+    """Weighted blend of the rule-based score and the ML fraud probability"""
+    ml_score = int(ml_probability * 100)
+
+    # Give more weight to rules for high-confidence detections
+    rules_weight = 0.75 if len(rules_score.flags) > 2 else 0.65
+    ml_weight = 1.0 - rules_weight
+
+    combined_score = int(rules_weight * rules_score.score + ml_weight * ml_score)
+
+    reasoning_parts = [
+        f"Rule-based analysis: {rules_score.reasoning}",
+        f"ML anomaly score: {ml_probability:.3f}",
+        f"Combined confidence: {(rules_score.confidence + ml_probability) / 2:.3f}"
+    ]
+
+    return HybridScore(
+        score=combined_score,
+        risk_level=risk_level_for(combined_score),
+        confidence=min(0.95, (rules_score.confidence + ml_probability) / 2),
+        reasoning="; ".join(reasoning_parts)
+    )
@@ -5,21 +5,37 @@ Standalone Python service for AI-powered corruption detection
 
 import asyncio
 import logging
+import random
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import uvicorn
 import httpx
 import json
+import os
+import numpy as np
 
 from rules_engine import FraudRulesEngine
 from ml_detector import MLFraudDetector
+from engine_snapshot import capture_snapshot, load_snapshot, write_snapshot
+from hybrid_scoring import combine_scores
+from bulk_rescore import BulkRescorer
+from background_training import BackgroundTrainer
+from prediction_batcher import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, PredictionBatcher
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Engine state snapshots for fast restarts
+SNAPSHOT_DIR = os.environ.get("FRAUD_ENGINE_SNAPSHOT_DIR", "snapshots")
+
+# Concurrent ML predictions are batched for up to this long, or this many claims
+ML_BATCH_WAIT_MS = float(os.environ.get("FRAUD_ENGINE_ML_BATCH_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+ML_BATCH_SIZE = int(os.environ.get("FRAUD_ENGINE_ML_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE))
+
 app = FastAPI(
     title="CorruptGuard Fraud Detection Engine", 
     version="1.0.0",
@@ -69,22 +85,62 @@ class FraudDetectionService:
     """
     
     def __init__(self):
+        self.icp_canister_url = "http://localhost:8000"  # Backend API endpoint
+        
+        # Concurrent requests share batched model calls
+        self.ml_batcher = PredictionBatcher(
+            lambda claims, historical_data: self.ml_detector.predict_fraud_probability_many(claims, historical_data),
+            max_batch_size=ML_BATCH_SIZE,
+            max_wait_ms=ML_BATCH_WAIT_MS
+        )
+        
+        # Background snapshot writes run one at a time, so CURRENT always moves forward
+        self.snapshot_lock = asyncio.Lock()
+        
+        # Fast start from the latest snapshot when one exists
+        restored = load_snapshot(SNAPSHOT_DIR)
+        if restored is not None:
+            self.rules_engine, self.ml_detector = restored
+            if self.ml_detector.online_model is None:
+                self.ml_detector.enable_online_learning(self.rules_engine.historical_claims)
+            return
+        
         self.rules_engine = FraudRulesEngine()
         self.ml_detector = MLFraudDetector()
-        self.icp_canister_url = "http://localhost:8000"  # Backend API endpoint
         
         # Initialize with demo data
         self._initialize_demo_data()
         
-        # Train ML model
-        self._train_ml_model()
+        # Reuse the current model artifact when there is one, otherwise train
+        if not self.ml_detector.load_models():
+            self._train_ml_model()
+        
+        # Streaming anomaly detector keeps the ML score fresh between retrains
+        self.ml_detector.enable_online_learning(self.rules_engine.historical_claims)
+        
+        self.save_snapshot()
+    
+    def save_snapshot(self):
+        """Persist engine history and models for fast restarts (blocks; for use before serving)"""
+        self._write_snapshot(capture_snapshot(self.rules_engine, self.ml_detector))
+    
+    async def save_snapshot_in_background(self):
+        """Capture engine state on the event loop, then write it from a worker thread"""
+        async with self.snapshot_lock:
+            captured = capture_snapshot(self.rules_engine, self.ml_detector)
+            await asyncio.to_thread(self._write_snapshot, captured)
+    
+    def _write_snapshot(self, captured: Dict):
+        try:
+            write_snapshot(SNAPSHOT_DIR, captured)
+        except Exception as e:
+            logger.error(f"Snapshot write failed: {str(e)}")
     
     def _initialize_demo_data(self):
         """Initialize with realistic demo data"""
         logger.info("Initializing fraud detection with demo data...")
         
         # This will populate historical claims for analysis
-        import random
         base_date = datetime.now() - timedelta(days=365)
         vendors = [f"vendor_{i}" for i in range(25)]
         areas = [
@@ -117,21 +173,7 @@ class FraudDetectionService:
                 logger.warning("Insufficient data for ML training")
                 return
             
-            # Create fraud labels (simulate known fraud cases)
-            fraud_labels = [False] * len(historical_claims)
-            
-            # Mark some realistic fraud cases
-            for i, claim in enumerate(historical_claims):
-                # High amounts are more likely to be fraudulent
-                if claim.amount > 2000000:
-                    fraud_labels[i] = random.choice([True, False, False])  # 33% fraud rate for high amounts
-                # Round numbers are suspicious
-                elif str(int(claim.amount)).endswith('00000'):
-                    fraud_labels[i] = random.choice([True, False])  # 50% fraud rate for round numbers
-                # Random fraud cases
-                elif random.random() < 0.08:  # 8% baseline fraud rate
-                    fraud_labels[i] = True
-            
+            fraud_labels = self._fraud_labels(historical_claims)
             fraud_count = sum(fraud_labels)
             logger.info(f"Training ML model with {len(historical_claims)} claims, {fraud_count} fraudulent")
             
@@ -141,6 +183,32 @@ class FraudDetectionService:
         except Exception as e:
             logger.error(f"ML model training failed: {e}")
     
+    def _fraud_labels(self, historical_claims) -> List[bool]:
+        """Training labels for historical claims, drawn from the amount column"""
+        # Simulate known fraud cases
+        amounts = historical_claims.amounts
+        whole_amounts = np.trunc(amounts)
+        draws = np.random.random(len(amounts))
+        
+        # High amounts are more likely to be fraudulent
+        high_amount = amounts > 2000000
+        # Round numbers are suspicious
+        round_amount = (np.abs(whole_amounts) >= 100000) & (whole_amounts % 100000 == 0)
+        
+        fraud_labels = np.where(
+            high_amount, draws < 1 / 3,  # 33% fraud rate for high amounts
+            np.where(round_amount, draws < 0.5, draws < 0.08)  # 50% for round numbers, 8% baseline
+        )
+        return fraud_labels.tolist()
+    
+    def _ingest(self, claim_data: ClaimData) -> bool:
+        """Learn from and store a claim not already in history; returns whether it was new"""
+        historical_claims = self.rules_engine.historical_claims
+        if historical_claims.has_claim(claim_data.claim_id):
+            return False
+        self.ml_detector.observe(claim_data, historical_claims)
+        return self.rules_engine.add_historical_claim(claim_data)
+    
     async def analyze_claim(self, claim_data: ClaimData) -> FraudScore:
         """
         Main function to analyze a claim for fraud
@@ -155,35 +223,12 @@ class FraudDetectionService:
             rules_score = self.rules_engine.analyze_claim(claim_data)
             
             # ML-based analysis
-            ml_probability = self.ml_detector.predict_fraud_probability(
-                claim_data, 
-                self.rules_engine.historical_claims
-            )
-            ml_score = int(ml_probability * 100)
+            ml_probability = await self.ml_batcher.predict(claim_data, self.rules_engine.historical_claims)
             
             # Combine scores with sophisticated weighting
-            # Give more weight to rules for high-confidence detections
-            rules_weight = 0.75 if len(rules_score.flags) > 2 else 0.65
-            ml_weight = 1.0 - rules_weight
-            
-            combined_score = int(rules_weight * rules_score.score + ml_weight * ml_score)
-            
-            # Determine final risk level with adjusted thresholds
-            if combined_score >= 85:
-                risk_level = "critical"
-            elif combined_score >= 70:
-                risk_level = "high"
-            elif combined_score >= 40:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
-            
-            # Enhanced reasoning
-            reasoning_parts = [
-                f"Rule-based analysis: {rules_score.reasoning}",
-                f"ML anomaly score: {ml_probability:.3f}",
-                f"Combined confidence: {(rules_score.confidence + ml_probability) / 2:.3f}"
-            ]
+            hybrid = combine_scores(rules_score, ml_probability)
+            combined_score = hybrid.score
+            risk_level = hybrid.risk_level
             
             analysis_time = (datetime.now() - start_time).total_seconds() * 1000
             
@@ -192,13 +237,14 @@ class FraudDetectionService:
                 score=combined_score,
                 risk_level=risk_level,
                 flags=rules_score.flags,
-                reasoning="; ".join(reasoning_parts),
-                confidence=min(0.95, (rules_score.confidence + ml_probability) / 2),
+                reasoning=hybrid.reasoning,
+                confidence=hybrid.confidence,
                 analysis_time_ms=round(analysis_time, 2)
             )
             
-            # Add to historical data for continuous learning
-            self.rules_engine.add_historical_claim(claim_data)
+            # Add to historical data for continuous learning; a resubmitted
+            # claim_id is already in history and is not learned again
+            self._ingest(claim_data)
             
             # Send score back to backend API
             await self._update_backend_fraud_score(final_score)
@@ -273,8 +319,46 @@ class FraudDetectionService:
         except Exception as e:
             logger.error(f"Failed to generate fraud alert: {str(e)}")
 
-# Initialize fraud detection service
-fraud_service = FraudDetectionService()
+# Fraud detection service and background ML retrainer, created at startup.
+# Not at import: spawned worker processes (bulk re-scoring, retraining) re-run
+# this module's top level when the service is started with `python main.py`.
+fraud_service: Optional[FraudDetectionService] = None
+model_retrainer: Optional[BackgroundTrainer] = None
+
+def create_services() -> Tuple[FraudDetectionService, BackgroundTrainer]:
+    """Build the fraud detection service and its retrainer"""
+    service = FraudDetectionService()
+    # Background ML retraining; snapshots engine state once new models are live
+    retrainer = BackgroundTrainer(service.ml_detector, on_swap=service.save_snapshot_in_background)
+    return service, retrainer
+
+# How often expired claims are evicted from engine history
+RETENTION_INTERVAL_SECONDS = 3600
+
+# Seconds between engine state snapshots
+SNAPSHOT_INTERVAL_SECONDS = 900
+
+async def retention_loop():
+    """
+    Periodically evict claims past the retention horizon so memory stays flat
+    Eviction yields to request handling and compacts history in a worker thread.
+    """
+    while True:
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+        try:
+            await fraud_service.rules_engine.evict_expired_in_background()
+        except Exception as e:
+            logger.error(f"History eviction failed: {str(e)}")
+
+async def snapshot_loop():
+    """
+    Periodically snapshot engine state
+    State is copied on the event loop, so no claim is ingested mid-capture,
+    and written to disk from a worker thread.
+    """
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        await fraud_service.save_snapshot_in_background()
 
 # ================================================================================
 # FastAPI Routes
@@ -283,9 +367,13 @@ fraud_service = FraudDetectionService()
 @app.on_event("startup")
 async def startup_event():
     """Initialize fraud detection service on startup"""
+    global fraud_service, model_retrainer
     logger.info("🤖 CorruptGuard Fraud Detection Engine Starting...")
+    fraud_service, model_retrainer = create_services()
     logger.info(f"📊 Loaded {len(fraud_service.rules_engine.historical_claims)} historical claims")
     logger.info(f"🧠 ML Model trained: {fraud_service.ml_detector.is_trained}")
+    asyncio.create_task(retention_loop())
+    asyncio.create_task(snapshot_loop())
     logger.info("✅ Fraud Detection Engine Ready")
 
 @app.post("/analyze-claim")
@@ -308,6 +396,12 @@ async def analyze_claim_endpoint(claim_data: ClaimData, background_tasks: Backgr
         logger.error(f"Error in analyze_claim_endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/explain-claims")
+async def explain_claims(claims: List[ClaimData]):
+    """Per-feature ML explanations for a batch of claims, e.g. every flagged claim in a review queue"""
+    explanations = fraud_service.ml_detector.explain_predictions(claims, fraud_service.rules_engine.historical_claims)
+    return {"explanations": explanations}
+
 @app.get("/claim/{claim_id}/score")
 async def get_claim_score(claim_id: int):
     """Get fraud score for a specific claim"""
@@ -372,18 +466,86 @@ async def get_fraud_stats():
         }
     }
 
-@app.post("/retrain-model")
+@app.get("/stats/rules")
+async def get_rule_stats():
+    """Per-rule and per-feature-group latency, trigger rate and score contribution, plus ML batching"""
+    return {
+        "rules": fraud_service.rules_engine.rule_stats.snapshot(),
+        "ml_features": fraud_service.ml_detector.feature_stats.snapshot(),
+        "ml_batcher": fraud_service.ml_batcher.snapshot()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Rule, feature and ML batching stats in Prometheus text format"""
+    return (
+        fraud_service.rules_engine.rule_stats.to_prometheus() +
+        fraud_service.ml_detector.feature_stats.to_prometheus() +
+        fraud_service.ml_batcher.to_prometheus()
+    )
+
+@app.post("/retrain-model", status_code=202)
 async def retrain_model():
-    """Retrain ML model with latest data"""
+    """
+    Start retraining the ML model on a copy of current history
+    Training runs in a separate process; new models are swapped in when it
+    finishes. Returns the running job if one is already in progress.
+    """
+    historical_claims = fraud_service.rules_engine.historical_claims
+    if len(historical_claims) < 10:
+        raise HTTPException(status_code=400, detail="Insufficient data for ML training")
+    
     try:
-        fraud_service._train_ml_model()
-        return {
-            "success": True,
-            "message": "ML model retrained successfully",
-            "model_version": datetime.now().isoformat()
-        }
+        job = model_retrainer.start(historical_claims, fraud_service._fraud_labels(historical_claims))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Retraining failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Retraining failed to start: {str(e)}")
+    
+    return {
+        "success": True,
+        "message": "ML model retraining started",
+        "job": job.to_dict()
+    }
+
+@app.get("/retrain-model/{job_id}")
+async def get_retrain_job(job_id: str):
+    """Status of a background retraining job"""
+    job = model_retrainer.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retrain job not found")
+    return job.to_dict()
+
+@app.post("/scoring/update")
+async def update_scoring_rules(updates: Dict[str, Dict[str, float]]):
+    """Compile new rule weights/thresholds and swap them into the rules engine"""
+    try:
+        plan = fraud_service.rules_engine.update_rules(updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "plan": plan.describe()}
+
+@app.post("/scoring/rescore")
+async def rescore_history(workers: Optional[int] = None):
+    """Re-score all historical claims with the active rules across a process pool"""
+    # Capture on the event loop so no claim is ingested mid-copy, then score off-loop
+    with BulkRescorer(fraud_service.rules_engine, fraud_service.ml_detector) as rescorer:
+        started = datetime.now()
+        results = await asyncio.to_thread(rescorer.run, None, workers)
+    
+    elapsed = (datetime.now() - started).total_seconds()
+    risk_counts = {}
+    for result in results:
+        risk_counts[result["risk_level"]] = risk_counts.get(result["risk_level"], 0) + 1
+    
+    return {
+        "claims_rescored": len(results),
+        "risk_levels": risk_counts,
+        "elapsed_seconds": round(elapsed, 2)
+    }
+
+@app.get("/scoring/rules")
+async def get_scoring_rules():
+    """Active rule evaluation plan"""
+    return fraud_service.rules_engine.plan.describe()
 
 @app.get("/health")
 async def health_check():
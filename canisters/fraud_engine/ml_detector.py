@@ -5,30 +5,102 @@ Advanced anomaly detection for government procurement corruption
 
 import numpy as np
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, NamedTuple, Optional, Tuple
 from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, RobustScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, roc_auc_score
 import joblib
+import json
 import os
+import shutil
+
+from claim_store import ClaimStore
+from feature_store import VendorAggregate
+from online_anomaly import HalfSpaceTrees
+from tree_ensemble import FlatIsolationForest, FlatTreeEnsemble
+from evaluation_clock import SystemClock
+from rule_stats import RuleStats
 
 logger = logging.getLogger(__name__)
 
+# Trained models are written to versioned artifact directories under this
+# directory; a CURRENT pointer names the live one
+MODEL_DIR = "models"
+
+# Bumped whenever the artifact layout changes
+MODEL_ARTIFACT_FORMAT_VERSION = 1
+
+# Artifacts kept on disk; older ones are deleted after each save
+MODEL_ARTIFACTS_TO_KEEP = 3
+
+CURRENT_POINTER = "CURRENT"
+
+# Recent per-claim attributions kept, keyed by feature vector
+EXPLANATION_CACHE_SIZE = 4096
+
+class ModelSet(NamedTuple):
+    """Models fitted together and swapped in as one unit"""
+    anomaly_model: Optional[IsolationForest]
+    classification_model: Optional[RandomForestClassifier]
+    scaler: RobustScaler
+
+class CompiledModels:
+    """
+    Flat NumPy evaluators for one ModelSet
+    Scores equal the sklearn estimators' (which stay the reference path)
+    without per-call validation and per-estimator dispatch.
+    """
+    
+    def __init__(self, models: ModelSet):
+        if type(models.scaler) is not RobustScaler:
+            raise TypeError(f"cannot compile {type(models.scaler).__name__}")
+        self.models = models
+        self.center = models.scaler.center_ if models.scaler.with_centering else None
+        self.scale = models.scaler.scale_ if models.scaler.with_scaling else None
+        self.anomaly = FlatIsolationForest(models.anomaly_model)
+        self.classifier = None
+        if models.classification_model is not None:
+            self.classifier = FlatTreeEnsemble.from_classifier(models.classification_model)
+    
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        scaled = np.array(features, dtype=np.float64)
+        if self.center is not None:
+            scaled -= self.center
+        if self.scale is not None:
+            scaled /= self.scale
+        return scaled
+
 class MLFraudDetector:
     """
     Advanced Machine Learning fraud detection using multiple algorithms
     Combines anomaly detection with supervised learning for maximum accuracy
     """
     
-    def __init__(self):
-        self.anomaly_model = None
-        self.classification_model = None
-        self.scaler = RobustScaler()  # More robust to outliers than StandardScaler
+    def __init__(self, clock=None, model_dir: str = MODEL_DIR):
+        """
+        clock: source of "now" for training timestamps (wall clock by default).
+        Features are computed relative to each claim's own timestamp, so
+        replaying claims in order against a growing history is deterministic.
+        """
+        self.clock = clock or SystemClock()
+        self.model_dir = model_dir
+        # RobustScaler is more robust to outliers than StandardScaler
+        self.models = ModelSet(anomaly_model=None, classification_model=None, scaler=RobustScaler())
         self.is_trained = False
         self.model_version = "1.0.0"
         self.last_training = None
+        self.artifact = None  # Name of the model artifact last saved or loaded
+        self.online_model: Optional[HalfSpaceTrees] = None  # Streaming anomaly detector, when enabled
+        
+        # Flattened evaluators and attribution cache, valid for one model set
+        self.use_compiled_models = True  # False scores through sklearn, the reference path
+        self._compiled: Optional[CompiledModels] = None
+        self._explained_models: Optional[ModelSet] = None
+        self._explanations: OrderedDict = OrderedDict()
         
         # Enhanced feature set for better detection
         self.feature_columns = [
@@ -61,44 +133,89 @@ class MLFraudDetector:
             "Government Buildings": 0.7,
             "Educational Technology": 0.8
         }
+        
+        # Per feature-group extraction timers
+        self.feature_stats = RuleStats(metric_prefix="fraud_feature", label="feature_group", track_outcomes=False)
+    
+    # Model accessors; assigning one replaces the whole model set so a
+    # prediction in flight never sees models from two different trainings
+    
+    @property
+    def anomaly_model(self) -> Optional[IsolationForest]:
+        return self.models.anomaly_model
+    
+    @anomaly_model.setter
+    def anomaly_model(self, model: Optional[IsolationForest]):
+        self.models = self.models._replace(anomaly_model=model)
+    
+    @property
+    def classification_model(self) -> Optional[RandomForestClassifier]:
+        return self.models.classification_model
     
-    def prepare_features(self, claim, historical_data: List) -> np.ndarray:
+    @classification_model.setter
+    def classification_model(self, model: Optional[RandomForestClassifier]):
+        self.models = self.models._replace(classification_model=model)
+    
+    @property
+    def scaler(self) -> RobustScaler:
+        return self.models.scaler
+    
+    @scaler.setter
+    def scaler(self, scaler: RobustScaler):
+        self.models = self.models._replace(scaler=scaler)
+    
+    def prepare_features(self, claim, historical_data) -> np.ndarray:
         """
         Extract comprehensive feature set for ML analysis
+        historical_data is a ClaimStore (lists of claims are converted on the fly);
+        history features come from its running aggregates, so this is O(1) in history size
         """
         try:
-            vendor_history = [c for c in historical_data if c.vendor_id == claim.vendor_id]
-            all_amounts = [c.amount for c in historical_data]
+            stats = self.feature_stats
+            started = time.perf_counter()
+            
+            store = historical_data if isinstance(historical_data, ClaimStore) else ClaimStore.from_claims(historical_data)
+            aggregates = store.features
+            vendor = aggregates.vendor(store.vendors.get(claim.vendor_id))
+            has_history = vendor is not None
+            started = self._record_feature_time(stats, "history_lookup", started)
             
             # Amount-based features
             amount = claim.amount
             amount_log = np.log(max(amount, 1))
-            amount_zscore = (amount - np.mean(all_amounts)) / (np.std(all_amounts) + 1e-8) if all_amounts else 0
+            amount_count, amount_mean, amount_std = aggregates.amount_stats()
+            amount_zscore = (amount - amount_mean) / (amount_std + 1e-8) if amount_count else 0
+            started = self._record_feature_time(stats, "amount", started)
             
             # Vendor-based features
-            vendor_submissions_count = len(vendor_history)
-            vendor_success_rate = 0.7 if not vendor_history else min(0.95, len(vendor_history) * 0.1 + 0.5)
-            vendor_age_days = self._get_vendor_age_days(claim, vendor_history)
-            vendor_avg_amount = np.mean([c.amount for c in vendor_history]) if vendor_history else amount
+            vendor_submissions_count = vendor.count if has_history else 0
+            vendor_success_rate = 0.7 if not has_history else min(0.95, vendor.count * 0.1 + 0.5)
+            vendor_age_days = self._get_vendor_age_days(claim, vendor)
+            vendor_avg_amount = vendor.mean if has_history else amount
             amount_vs_vendor_avg = amount / max(vendor_avg_amount, 1)
-            vendor_area_diversity = len(set(c.area for c in vendor_history)) if vendor_history else 1
+            vendor_area_diversity = len(vendor.areas) if has_history else 1
+            started = self._record_feature_time(stats, "vendor", started)
             
             # Temporal features
-            time_since_last = self._get_time_since_last_submission(claim, vendor_history)
+            time_since_last = self._get_time_since_last_submission(claim, vendor)
             submission_hour = claim.timestamp.hour
             is_weekend = 1.0 if claim.timestamp.weekday() >= 5 else 0.0
             is_after_hours = 1.0 if submission_hour < 8 or submission_hour > 18 else 0.0
-            days_since_first = (claim.timestamp - min(h.timestamp for h in vendor_history)).days if vendor_history else 0
+            days_since_first = self._days_between(claim.timestamp, vendor.first) if has_history else 0
+            started = self._record_feature_time(stats, "temporal", started)
             
             # Project-based features
             project_complexity = self.area_complexity.get(claim.area, 0.5)
-            area_frequency = sum(1 for c in historical_data if c.area == claim.area)
+            area_frequency = aggregates.area_count(store.areas.get(claim.area))
             seasonal_factor = self._get_seasonal_factor(claim.timestamp)
+            started = self._record_feature_time(stats, "project", started)
             
             # Pattern-based features
             amount_roundness = self._calculate_roundness(amount)
             invoice_length = len(claim.invoice_hash)
-            duplicate_similarity = self._calculate_duplicate_similarity(claim, historical_data)
+            started = self._record_feature_time(stats, "pattern", started)
+            duplicate_similarity = self._calculate_duplicate_similarity(claim, store)
+            self._record_feature_time(stats, "duplicate_similarity", started)
             
             features = {
                 'amount': amount,
@@ -130,22 +247,32 @@ class MLFraudDetector:
             # Return safe default features
             return np.zeros((1, len(self.feature_columns)))
     
-    def _get_vendor_age_days(self, claim, vendor_history: List) -> float:
+    @staticmethod
+    def _record_feature_time(stats: RuleStats, group: str, started: float) -> float:
+        """Record time spent on a feature group and return the next group's start time"""
+        now = time.perf_counter()
+        stats.record(group, now - started)
+        return now
+    
+    @staticmethod
+    def _days_between(timestamp: datetime, earlier: np.datetime64) -> int:
+        """Whole days from a stored timestamp to a claim timestamp (timedelta.days semantics)"""
+        return int((np.datetime64(timestamp, "us") - earlier) // np.timedelta64(1, "D"))
+    
+    def _get_vendor_age_days(self, claim, vendor: Optional[VendorAggregate]) -> float:
         """Calculate vendor age in days"""
-        if not vendor_history:
+        if vendor is None:
             return 0.0
         
-        first_claim = min(vendor_history, key=lambda x: x.timestamp)
-        age_days = (claim.timestamp - first_claim.timestamp).days
+        age_days = self._days_between(claim.timestamp, vendor.first)
         return min(age_days, 3650)  # Cap at 10 years
     
-    def _get_time_since_last_submission(self, claim, vendor_history: List) -> float:
+    def _get_time_since_last_submission(self, claim, vendor: Optional[VendorAggregate]) -> float:
         """Calculate time since vendor's last submission"""
-        if not vendor_history:
+        if vendor is None:
             return 365.0  # New vendor
         
-        last_submission = max(vendor_history, key=lambda x: x.timestamp)
-        time_diff = (claim.timestamp - last_submission.timestamp).days
+        time_diff = self._days_between(claim.timestamp, vendor.last)
         return min(time_diff, 730.0)  # Cap at 2 years
     
     def _get_seasonal_factor(self, timestamp: datetime) -> float:
@@ -181,29 +308,31 @@ class MLFraudDetector:
         else:
             return 0.0
     
-    def _calculate_duplicate_similarity(self, claim, historical_data: List) -> float:
+    def _calculate_duplicate_similarity(self, claim, store: ClaimStore) -> float:
         """Calculate similarity to existing claims"""
-        if not historical_data:
+        if len(store) == 0:
             return 0.0
         
         max_similarity = 0.0
         
-        for hist_claim in historical_data[-50]:  # Check last 50 claims for efficiency
-            if hist_claim.claim_id == claim.claim_id:
+        for row in range(max(0, len(store) - 50), len(store)):  # Check last 50 claims for efficiency
+            if store.claim_ids[row] == claim.claim_id:
                 continue
             
+            hist_amount = store.amounts[row]
+            
             # Amount similarity
-            amount_diff = abs(claim.amount - hist_claim.amount) / max(claim.amount, hist_claim.amount)
+            amount_diff = abs(claim.amount - hist_amount) / max(claim.amount, hist_amount, 1)
             amount_sim = 1.0 - min(amount_diff, 1.0)
             
             # Hash similarity
-            hash_sim = self._string_similarity(claim.invoice_hash, hist_claim.invoice_hash)
+            hash_sim = self._string_similarity(claim.invoice_hash, store.invoice_hashes[row])
             
             # Vendor similarity
-            vendor_sim = 1.0 if claim.vendor_id == hist_claim.vendor_id else 0.0
+            vendor_sim = 1.0 if store.vendor_codes[row] == store.vendors.get(claim.vendor_id) else 0.0
             
             # Area similarity
-            area_sim = 1.0 if claim.area == hist_claim.area else 0.0
+            area_sim = 1.0 if store.area_codes[row] == store.areas.get(claim.area) else 0.0
             
             # Combined similarity
             combined_sim = (amount_sim * 0.4 + hash_sim * 0.3 + vendor_sim * 0.2 + area_sim * 0.1)
@@ -222,6 +351,138 @@ class MLFraudDetector:
         matches = sum(1 for a, b in zip(str1, str2) if a == b)
         return matches / len(str1)
     
+    # ------------------------------------------------------------------
+    # Vectorized feature matrix (training)
+    # ------------------------------------------------------------------
+    
+    # Rows per block when comparing claims with the duplicate-similarity window
+    SIMILARITY_BLOCK_ROWS = 8192
+    
+    def prepare_feature_matrix(self, store: ClaimStore) -> np.ndarray:
+        """
+        Feature rows for every claim in the store, equal to calling
+        prepare_features(claim, store) per claim, computed column-wise
+        History features are gathered from the store's aggregates by vendor and
+        area code; duplicate similarity compares all rows against the shared
+        last-50 window at once.
+        """
+        n = len(store)
+        if n == 0:
+            return np.zeros((0, len(self.feature_columns)))
+        
+        aggregates = store.features
+        amounts = store.amounts
+        timestamps = store.timestamps
+        vendor_codes = store.vendor_codes
+        area_codes = store.area_codes
+        
+        # Amount-based features
+        amount_count, amount_mean, amount_std = aggregates.amount_stats()
+        amount_zscore = (amounts - amount_mean) / (amount_std + 1e-8)
+        
+        # Vendor-based features (every stored claim's vendor has history)
+        vendors = aggregates.vendors
+        counts = np.array([v.count for v in vendors])[vendor_codes]
+        totals = np.array([v.total for v in vendors])[vendor_codes]
+        first_seen = np.array([v.first if v.count else np.datetime64("NaT", "us") for v in vendors])[vendor_codes]
+        last_seen = np.array([v.last if v.count else np.datetime64("NaT", "us") for v in vendors])[vendor_codes]
+        area_diversity = np.array([len(v.areas) for v in vendors])[vendor_codes]
+        vendor_avg_amount = totals / counts
+        days_since_first = (timestamps - first_seen) // np.timedelta64(1, "D")
+        
+        # Temporal features
+        day_start = timestamps.astype("datetime64[D]")
+        hours = (timestamps - day_start) // np.timedelta64(1, "h")
+        weekdays = (day_start.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        months = timestamps.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        
+        # Project-based features
+        complexity_by_code = np.array([self.area_complexity.get(area, 0.5) for area in store.areas.values])
+        area_counts = np.array(aggregates.area_counts)
+        seasonal_factor = np.select(
+            [months == 3, months == 4, (months == 12) | (months == 1)], [0.9, 0.3, 0.6], default=0.5
+        )
+        
+        columns = {
+            'amount': amounts,
+            'amount_log': np.log(np.maximum(amounts, 1)),
+            'amount_zscore': amount_zscore,
+            'vendor_submissions_count': counts,
+            'vendor_success_rate': np.minimum(0.95, counts * 0.1 + 0.5),
+            'vendor_age_days': np.minimum(days_since_first, 3650),
+            'vendor_avg_amount': vendor_avg_amount,
+            'amount_vs_vendor_avg': amounts / np.maximum(vendor_avg_amount, 1),
+            'vendor_area_diversity': area_diversity,
+            'time_since_last_submission': np.minimum((timestamps - last_seen) // np.timedelta64(1, "D"), 730.0),
+            'submission_hour': hours,
+            'is_weekend': (weekdays >= 5).astype(float),
+            'is_after_hours': ((hours < 8) | (hours > 18)).astype(float),
+            'days_since_first_claim': days_since_first,
+            'project_complexity_score': complexity_by_code[area_codes],
+            'area_frequency': area_counts[area_codes],
+            'seasonal_factor': seasonal_factor,
+            'amount_roundness': self._roundness_column(amounts),
+            'invoice_length': np.fromiter((len(h) for h in store.invoice_hashes), dtype=float, count=n),
+            'duplicate_similarity': self._duplicate_similarity_column(store)
+        }
+        
+        return np.column_stack([np.asarray(columns[col], dtype=float) for col in self.feature_columns])
+    
+    @staticmethod
+    def _roundness_column(amounts: np.ndarray) -> np.ndarray:
+        """Vectorized _calculate_roundness"""
+        magnitude = np.abs(np.trunc(amounts))
+        scores = np.zeros(len(amounts))
+        # Ascending so the roundest matching level wins, like the elif chain
+        for zeros, score in ((1, 0.2), (2, 0.4), (3, 0.6), (4, 0.8), (5, 1.0)):
+            unit = 10.0 ** zeros
+            scores[(magnitude >= unit) & (np.fmod(magnitude, unit) == 0)] = score
+        scores[magnitude == 0] = 0.2  # str(0) ends with '0'
+        return scores
+    
+    def _duplicate_similarity_column(self, store: ClaimStore) -> np.ndarray:
+        """Vectorized _calculate_duplicate_similarity for every stored claim"""
+        n = len(store)
+        window = np.arange(max(0, n - 50), n)
+        amounts = store.amounts
+        hashes = store.invoice_hashes
+        lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64, count=n)
+        result = np.zeros(n)
+        
+        for start in range(0, n, self.SIMILARITY_BLOCK_ROWS):
+            rows = np.arange(start, min(start + self.SIMILARITY_BLOCK_ROWS, n))
+            claim_amounts = amounts[rows][:, None]
+            window_amounts = amounts[window][None, :]
+            
+            amount_diff = np.abs(claim_amounts - window_amounts) / np.maximum(np.maximum(claim_amounts, window_amounts), 1)
+            amount_sim = 1.0 - np.minimum(amount_diff, 1.0)
+            hash_sim = np.zeros((len(rows), len(window)))
+            
+            # Positional hash matches, one comparison matrix per hash length
+            for length in np.unique(lengths[window]):
+                if length == 0:
+                    continue
+                row_mask = lengths[rows] == length
+                columns = np.flatnonzero(lengths[window] == length)
+                if not row_mask.any():
+                    continue
+                row_chars = np.array([hashes[r] for r in rows[row_mask]], dtype=f"U{length}").view(np.uint32)
+                window_chars = np.array([hashes[window[c]] for c in columns], dtype=f"U{length}").view(np.uint32)
+                row_chars = row_chars.reshape(-1, length)
+                window_chars = window_chars.reshape(-1, length)
+                matches = (row_chars[:, None, :] == window_chars[None, :, :]).sum(axis=2)
+                hash_sim[np.ix_(np.flatnonzero(row_mask), columns)] = matches / length
+            
+            vendor_sim = (store.vendor_codes[rows][:, None] == store.vendor_codes[window][None, :]).astype(float)
+            area_sim = (store.area_codes[rows][:, None] == store.area_codes[window][None, :]).astype(float)
+            combined = amount_sim * 0.4 + hash_sim * 0.3 + vendor_sim * 0.2 + area_sim * 0.1
+            
+            # Each claim skips its own claim_id
+            valid = store.claim_ids[rows][:, None] != store.claim_ids[window][None, :]
+            result[rows] = np.max(combined, axis=1, initial=0.0, where=valid)
+        
+        return result
+    
     def train(self, historical_data: List, fraud_labels: List[bool]):
         """
         Train both anomaly detection and classification models
@@ -233,30 +494,31 @@ class MLFraudDetector:
             
             logger.info(f"Training ML models with {len(historical_data)} samples...")
             
-            # Prepare feature matrix
-            features_list = []
-            for claim in historical_data:
-                features = self.prepare_features(claim, historical_data)
-                features_list.append(features.flatten())
-            
-            X = np.array(features_list)
+            # Prepare feature matrix in one vectorized pass over the store
+            store = historical_data if isinstance(historical_data, ClaimStore) else ClaimStore.from_claims(historical_data)
+            X = self.prepare_feature_matrix(store)
             y = np.array(fraud_labels)
             
             # Handle any NaN or infinite values
             X = np.nan_to_num(X, nan=0.0, posinf=999999, neginf=-999999)
             
+            # New models are fitted off to the side and published together,
+            # so predictions keep using the current set until training ends
+            scaler = RobustScaler()
+            classification_model = None
+            
             # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            X_scaled = scaler.fit_transform(X)
             
             # Train anomaly detection model (unsupervised)
-            self.anomaly_model = IsolationForest(
+            anomaly_model = IsolationForest(
                 contamination=min(0.15, sum(fraud_labels) / len(fraud_labels) + 0.05),
                 random_state=42,
                 n_estimators=200,
                 max_samples='auto',
                 bootstrap=True
             )
-            self.anomaly_model.fit(X_scaled)
+            anomaly_model.fit(X_scaled)
             
             # Train classification model (supervised) if we have enough fraud cases
             fraud_count = sum(fraud_labels)
@@ -268,7 +530,7 @@ class MLFraudDetector:
                     )
                     
                     # Train Random Forest classifier
-                    self.classification_model = RandomForestClassifier(
+                    classification_model = RandomForestClassifier(
                         n_estimators=100,
                         max_depth=10,
                         min_samples_split=5,
@@ -276,21 +538,22 @@ class MLFraudDetector:
                         random_state=42,
                         class_weight='balanced'
                     )
-                    self.classification_model.fit(X_train, y_train)
+                    classification_model.fit(X_train, y_train)
                     
                     # Evaluate model performance
-                    y_pred = self.classification_model.predict(X_test)
-                    y_prob = self.classification_model.predict_proba(X_test)[:, 1]
+                    y_pred = classification_model.predict(X_test)
+                    y_prob = classification_model.predict_proba(X_test)[:, 1]
                     
                     auc_score = roc_auc_score(y_test, y_prob)
                     logger.info(f"Classification model AUC: {auc_score:.3f}")
                     
                 except Exception as e:
                     logger.warning(f"Classification model training failed: {e}")
-                    self.classification_model = None
+                    classification_model = None
             
+            self.models = ModelSet(anomaly_model, classification_model, scaler)
             self.is_trained = True
-            self.last_training = datetime.now()
+            self.last_training = self.clock.now()
             
             logger.info(f"ML models trained successfully. Fraud cases: {fraud_count}/{len(fraud_labels)}")
             
@@ -306,38 +569,120 @@ class MLFraudDetector:
         Predict fraud probability using ensemble of models
         """
         try:
-            if not self.is_trained:
+            if not self.can_predict:
                 return 0.5  # Neutral score if not trained
             
             features = self.prepare_features(claim, historical_data)
-            features_scaled = self.scaler.transform(features)
-            
-            # Anomaly detection score
-            anomaly_score = self.anomaly_model.decision_function(features_scaled)[0]
-            # Convert to probability (Isolation Forest returns negative values for anomalies)
-            anomaly_prob = max(0, min(1, 0.5 - (anomaly_score / 2)))
-            
-            # Classification score (if available)
-            if self.classification_model is not None:
-                try:
-                    class_prob = self.classification_model.predict_proba(features_scaled)[0][1]
-                    # Ensemble prediction: weighted average
-                    final_prob = 0.6 * class_prob + 0.4 * anomaly_prob
-                except Exception as e:
-                    logger.warning(f"Classification prediction failed: {e}")
-                    final_prob = anomaly_prob
-            else:
-                final_prob = anomaly_prob
-            
-            # Apply business logic constraints
-            final_prob = max(0.0, min(1.0, final_prob))
-            
-            return final_prob
+            return float(self._ensemble_probabilities(features)[0])
             
         except Exception as e:
             logger.error(f"ML prediction failed: {e}")
             return 0.5  # Return neutral score on error
     
+    def predict_fraud_probability_many(self, claims: List, historical_data: List) -> np.ndarray:
+        """
+        Ensemble fraud probabilities for many claims against the same history
+        Features are stacked into one matrix so the scaler and each model run
+        once per batch instead of once per claim; results equal
+        predict_fraud_probability for each claim.
+        """
+        if not self.can_predict:
+            return np.full(len(claims), 0.5)
+        if not claims:
+            return np.empty(0)
+        
+        try:
+            features = np.vstack([self.prepare_features(claim, historical_data) for claim in claims])
+            return self._ensemble_probabilities(features)
+            
+        except Exception as e:
+            logger.error(f"ML batch prediction failed: {e}")
+            return np.full(len(claims), 0.5)
+    
+    @property
+    def can_predict(self) -> bool:
+        """True once batch models are trained or the streaming detector has a reference window"""
+        return self.is_trained or (self.online_model is not None and self.online_model.ready)
+    
+    def _compiled_models(self, models: ModelSet) -> Optional[CompiledModels]:
+        """Flat evaluators for a model set, compiled on first use after each swap"""
+        if not self.use_compiled_models:
+            return None
+        compiled = self._compiled
+        if compiled is None or compiled.models is not models:
+            try:
+                compiled = CompiledModels(models)
+            except Exception as e:
+                logger.warning(f"Model compilation failed, scoring through sklearn: {e}")
+                self.use_compiled_models = False
+                return None
+            self._compiled = compiled
+        return compiled
+    
+    def _ensemble_probabilities(self, features: np.ndarray) -> np.ndarray:
+        """Weighted anomaly/classifier probabilities for a feature matrix"""
+        models = self.models  # One consistent set even if a swap lands mid-call
+        online_model = self.online_model
+        anomaly_probs = None
+        
+        compiled = self._compiled_models(models) if self.is_trained else None
+        if self.is_trained:
+            if compiled is not None:
+                features_scaled = compiled.transform(features)
+                anomaly_scores = compiled.anomaly.decision_function(features_scaled)
+            else:
+                features_scaled = models.scaler.transform(features)
+                # Anomaly detection score
+                anomaly_scores = models.anomaly_model.decision_function(features_scaled)
+            # Convert to probability (Isolation Forest returns negative values for anomalies)
+            anomaly_probs = np.clip(0.5 - anomaly_scores / 2, 0.0, 1.0)
+        
+        # Streaming anomaly score, averaged with the batch one when both exist
+        if online_model is not None and online_model.ready:
+            online_probs = online_model.score_many(features)
+            anomaly_probs = online_probs if anomaly_probs is None else (anomaly_probs + online_probs) / 2
+        
+        # Classification score (if available)
+        final_probs = anomaly_probs
+        if self.is_trained and models.classification_model is not None:
+            try:
+                if compiled is not None:
+                    class_probs = compiled.classifier.predict(features_scaled)
+                else:
+                    class_probs = models.classification_model.predict_proba(features_scaled)[:, 1]
+                # Ensemble prediction: weighted average
+                final_probs = 0.6 * class_probs + 0.4 * anomaly_probs
+            except Exception as e:
+                logger.warning(f"Classification prediction failed: {e}")
+        
+        # Apply business logic constraints
+        return np.clip(final_probs, 0.0, 1.0)
+    
+    def enable_online_learning(self, historical_data: Optional[List] = None, **params) -> HalfSpaceTrees:
+        """
+        Start the streaming anomaly detector, optionally seeded from history
+        params are passed to HalfSpaceTrees (window_size, n_trees, depth, ...).
+        """
+        online_model = HalfSpaceTrees(len(self.feature_columns), **params)
+        if historical_data is not None and len(historical_data):
+            store = historical_data if isinstance(historical_data, ClaimStore) else ClaimStore.from_claims(historical_data)
+            online_model.learn_many(self.prepare_feature_matrix(store))
+        self.online_model = online_model
+        return online_model
+    
+    def observe(self, claim, historical_data):
+        """
+        Feed an ingested claim to the streaming detector
+        Call before the claim is added to historical_data, matching the
+        history it was scored against.
+        """
+        if self.online_model is None:
+            return
+        try:
+            self.online_model.learn_one(self.prepare_features(claim, historical_data)[0])
+        except Exception as e:
+            logger.warning(f"Online model update failed: {e}")
+    
     def get_feature_importance(self) -> Dict[str, float]:
         """Get feature importance from trained models"""
         if not self.is_trained or self.classification_model is None:
@@ -365,7 +710,13 @@ class MLFraudDetector:
             "has_anomaly_model": self.anomaly_model is not None,
             "has_classification_model": self.classification_model is not None,
             "feature_count": len(self.feature_columns),
-            "scaler_type": type(self.scaler).__name__
+            "scaler_type": type(self.scaler).__name__,
+            "artifact": self.artifact,
+            "online_model": None if self.online_model is None else {
+                "ready": self.online_model.ready,
+                "window_size": self.online_model.window_size,
+                "windows_completed": self.online_model.windows_completed
+            }
         }
         
         if self.is_trained and self.classification_model:
@@ -373,94 +724,175 @@ class MLFraudDetector:
         
         return stats
     
-    def _save_models(self):
-        """Save trained models to disk"""
+    def _save_models(self) -> Optional[str]:
+        """
+        Save trained models as a new versioned artifact and return its path
+        The artifact directory is complete before the CURRENT pointer is
+        replaced, so loaders never see a partially written model set.
+        """
         try:
-            model_dir = "models"
-            os.makedirs(model_dir, exist_ok=True)
-            
-            if self.anomaly_model:
-                joblib.dump(self.anomaly_model, f"{model_dir}/anomaly_model.joblib")
+            name = f"model-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+            path = os.path.join(self.model_dir, name)
+            os.makedirs(path)
             
-            if self.classification_model:
-                joblib.dump(self.classification_model, f"{model_dir}/classification_model.joblib")
-            
-            joblib.dump(self.scaler, f"{model_dir}/scaler.joblib")
+            # joblib stores model arrays unpickled so they can be memory-mapped on load
+            joblib.dump(self.models._asdict(), os.path.join(path, "models.joblib"))
             
             # Save metadata
-            metadata = {
+            manifest = {
+                "format_version": MODEL_ARTIFACT_FORMAT_VERSION,
+                "artifact": name,
                 "model_version": self.model_version,
                 "last_training": self.last_training.isoformat() if self.last_training else None,
                 "feature_columns": self.feature_columns
             }
+            with open(os.path.join(path, "manifest.json"), 'w') as f:
+                json.dump(manifest, f, indent=2)
             
-            with open(f"{model_dir}/metadata.json", 'w') as f:
-                json.dump(metadata, f, indent=2)
+            pointer = os.path.join(self.model_dir, CURRENT_POINTER)
+            with open(f"{pointer}.tmp", 'w') as f:
+                f.write(name)
+            os.replace(f"{pointer}.tmp", pointer)
             
-            logger.info("Models saved successfully")
+            self.artifact = name
+            self._prune_artifacts()
+            logger.info(f"Models saved as {name}")
+            return path
             
         except Exception as e:
             logger.error(f"Failed to save models: {e}")
+            return None
+    
+    def _prune_artifacts(self):
+        # Processes still mapping a deleted artifact keep its pages until they swap
+        artifacts = sorted(d for d in os.listdir(self.model_dir) if d.startswith("model-"))
+        for name in artifacts[:-MODEL_ARTIFACTS_TO_KEEP]:
+            if name != self.artifact:
+                shutil.rmtree(os.path.join(self.model_dir, name), ignore_errors=True)
     
-    def load_models(self):
-        """Load previously trained models from disk"""
+    def load_models(self, mmap: bool = True) -> bool:
+        """
+        Load the current model artifact and swap it in
+        Model arrays are memory-mapped read-only by default, so processes
+        loading the same artifact share its pages. Predictions in flight
+        finish on the previous model set. Returns True if models were loaded.
+        """
         try:
-            model_dir = "models"
-            
-            if os.path.exists(f"{model_dir}/anomaly_model.joblib"):
-                self.anomaly_model = joblib.load(f"{model_dir}/anomaly_model.joblib")
-            
-            if os.path.exists(f"{model_dir}/classification_model.joblib"):
-                self.classification_model = joblib.load(f"{model_dir}/classification_model.joblib")
-            
-            if os.path.exists(f"{model_dir}/scaler.joblib"):
-                self.scaler = joblib.load(f"{model_dir}/scaler.joblib")
-            
-            if os.path.exists(f"{model_dir}/metadata.json"):
-                with open(f"{model_dir}/metadata.json", 'r') as f:
-                    metadata = json.load(f)
-                    self.model_version = metadata.get("model_version", "1.0.0")
-                    if metadata.get("last_training"):
-                        self.last_training = datetime.fromisoformat(metadata["last_training"])
-            
-            self.is_trained = self.anomaly_model is not None
+            pointer = os.path.join(self.model_dir, CURRENT_POINTER)
+            if not os.path.exists(pointer):
+                return False
+            
+            with open(pointer) as f:
+                name = f.read().strip()
+            path = os.path.join(self.model_dir, name)
+            with open(os.path.join(path, "manifest.json")) as f:
+                manifest = json.load(f)
+            if manifest.get("format_version") != MODEL_ARTIFACT_FORMAT_VERSION:
+                logger.warning(f"Ignoring model artifact {name} with format version {manifest.get('format_version')}")
+                return False
+            if manifest.get("feature_columns") != self.feature_columns:
+                logger.warning(f"Ignoring model artifact {name} trained on different features")
+                return False
+            
+            models = joblib.load(os.path.join(path, "models.joblib"), mmap_mode="r" if mmap else None)
+            
+            self.models = ModelSet(**models)
+            self.is_trained = self.models.anomaly_model is not None
+            self.model_version = manifest.get("model_version", "1.0.0")
+            if manifest.get("last_training"):
+                self.last_training = datetime.fromisoformat(manifest["last_training"])
+            self.artifact = name
             
             if self.is_trained:
-                logger.info("Models loaded successfully")
+                logger.info(f"Models loaded from {name}")
+            return self.is_trained
             
         except Exception as e:
             logger.error(f"Failed to load models: {e}")
-            self.is_trained = False
+            return False
     
     def explain_prediction(self, claim, historical_data: List) -> Dict[str, any]:
         """
         Provide explanation for a fraud prediction
         """
+        return self.explain_predictions([claim], historical_data)[0]
+    
+    def explain_predictions(self, claims: List, historical_data: List) -> List[Dict[str, any]]:
+        """
+        Explain fraud predictions for a batch of claims
+        Factors are local path contributions of each feature through the
+        classifier's trees, computed for the whole batch at once and cached
+        per feature vector until the models change.
+        """
         if not self.is_trained:
-            return {"error": "Model not trained"}
+            return [{"error": "Model not trained"} for _ in claims]
+        if not claims:
+            return []
         
         try:
-            features = self.prepare_features(claim, historical_data)
-            fraud_prob = self.predict_fraud_probability(claim, historical_data)
-            
-            # Get feature values
-            feature_values = dict(zip(self.feature_columns, features.flatten()))
+            features = np.vstack([self.prepare_features(claim, historical_data) for claim in claims])
+            fraud_probs = self._ensemble_probabilities(features)
+            models = self.models
+            bias, contributions = self._attributions(models, features)
             
-            # Get feature importance (if available)
-            feature_importance = self.get_feature_importance()
+            # Global importances reported alongside the local contributions
+            importances = np.zeros(len(self.feature_columns))
+            if models.classification_model is not None:
+                importances = models.classification_model.feature_importances_
             
-            # Calculate contribution of each feature
             explanations = []
-            for feature, value in feature_values.items():
-                importance = feature_importance.get(feature, 0)
-                contribution = importance * value if importance > 0.05 else 0
-                
-                if contribution > 0.01:  # Only show significant contributions
-                    explanations.append({
-                        "feature": feature,
-                        "value": round(value, 3),
-                        "importance": round(importance, 3),
-                        "contribution": round(contribution, 3)
-                    })
-            
-            # Sort
\ No newline at end of file
+            for claim, row, fraud_prob, contribution in zip(claims, features, fraud_probs, contributions):
+                # Strongest features pushing toward fraud first
+                order = np.argsort(-contribution, kind="stable")
+                top_factors = [
+                    {
+                        "feature": self.feature_columns[i],
+                        "value": round(float(row[i]), 3),
+                        "importance": round(float(importances[i]), 3),
+                        "contribution": round(float(contribution[i]), 3)
+                    }
+                    for i in order[:5] if contribution[i] > 0.01  # Only show significant contributions
+                ]
+                explanations.append({
+                    "claim_id": claim.claim_id,
+                    "fraud_probability": round(float(fraud_prob), 3),
+                    "baseline_probability": None if bias is None else round(bias, 3),
+                    "top_factors": top_factors,
+                    "feature_values": {k: round(float(v), 3) for k, v in zip(self.feature_columns, row)},
+                    "model_version": self.model_version
+                })
+            return explanations
+            
+        except Exception as e:
+            logger.error(f"Failed to explain prediction: {e}")
+            return [{"error": str(e)} for _ in claims]
+    
+    def _attributions(self, models: ModelSet, features: np.ndarray) -> Tuple[Optional[float], np.ndarray]:
+        """Classifier bias and per-feature contributions for each row, from cache where possible"""
+        if models.classification_model is None:
+            return None, np.zeros(features.shape)
+        
+        compiled = self._compiled_models(models)
+        flat_classifier = compiled.classifier if compiled is not None else FlatTreeEnsemble.from_classifier(
+            models.classification_model
+        )
+        if self._explained_models is not models:
+            self._explanations.clear()
+            self._explained_models = models
+        
+        keys = [row.tobytes() for row in features]
+        missing = [i for i, key in enumerate(keys) if key not in self._explanations]
+        if missing:
+            scaled = models.scaler.transform(features[missing])
+            computed = flat_classifier.contributions(scaled)
+            for i, contribution in zip(missing, computed):
+                self._explanations[keys[i]] = contribution
+        
+        contributions = np.empty(features.shape)
+        for i, key in enumerate(keys):
+            self._explanations.move_to_end(key)
+            contributions[i] = self._explanations[key]
+        while len(self._explanations) > EXPLANATION_CACHE_SIZE:
+            self._explanations.popitem(last=False)
+        
+        return flat_classifier.bias, contributions
@@ -0,0 +1,151 @@
+"""
+Streaming Anomaly Detection
+Half-space trees (Tan, Ting & Liu, 2011) over ML feature vectors, updated
+per ingested claim in constant time and memory
+
+Claims are buffered into a fixed-size window. When the window fills it
+becomes the reference profile: features are normalized with the window's own
+median and IQR, and its mass is counted into randomly built half-space trees.
+Claims are scored against the latest complete window, so the detector tracks
+drift without a batch refit.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+# Claims per reference window
+DEFAULT_WINDOW_SIZE = 256
+
+DEFAULT_TREES = 25
+DEFAULT_DEPTH = 10
+
+class HalfSpaceTrees:
+    """
+    Ensemble of complete binary half-space trees in heap layout
+    Node i has children 2i+1 and 2i+2; internal nodes hold a split feature
+    and value, and every node holds the reference window's mass.
+    """
+
+    def __init__(self, n_features: int, n_trees: int = DEFAULT_TREES, depth: int = DEFAULT_DEPTH,
+                 window_size: int = DEFAULT_WINDOW_SIZE, size_limit: Optional[float] = None, seed: int = 42):
+        self.n_features = n_features
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        # Scoring stops descending once a node's mass is this small
+        self.size_limit = 0.1 * window_size if size_limit is None else size_limit
+
+        self.n_internal = 2 ** depth - 1
+        self.n_nodes = 2 ** (depth + 1) - 1
+        self._build_trees(np.random.default_rng(seed))
+
+        self.window = np.zeros((window_size, n_features))
+        self.window_fill = 0
+        self.windows_completed = 0
+        self.center = np.zeros(n_features)
+        self.scale = np.ones(n_features)
+        self.reference_mass: Optional[np.ndarray] = None
+        self.reference_scores: Optional[np.ndarray] = None
+
+    def _build_trees(self, rng: np.random.Generator):
+        """Random splits over a perturbed unit work space, one level-order pass for all trees"""
+        anchor = rng.uniform(size=(self.n_trees, self.n_features))
+        extent = 2 * np.maximum(anchor, 1 - anchor)
+        node_min = np.empty((self.n_trees, self.n_internal, self.n_features))
+        node_max = np.empty_like(node_min)
+        node_min[:, 0] = anchor - extent
+        node_max[:, 0] = anchor + extent
+
+        self.split_features = rng.integers(self.n_features, size=(self.n_trees, self.n_internal))
+        self.split_values = np.empty((self.n_trees, self.n_internal))
+        trees = np.arange(self.n_trees)
+        for node in range(self.n_internal):
+            feature = self.split_features[:, node]
+            low, high = node_min[trees, node, feature], node_max[trees, node, feature]
+            middle = (low + high) / 2
+            self.split_values[:, node] = middle
+
+            left, right = 2 * node + 1, 2 * node + 2
+            if right < self.n_internal:
+                node_min[:, left], node_max[:, left] = node_min[:, node], node_max[:, node]
+                node_min[:, right], node_max[:, right] = node_min[:, node], node_max[:, node]
+                node_max[trees, left, feature] = middle
+                node_min[trees, right, feature] = middle
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Reference arrays may stay memory-mapped, but the window is written in place
+        self.window = np.array(self.window)
+
+    @property
+    def ready(self) -> bool:
+        return self.reference_mass is not None
+
+    def _normalize(self, X: np.ndarray) -> np.ndarray:
+        """Squash features into (0, 1) around the reference window's median"""
+        z = np.clip((X - self.center) / self.scale, -30.0, 30.0)
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def _paths(self, X: np.ndarray) -> np.ndarray:
+        """Node visited at every level of every tree, shape (depth + 1, samples, trees)"""
+        X = self._normalize(X)
+        rows = np.arange(len(X))[:, None]
+        trees = np.arange(self.n_trees)
+        paths = np.zeros((self.depth + 1, len(X), self.n_trees), dtype=np.int64)
+        for level in range(self.depth):
+            node = paths[level]
+            feature = self.split_features[trees, node]
+            go_right = X[rows, feature] >= self.split_values[trees, node]
+            paths[level + 1] = 2 * node + 1 + go_right
+        return paths
+
+    def _mass_scores(self, paths: np.ndarray) -> np.ndarray:
+        """Half-space tree scores; higher means the claim sits in a denser region"""
+        mass = self.reference_mass[np.arange(self.n_trees), paths]
+        stop = mass <= self.size_limit
+        stop[-1] = True
+        level = stop.argmax(axis=0)
+        reached = np.take_along_axis(mass, level[None], axis=0)[0]
+        return (reached * 2.0 ** level).sum(axis=1)
+
+    def learn_one(self, x: np.ndarray):
+        """Add one feature vector to the current window"""
+        self.window[self.window_fill] = np.nan_to_num(x, nan=0.0, posinf=999999, neginf=-999999)
+        self.window_fill += 1
+        if self.window_fill == self.window_size:
+            self._complete_window()
+
+    def learn_many(self, X: np.ndarray):
+        for x in X:
+            self.learn_one(x)
+
+    def _complete_window(self):
+        """Promote the full window to the reference profile"""
+        window = self.window
+        self.center = np.median(window, axis=0)
+        q1, q3 = np.percentile(window, [25, 75], axis=0)
+        spread = np.where(q3 - q1 > 0, q3 - q1, np.std(window, axis=0))
+        self.scale = np.where(spread > 0, spread, 1.0)
+
+        paths = self._paths(window)
+        flat = (np.arange(self.n_trees) * self.n_nodes + paths).ravel()
+        self.reference_mass = np.bincount(flat, minlength=self.n_trees * self.n_nodes).reshape(
+            self.n_trees, self.n_nodes
+        ).astype(np.float64)
+        self.reference_scores = np.sort(self._mass_scores(paths))
+
+        self.window_fill = 0
+        self.windows_completed += 1
+
+    def score_many(self, X: np.ndarray) -> np.ndarray:
+        """
+        Anomaly probability per row: the share of reference-window claims
+        sitting in denser regions than the row (0.5 for a typical claim)
+        """
+        X = np.nan_to_num(np.atleast_2d(X), nan=0.0, posinf=999999, neginf=-999999)
+        scores = self._mass_scores(self._paths(X))
+        denser = len(self.reference_scores) - np.searchsorted(self.reference_scores, scores, side="right")
+        ties = np.searchsorted(self.reference_scores, scores, side="right") - \
+            np.searchsorted(self.reference_scores, scores, side="left")
+        return (denser + 0.5 * ties) / len(self.reference_scores)
@@ -0,0 +1,127 @@
+"""
+ML Prediction Micro-Batching
+Collects concurrent single-claim ML predictions for a few milliseconds (or
+until a batch fills) and scores them with one batched model call
+
+All batching runs on the event loop: predictions are synchronous NumPy work,
+so a batch is scored between awaits and sees one consistent claim history.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from rule_stats import Histogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 64
+
+# Longest a request waits for others to join its batch
+DEFAULT_MAX_WAIT_MS = 2.0
+
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+WAIT_SECONDS_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+class PredictionBatcher:
+    """
+    Async front end for a batched predictor
+    predict_many(claims, historical_data) must return one probability per
+    claim, e.g. MLFraudDetector.predict_fraud_probability_many.
+    """
+
+    def __init__(self, predict_many: Callable[[List, object], Sequence[float]],
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        self.predict_many = predict_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self.pending: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self._arrived: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+
+        self.queue_depth = Histogram(
+            "fraud_ml_batcher_queue_depth", "Requests already queued when a request arrives", QUEUE_DEPTH_BUCKETS
+        )
+        self.batch_size = Histogram("fraud_ml_batcher_batch_size", "Claims scored per model call", BATCH_SIZE_BUCKETS)
+        self.wait_seconds = Histogram(
+            "fraud_ml_batcher_wait_seconds", "Time from enqueue to prediction", WAIT_SECONDS_BUCKETS
+        )
+
+    async def predict(self, claim, historical_data) -> float:
+        """Fraud probability for one claim, scored as part of the next batch"""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self.queue_depth.observe(len(self.pending))
+        self.pending.append((claim, historical_data, future, time.perf_counter()))
+        self._arrived.set()
+        if len(self.pending) >= self.max_batch_size:
+            self._full.set()
+        return await future
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            # Events are bound to the loop that first waits on them
+            self._arrived = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._arrived.wait()
+            if len(self.pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self.pending[:self.max_batch_size]
+            self.pending = self.pending[self.max_batch_size:]
+            if len(self.pending) < self.max_batch_size:
+                self._full.clear()
+            if not self.pending:
+                self._arrived.clear()
+            self._score(batch)
+
+    def _score(self, batch: List[tuple]):
+        # Requests may carry different histories; each group gets one model call
+        groups: Dict[int, List[tuple]] = {}
+        for request in batch:
+            groups.setdefault(id(request[1]), []).append(request)
+
+        for requests in groups.values():
+            live = [request for request in requests if not request[2].done()]  # Skip cancelled callers
+            if not live:
+                continue
+            self.batch_size.observe(len(live))
+            try:
+                probabilities = self.predict_many([request[0] for request in live], live[0][1])
+            except Exception as e:
+                logger.error(f"Batched ML prediction failed: {e}")
+                for request in live:
+                    request[2].set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            for (_, _, future, queued_at), probability in zip(live, probabilities):
+                self.wait_seconds.observe(now - queued_at)
+                future.set_result(float(probability))
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            "queued": len(self.pending),
+            "queue_depth": self.queue_depth.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+            "wait_seconds": self.wait_seconds.snapshot()
+        }
+
+    def to_prometheus(self) -> str:
+        return "".join(histogram.to_prometheus() for histogram in (self.queue_depth, self.batch_size, self.wait_seconds))
@@ -0,0 +1,160 @@
+"""
+Per-Rule Instrumentation
+Low-overhead call counts, latency, trigger rates and score contributions
+for rules engine checks and ML feature extraction, plus simple histograms
+"""
+
+from bisect import bisect_left
+
+import numpy as np
+from typing import Dict, List, Sequence
+
+# Latency samples kept per rule for percentile estimates
+LATENCY_WINDOW = 2048
+
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+class _RuleCounter:
+    """Counters for one rule; latency percentiles come from a ring of recent samples"""
+
+    __slots__ = ("calls", "total_seconds", "triggers", "contribution", "samples", "next_sample")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.triggers = 0
+        self.contribution = 0.0
+        self.samples: List[float] = []
+        self.next_sample = 0
+
+    def add_sample(self, seconds: float):
+        if len(self.samples) < LATENCY_WINDOW:
+            self.samples.append(seconds)
+        else:
+            self.samples[self.next_sample] = seconds
+            self.next_sample = (self.next_sample + 1) % LATENCY_WINDOW
+
+class RuleStats:
+    """
+    Per-rule timers and counters
+    record() is called on the scoring hot path, so it only bumps counters and
+    stores one latency sample; percentiles are computed when stats are read.
+    """
+
+    def __init__(self, metric_prefix: str = "fraud_rule", label: str = "rule", track_outcomes: bool = True):
+        """track_outcomes: report trigger rates and score contributions (off for pure timers)"""
+        self.metric_prefix = metric_prefix
+        self.label = label
+        self.track_outcomes = track_outcomes
+        self.counters: Dict[str, _RuleCounter] = {}
+
+    def _counter(self, name: str) -> _RuleCounter:
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = _RuleCounter()
+        return counter
+
+    def record(self, name: str, seconds: float, triggered: bool = False, contribution: float = 0.0):
+        """Record one evaluation of a rule"""
+        counter = self._counter(name)
+        counter.calls += 1
+        counter.total_seconds += seconds
+        counter.triggers += triggered
+        counter.contribution += contribution
+        counter.add_sample(seconds)
+
+    def record_batch(self, name: str, seconds: float, calls: int, triggers: int = 0, contribution: float = 0.0):
+        """Record a vectorized evaluation of a rule over a batch of claims"""
+        if calls == 0:
+            return
+        counter = self._counter(name)
+        counter.calls += calls
+        counter.total_seconds += seconds
+        counter.triggers += triggers
+        counter.contribution += contribution
+        counter.add_sample(seconds / calls)  # Per-claim latency of the batch
+
+    def reset(self):
+        self.counters = {}
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-rule stats, slowest cumulative time first"""
+        stats = {}
+        for name, counter in sorted(self.counters.items(), key=lambda item: -item[1].total_seconds):
+            quantiles = np.quantile(counter.samples, LATENCY_QUANTILES) if counter.samples else [0.0] * 3
+            stats[name] = {
+                "calls": counter.calls,
+                "total_ms": round(counter.total_seconds * 1000, 3),
+                "mean_us": round(counter.total_seconds / counter.calls * 1e6, 3) if counter.calls else 0.0,
+                "p50_us": round(float(quantiles[0]) * 1e6, 3),
+                "p95_us": round(float(quantiles[1]) * 1e6, 3),
+                "p99_us": round(float(quantiles[2]) * 1e6, 3)
+            }
+            if self.track_outcomes:
+                stats[name]["trigger_rate"] = round(counter.triggers / counter.calls, 4) if counter.calls else 0.0
+                stats[name]["avg_contribution"] = round(counter.contribution / counter.calls, 4) if counter.calls else 0.0
+        return stats
+
+    def to_prometheus(self) -> str:
+        """Stats in the Prometheus text exposition format"""
+        prefix, label = self.metric_prefix, self.label
+        lines = [
+            f"# HELP {prefix}_latency_seconds Evaluation latency per {label}",
+            f"# TYPE {prefix}_latency_seconds summary"
+        ]
+        for name, counter in self.counters.items():
+            if counter.samples:
+                for q, value in zip(LATENCY_QUANTILES, np.quantile(counter.samples, LATENCY_QUANTILES)):
+                    lines.append(f'{prefix}_latency_seconds{{{label}="{name}",quantile="{q}"}} {value:.9f}')
+            lines.append(f'{prefix}_latency_seconds_sum{{{label}="{name}"}} {counter.total_seconds:.9f}')
+            lines.append(f'{prefix}_latency_seconds_count{{{label}="{name}"}} {counter.calls}')
+
+        outcomes = (
+            ("triggers_total", f"Evaluations where the {label} exceeded its threshold", "triggers"),
+            ("contribution_total", f"Weighted score contributed by the {label}", "contribution")
+        )
+        for metric, help_text, attribute in outcomes if self.track_outcomes else ():
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, counter in self.counters.items():
+                lines.append(f'{prefix}_{metric}{{{label}="{name}"}} {getattr(counter, attribute)}')
+
+        return "\n".join(lines) + "\n"
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.reset()
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def snapshot(self) -> Dict[str, float]:
+        """Observation count and mean, with cumulative counts per upper bound"""
+        cumulative = np.cumsum(self.counts).tolist()
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "buckets": {f"le_{bound:g}": cumulative[i] for i, bound in enumerate(self.buckets)}
+        }
+
+    def to_prometheus(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = np.cumsum(self.counts).tolist()
+        for bound, count in zip(self.buckets, cumulative):
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.total:.9f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return "\n".join(lines) + "\n"
@@ -3,14 +3,71 @@ Advanced Rule-based Fraud Detection Engine
 Implements sophisticated corruption detection patterns for government procurement
 """
 
+import asyncio
+import gc
 import numpy as np
 import logging
+import time
+from bisect import insort
+from collections import deque
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import Any, Callable, List, Dict, Optional
+from dataclasses import dataclass, replace
+
+from claim_store import ClaimStore
+from evaluation_clock import SystemClock
+from rule_stats import RuleStats
+from claim_indexes import (
+    AreaAmountIndex, InvoiceHashIndex, InvoiceSimilarityIndex, VendorAmountIndex
+)
 
 logger = logging.getLogger(__name__)
 
+# Sliding window (in days) used for vendor submission frequency
+RECENT_SUBMISSION_DAYS = 30
+
+# Look-back horizon (in days) for comparing costs against similar projects
+COST_VARIANCE_HORIZON_DAYS = 730
+
+# Claims older than the longest rule window are evicted from history
+HISTORY_RETENTION_DAYS = COST_VARIANCE_HORIZON_DAYS
+
+# Expired claims removed from the indexes between event-loop yields
+EVICTION_BATCH_SIZE = 2000
+
+# Positional match ratio above which two invoice hashes count as near-duplicates
+HASH_SIMILARITY_THRESHOLD = 0.8
+
+# Final-score boundaries for risk levels (0-100)
+CRITICAL_RISK_SCORE = 85
+HIGH_RISK_SCORE = 70
+MEDIUM_RISK_SCORE = 40
+
+# Slack for floating-point summation order when proving early-exit bounds
+EARLY_EXIT_MARGIN = 1e-9
+
+# Amounts above which a project of this type looks like a phantom project
+AREA_RISK_THRESHOLDS = {
+    "IT Infrastructure": 2000000,
+    "Educational Technology": 1000000,
+    "Hospital Equipment": 5000000,
+    "Government Buildings": 10000000
+}
+
+def risk_level_for(score: int) -> str:
+    """Risk level for a 0-100 fraud score"""
+    if score >= CRITICAL_RISK_SCORE:
+        return "critical"
+    elif score >= HIGH_RISK_SCORE:
+        return "high"
+    elif score >= MEDIUM_RISK_SCORE:
+        return "medium"
+    return "low"
+
+def _final_score(total_score: float) -> int:
+    """0-100 fraud score for a weighted rule total"""
+    return min(100, max(0, int(total_score * 100)))
+
 @dataclass
 class FraudRule:
     name: str
@@ -28,14 +85,77 @@ class FraudScore:
     reasoning: str
     confidence: float
 
+@dataclass(frozen=True)
+class RuleCheck:
+    """Binds a scoring check to the rule definition that weights and flags it"""
+    name: str  # Key of the check's score in rule_scores
+    rule: str  # Rule definition supplying weight and threshold
+    flag: str
+    confidence: float  # Confidence contributed when the check flags
+    cost: int  # Relative evaluation cost; cheaper checks run first
+    min_score: float  # Output bounds of the check, used for early exit in classify_claim
+    max_score: float
+    evaluate: Callable[[Any, Any], float]  # (engine, claim) -> score
+    reason: Callable[[Any, float], str]  # (claim, score) -> reasoning text
+    evaluate_batch: Optional[Callable[[Any, List, np.ndarray], np.ndarray]] = None
+
+class EvaluationPlan:
+    """
+    Immutable evaluation plan compiled from rule definitions and the check registry
+    Zero-weight checks are dropped, the rest run cheapest first, and suffix sums
+    of each remaining check's weighted score bounds let classify_claim stop as
+    soon as the final risk band is decided. Engines swap plans with a single assignment.
+    """
+    
+    def __init__(self, rules: Dict[str, FraudRule], checks: Optional[List[RuleCheck]] = None):
+        checks = RULE_CHECKS if checks is None else checks
+        self.rules = dict(rules)
+        self.compiled_at = datetime.now()
+        
+        # Reporting order is the registry order; evaluation order is by cost
+        self.report_order = [c for c in checks if self.rules[c.rule].weight > 0]
+        self.steps = sorted(self.report_order, key=lambda c: c.cost)
+        self.weights = {c.name: self.rules[c.rule].weight for c in self.report_order}
+        self.thresholds = {c.name: self.rules[c.rule].threshold for c in self.report_order}
+        
+        # remaining_min[i] / remaining_max[i]: weighted bounds of steps[i:]
+        self.remaining_min = [0.0] * (len(self.steps) + 1)
+        self.remaining_max = [0.0] * (len(self.steps) + 1)
+        for i in range(len(self.steps) - 1, -1, -1):
+            step = self.steps[i]
+            self.remaining_min[i] = self.remaining_min[i + 1] + step.min_score * self.weights[step.name]
+            self.remaining_max[i] = self.remaining_max[i + 1] + step.max_score * self.weights[step.name]
+        
+        bound_rules = {c.rule for c in checks}
+        self.unbound_rules = [name for name in self.rules if name not in bound_rules]
+        self.skipped_checks = [c.name for c in checks if c not in self.report_order]
+    
+    def describe(self) -> Dict[str, Any]:
+        """Summary of the compiled plan for APIs and logs"""
+        return {
+            "evaluation_order": [step.name for step in self.steps],
+            "weights": self.weights,
+            "thresholds": self.thresholds,
+            "skipped_zero_weight": self.skipped_checks,
+            "rules_without_check": self.unbound_rules,
+            "compiled_at": self.compiled_at.isoformat()
+        }
+
 class FraudRulesEngine:
     """
     Comprehensive rule-based fraud detection system
     Implements real-world corruption patterns found in government procurement
     """
     
-    def __init__(self):
-        self.rules = {
+    def __init__(self, hash_similarity_bands: Optional[int] = None, clock=None):
+        """
+        hash_similarity_bands: number of bands for the near-duplicate invoice index.
+        None (default) guarantees every match is found; fewer bands are faster
+        but may miss near-duplicates.
+        clock: source of "now" for time-based rules (wall clock by default);
+        pass a ReplayClock to score historical claims as of their submission time.
+        """
+        rules = {
             # Financial Pattern Rules
             "cost_variance": FraudRule(
                 "Cost Variance", 0.25, 0.30, 
@@ -122,8 +242,20 @@ class FraudRulesEngine:
             )
         }
         
-        self.historical_claims = []
+        self.plan = EvaluationPlan(rules)
+        if self.plan.unbound_rules:
+            logger.info(f"Rules without a scoring check (not evaluated): {', '.join(self.plan.unbound_rules)}")
+        
+        self.clock = clock or SystemClock()
+        self.rule_stats = RuleStats()
+        self.historical_claims = ClaimStore()
         self.vendor_stats = {}
+        self.area_index = AreaAmountIndex(horizon_days=COST_VARIANCE_HORIZON_DAYS)
+        self.invoice_index = InvoiceHashIndex()
+        self.invoice_similarity_index = InvoiceSimilarityIndex(
+            threshold=HASH_SIMILARITY_THRESHOLD, bands=hash_similarity_bands
+        )
+        self.vendor_amount_index = VendorAmountIndex()
         self.market_rates = self._initialize_market_rates()
     
     def _initialize_market_rates(self) -> Dict[str, float]:
@@ -139,20 +271,117 @@ class FraudRulesEngine:
             "Educational Technology": 45000
         }
     
-    def add_historical_claim(self, claim):
-        """Add a claim to historical data"""
+    def add_historical_claim(self, claim) -> bool:
+        """
+        Add a claim to the columnar history store and update indexes
+        Returns False (and changes nothing) if the claim_id is already in history
+        """
+        if self.historical_claims.has_claim(claim.claim_id):
+            return False
+        
         self.historical_claims.append(claim)
         self._update_vendor_stats(claim)
+        self.area_index.add(claim.area, claim.amount, claim.timestamp)
+        self.invoice_index.add(claim.invoice_hash, claim.claim_id)
+        self.invoice_similarity_index.add(claim.invoice_hash, claim.claim_id)
+        self.vendor_amount_index.add(claim.vendor_id, claim.amount, claim.timestamp, claim.claim_id)
+        return True
+    
+    def rebuild_indexes(self):
+        """
+        Rebuild the claim indexes from the history store's columns
+        Used when the store was loaded or attached rather than ingested claim by claim.
+        """
+        # The indexes allocate hundreds of thousands of small lists and tuples, none
+        # of them garbage; pausing the collector avoids repeated full-heap passes
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._build_indexes(self.historical_claims)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    
+    def _build_indexes(self, store: ClaimStore):
+        self.area_index = AreaAmountIndex.from_columns(
+            store.area_codes, store.areas.values, store.amounts, store.timestamps,
+            horizon_days=COST_VARIANCE_HORIZON_DAYS
+        )
+        self.invoice_index = InvoiceHashIndex.from_columns(store.invoice_hashes, store.claim_ids)
+        self.invoice_similarity_index = InvoiceSimilarityIndex.from_columns(
+            store.invoice_hashes, store.claim_ids,
+            threshold=HASH_SIMILARITY_THRESHOLD, bands=self.invoice_similarity_index.bands
+        )
+        self.vendor_amount_index = VendorAmountIndex.from_columns(
+            store.vendor_codes, store.vendors.values, store.amounts, store.timestamps, store.claim_ids
+        )
+    
+    def evict_expired(self, now: Optional[datetime] = None) -> int:
+        """
+        Drop claims older than the retention horizon from history and the claim indexes
+        Vendor aggregates are lifetime running totals, so they are compacted (their
+        30-day windows trimmed) rather than dropped. Returns the number of claims evicted.
+        """
+        now = now or self.clock.now()
+        expired_rows = self._expired_rows(now)
+        self._unindex_rows(expired_rows)
+        self.historical_claims.remove_rows(expired_rows)
+        self._finish_eviction(now, len(expired_rows))
+        return len(expired_rows)
+    
+    async def evict_expired_in_background(self, now: Optional[datetime] = None,
+                                          batch_size: int = EVICTION_BATCH_SIZE) -> int:
+        """
+        evict_expired for an engine served from an event loop
+        Expired claims leave the indexes in batches that yield to the loop in
+        between, and the store's columns are compacted in a worker thread; the
+        loop only swaps in the result, carrying over claims ingested meanwhile.
+        Must not run concurrently with another eviction.
+        """
+        now = now or self.clock.now()
+        store = self.historical_claims
+        expired_rows = self._expired_rows(now)
+        
+        if len(expired_rows):
+            for start in range(0, len(expired_rows), batch_size):
+                self._unindex_rows(expired_rows[start:start + batch_size])
+                await asyncio.sleep(0)
+            store.swap_in(await asyncio.to_thread(store.compact, expired_rows, len(store)))
+        
+        self._finish_eviction(now, len(expired_rows))
+        return len(expired_rows)
+    
+    def _expired_rows(self, now: datetime) -> np.ndarray:
+        return self.historical_claims.rows_before(now - timedelta(days=HISTORY_RETENTION_DAYS))
+    
+    def _unindex_rows(self, rows: np.ndarray):
+        """Remove the claims at history rows from the claim indexes"""
+        store = self.historical_claims
+        for row in rows:
+            claim = store.record(row)
+            self.invoice_index.remove(claim.invoice_hash, claim.claim_id)
+            self.invoice_similarity_index.remove(claim.invoice_hash, claim.claim_id)
+            self.vendor_amount_index.remove(claim.vendor_id, claim.amount, claim.claim_id)
+    
+    def _finish_eviction(self, now: datetime, evicted: int):
+        self.area_index.expire(now)
+        for stats in self.vendor_stats.values():
+            self._refresh_recent_submissions(stats)
+        
+        if evicted:
+            logger.info(f"Evicted {evicted} claims older than {HISTORY_RETENTION_DAYS} days")
     
     def _update_vendor_stats(self, claim):
-        """Update vendor statistics with new claim"""
+        """Update vendor statistics with new claim in O(1) amortized time"""
         vendor_id = claim.vendor_id
         
         if vendor_id not in self.vendor_stats:
             self.vendor_stats[vendor_id] = {
                 'total_claims': 0,
                 'total_amount': 0,
+                'amount_m2': 0.0,  # Running sum of squared deviations (Welford)
                 'recent_submissions': 0,
+                'recent_window': deque(),  # Time-ordered submission timestamps
                 'success_rate': 0.5,
                 'avg_amount': 0,
                 'first_seen': claim.timestamp,
@@ -163,110 +392,150 @@ class FraudRulesEngine:
         stats = self.vendor_stats[vendor_id]
         stats['total_claims'] += 1
         stats['total_amount'] += claim.amount
+        delta = claim.amount - stats['avg_amount']
         stats['avg_amount'] = stats['total_amount'] / stats['total_claims']
+        stats['amount_m2'] += delta * (claim.amount - stats['avg_amount'])
+        stats['first_seen'] = min(stats['first_seen'], claim.timestamp)
         stats['last_seen'] = max(stats['last_seen'], claim.timestamp)
         stats['areas'].add(claim.area)
         
-        # Count recent submissions (last 30 days)
-        recent_count = sum(1 for c in self.historical_claims 
-                          if c.vendor_id == vendor_id and 
-                          (datetime.now() - c.timestamp).days <= 30)
-        stats['recent_submissions'] = recent_count
+        # Claims usually arrive in time order, so this is an append in practice
+        window = stats['recent_window']
+        if window and claim.timestamp < window[-1]:
+            insort(window, claim.timestamp)
+        else:
+            window.append(claim.timestamp)
+        self._refresh_recent_submissions(stats)
+    
+    def _refresh_recent_submissions(self, stats: Dict) -> int:
+        """Expire submissions older than the 30-day window and return the recent count"""
+        window = stats['recent_window']
+        cutoff = self.clock.now() - timedelta(days=RECENT_SUBMISSION_DAYS + 1)
+        while window and window[0] <= cutoff:
+            window.popleft()
+        
+        stats['recent_submissions'] = len(window)
+        return stats['recent_submissions']
+    
+    @property
+    def rules(self) -> Dict[str, FraudRule]:
+        """Rule definitions of the active evaluation plan"""
+        return self.plan.rules
+    
+    def update_rules(self, updates: Dict[str, Dict[str, float]]) -> EvaluationPlan:
+        """
+        Compile a new evaluation plan with updated rule weights/thresholds and swap it in
+        The swap is a single attribute assignment, so in-flight analyses finish on the
+        plan they started with. Raises ValueError for unknown rules or invalid values.
+        """
+        rules = dict(self.plan.rules)
+        for rule_name, changes in updates.items():
+            if rule_name not in rules:
+                raise ValueError(f"Unknown rule: {rule_name}")
+            unknown = set(changes) - {"weight", "threshold"}
+            if unknown:
+                raise ValueError(f"Unsupported fields for {rule_name}: {', '.join(sorted(unknown))}")
+            
+            values = {field: float(value) for field, value in changes.items()}
+            if any(value < 0 for value in values.values()):
+                raise ValueError(f"Weights and thresholds must be non-negative: {rule_name}")
+            rules[rule_name] = replace(rules[rule_name], **values)
+        
+        plan = EvaluationPlan(rules)
+        self.plan = plan
+        logger.info(f"Compiled new rule plan: {plan.describe()['evaluation_order']}")
+        return plan
     
     def analyze_claim(self, claim) -> FraudScore:
+        """Comprehensive fraud analysis using all available rules"""
+        plan = self.plan
+        rule_scores = {}
+        for step in plan.steps:
+            rule_scores[step.name] = self._evaluate_step(plan, step, claim)
+        return self._build_fraud_score(claim, rule_scores, plan)
+    
+    def classify_claim(self, claim) -> str:
+        """
+        Risk level of the rules-only score, with early exit
+        Evaluation stops as soon as every score the remaining checks could
+        produce falls in one risk band. Only the band is exact, so callers that
+        need the score or flags (e.g. hybrid scoring) must use analyze_claim.
+        """
+        plan = self.plan
+        rule_scores = {}
+        partial_score = 0.0
+        for i, step in enumerate(plan.steps):
+            lower_band = risk_level_for(_final_score(partial_score + plan.remaining_min[i] - EARLY_EXIT_MARGIN))
+            upper_band = risk_level_for(_final_score(partial_score + plan.remaining_max[i] + EARLY_EXIT_MARGIN))
+            if lower_band == upper_band:
+                return lower_band
+            rule_scores[step.name] = self._evaluate_step(plan, step, claim)
+            partial_score += rule_scores[step.name] * plan.weights[step.name]
+        
+        # Undecided until the end: total in reporting order, exactly as analyze_claim sums it
+        total_score = sum(rule_scores[check.name] * plan.weights[check.name] for check in plan.report_order)
+        return risk_level_for(_final_score(total_score))
+    
+    def _evaluate_step(self, plan: EvaluationPlan, step: RuleCheck, claim) -> float:
+        started = time.perf_counter()
+        score = step.evaluate(self, claim)
+        elapsed = time.perf_counter() - started
+        self.rule_stats.record(step.name, elapsed, score > plan.thresholds[step.name], score * plan.weights[step.name])
+        return score
+    
+    def analyze_claims(self, claims: List) -> List[FraudScore]:
         """
-        Comprehensive fraud analysis using all available rules
+        Batch fraud analysis, equivalent to calling analyze_claim on each claim
+        Rules that depend only on claim fields are evaluated as NumPy column
+        operations over the whole batch; history-based rules use the indexes.
         """
+        if not claims:
+            return []
+        
+        plan = self.plan
+        amounts = np.fromiter((c.amount for c in claims), dtype=float, count=len(claims))
+        
+        columns = {}
+        for step in plan.steps:
+            started = time.perf_counter()
+            if step.evaluate_batch is not None:
+                column = np.asarray(step.evaluate_batch(self, claims, amounts), dtype=float)
+            else:
+                column = np.array([step.evaluate(self, c) for c in claims], dtype=float)
+            elapsed = time.perf_counter() - started
+            
+            self.rule_stats.record_batch(
+                step.name, elapsed, len(claims),
+                int(np.count_nonzero(column > plan.thresholds[step.name])),
+                float(column.sum() * plan.weights[step.name])
+            )
+            columns[step.name] = column
+        
+        return [
+            self._build_fraud_score(claim, {name: float(column[i]) for name, column in columns.items()}, plan)
+            for i, claim in enumerate(claims)
+        ]
+    
+    def _build_fraud_score(self, claim, rule_scores: Dict[str, float], plan: EvaluationPlan) -> FraudScore:
+        """Turn per-rule scores into flags, reasoning and the final weighted score"""
         flags = []
         total_score = 0.0
         reasoning_parts = []
         confidence_factors = []
         
-        # Financial Pattern Analysis
-        cost_score = self._check_cost_variance(claim)
-        if cost_score > self.rules["cost_variance"].threshold:
-            flags.append("COST_VARIANCE")
-            reasoning_parts.append(f"Cost variance: {cost_score:.2f}")
-            confidence_factors.append(0.8)
-        total_score += cost_score * self.rules["cost_variance"].weight
-        
-        # Round numbers check
-        round_score = self._check_round_numbers(claim.amount)
-        if round_score > self.rules["round_numbers"].threshold:
-            flags.append("ROUND_NUMBERS")
-            reasoning_parts.append(f"Suspicious round amount: ₹{claim.amount:,.0f}")
-            confidence_factors.append(0.9)
-        total_score += round_score * self.rules["round_numbers"].weight
-        
-        # Price inflation check
-        inflation_score = self._check_price_inflation(claim)
-        if inflation_score > self.rules["price_inflation"].threshold:
-            flags.append("PRICE_INFLATION")
-            reasoning_parts.append("Prices above market rates")
-            confidence_factors.append(0.85)
-        total_score += inflation_score * self.rules["price_inflation"].weight
-        
-        # Budget maxing check
-        budget_score = self._check_budget_maxing(claim)
-        if budget_score > self.rules["budget_maxing"].threshold:
-            flags.append("BUDGET_MAXING")
-            reasoning_parts.append("Amount close to budget limit")
-            confidence_factors.append(0.75)
-        total_score += budget_score * self.rules["budget_maxing"].weight
-        
-        # Vendor analysis
-        vendor_score = self._check_vendor_patterns(claim)
-        if vendor_score > self.rules["vendor_pattern"].threshold:
-            flags.append("VENDOR_PATTERN")
-            reasoning_parts.append("Unusual vendor behavior")
-            confidence_factors.append(0.8)
-        total_score += vendor_score * self.rules["vendor_pattern"].weight
-        
-        # Shell company detection
-        shell_score = self._check_shell_company(claim)
-        if shell_score > self.rules["shell_company"].threshold:
-            flags.append("SHELL_COMPANY")
-            reasoning_parts.append("Shell company indicators")
-            confidence_factors.append(0.95)
-        total_score += shell_score * self.rules["shell_company"].weight
-        
-        # Timeline analysis
-        timeline_score = self._check_timeline_anomalies(claim)
-        if timeline_score > self.rules["after_hours"].threshold:
-            flags.append("TIMELINE_ANOMALY")
-            reasoning_parts.append("Suspicious timing")
-            confidence_factors.append(0.7)
-        total_score += timeline_score * self.rules["after_hours"].weight
-        
-        # Phantom project detection
-        phantom_score = self._check_phantom_project(claim)
-        if phantom_score > self.rules["phantom_project"].threshold:
-            flags.append("PHANTOM_PROJECT")
-            reasoning_parts.append("Possible phantom project")
-            confidence_factors.append(0.9)
-        total_score += phantom_score * self.rules["phantom_project"].weight
-        
-        # Duplicate detection
-        duplicate_score = self._check_duplicates(claim)
-        if duplicate_score > self.rules["duplicate_invoice"].threshold:
-            flags.append("DUPLICATE_INVOICE")
-            reasoning_parts.append("Similar invoice detected")
-            confidence_factors.append(0.95)
-        total_score += duplicate_score * self.rules["duplicate_invoice"].weight
+        for check in plan.report_order:
+            score = rule_scores[check.name]
+            if score > plan.thresholds[check.name]:
+                flags.append(check.flag)
+                reasoning_parts.append(check.reason(claim, score))
+                confidence_factors.append(check.confidence)
+            total_score += score * plan.weights[check.name]
         
         # Calculate final score and confidence
-        final_score = min(100, max(0, int(total_score * 100)))
+        final_score = _final_score(total_score)
         confidence = np.mean(confidence_factors) if confidence_factors else 0.5
         
-        # Determine risk level
-        if final_score >= 85:
-            risk_level = "critical"
-        elif final_score >= 70:
-            risk_level = "high"
-        elif final_score >= 40:
-            risk_level = "medium"
-        else:
-            risk_level = "low"
+        risk_level = risk_level_for(final_score)
         
         reasoning = "; ".join(reasoning_parts) if reasoning_parts else "No significant fraud indicators detected"
         
@@ -284,21 +553,18 @@ class FraudRulesEngine:
         if not self.historical_claims:
             return 0.1
         
-        # Find similar projects
-        similar_projects = [
-            c for c in self.historical_claims 
-            if c.area == claim.area and 
-            abs(c.amount - claim.amount) / max(claim.amount, 1) < 3.0 and
-            (datetime.now() - c.timestamp).days < 730  # Within 2 years
-        ]
+        # Similar projects: same area, within 3x of the claim amount, last 2 years
+        amount_band = 3.0 * max(claim.amount, 1)
+        similar_count, mean_amount, std_amount = self.area_index.window_stats(
+            claim.area,
+            claim.amount - amount_band,
+            claim.amount + amount_band,
+            self.clock.now()
+        )
         
-        if len(similar_projects) < 3:
+        if similar_count < 3:
             return 0.2
         
-        amounts = [p.amount for p in similar_projects]
-        mean_amount = np.mean(amounts)
-        std_amount = np.std(amounts)
-        
         if std_amount == 0:
             return 0.1
         
@@ -358,7 +624,8 @@ class FraudRulesEngine:
         """Check if invoice amount suspiciously maxes out budget"""
         # Simplified calculation - in production would use actual budget data
         estimated_budget = claim.amount * 1.1  # Assume budget is 10% higher
-        utilization = claim.amount / estimated_budget
+        # A zero amount carries no utilization signal
+        utilization = claim.amount / estimated_budget if estimated_budget else 0.0
         
         if utilization > 0.99:
             return 0.95
@@ -377,11 +644,12 @@ class FraudRulesEngine:
             return 0.6  # New vendor, moderate risk
         
         stats = self.vendor_stats[vendor_id]
+        recent_submissions = self._refresh_recent_submissions(stats)
         
         # Check submission frequency
-        if stats['recent_submissions'] > 8:  # More than 8 in 30 days
+        if recent_submissions > 8:  # More than 8 in 30 days
             return 0.85
-        elif stats['recent_submissions'] > 5:
+        elif recent_submissions > 5:
             return 0.7
         
         # Check success rate (too high is suspicious)
@@ -395,7 +663,7 @@ class FraudRulesEngine:
             return 0.5
         
         # Check vendor age (very new vendors are risky)
-        vendor_age_days = (datetime.now() - stats['first_seen']).days
+        vendor_age_days = (self.clock.now() - stats['first_seen']).days
         if vendor_age_days < 30:
             return 0.7
         elif vendor_age_days < 90:
@@ -422,7 +690,7 @@ class FraudRulesEngine:
             shell_indicators += 1
         
         # Very new vendor with large claim
-        vendor_age = (datetime.now() - stats['first_seen']).days
+        vendor_age = (self.clock.now() - stats['first_seen']).days
         if vendor_age < 60 and claim.amount > 500000:
             shell_indicators += 1
         
@@ -477,15 +745,8 @@ class FraudRulesEngine:
             phantom_score += 0.3
         
         # Extremely high amounts for certain project types
-        area_risk_thresholds = {
-            "IT Infrastructure": 2000000,
-            "Educational Technology": 1000000,
-            "Hospital Equipment": 5000000,
-            "Government Buildings": 10000000
-        }
-        
-        if claim.area in area_risk_thresholds:
-            if claim.amount > area_risk_thresholds[claim.area]:
+        if claim.area in AREA_RISK_THRESHOLDS:
+            if claim.amount > AREA_RISK_THRESHOLDS[claim.area]:
                 phantom_score += 0.4
         
         # Generic project descriptions (would analyze invoice_hash in real implementation)
@@ -505,21 +766,16 @@ class FraudRulesEngine:
             return 0.05
         
         # Check for exact invoice hash matches
-        exact_matches = [
-            c for c in self.historical_claims 
-            if c.invoice_hash == claim.invoice_hash and c.claim_id != claim.claim_id
-        ]
-        
-        if exact_matches:
+        if self.invoice_index.has_duplicate(claim.invoice_hash, claim.claim_id):
             return 0.98
         
-        # Check for similar amounts from same vendor
+        # Check for similar amounts (within ±1000) from same vendor
         similar_amounts = [
-            c for c in self.historical_claims 
-            if c.vendor_id == claim.vendor_id and 
-            abs(c.amount - claim.amount) < 1000 and
-            c.claim_id != claim.claim_id and
-            (claim.timestamp - c.timestamp).days < 365
+            claim_id for _, timestamp, claim_id in self.vendor_amount_index.in_range(
+                claim.vendor_id, claim.amount - 1000, claim.amount + 1000
+            )
+            if claim_id != claim.claim_id and
+            (claim.timestamp - timestamp).days < 365
         ]
         
         if len(similar_amounts) > 3:
@@ -527,14 +783,8 @@ class FraudRulesEngine:
         elif len(similar_amounts) > 1:
             return 0.5
         
-        # Check for hash similarity (simplified)
-        similar_hashes = [
-            c for c in self.historical_claims 
-            if self._calculate_hash_similarity(claim.invoice_hash, c.invoice_hash) > 0.8 and
-            c.claim_id != claim.claim_id
-        ]
-        
-        if len(similar_hashes) > 0:
+        # Check for near-duplicate hashes (>80% positional match)
+        if self.invoice_similarity_index.has_similar(claim.invoice_hash, claim.claim_id):
             return 0.7
         
         return 0.05
@@ -550,6 +800,82 @@ class FraudRulesEngine:
         matches = sum(1 for a, b in zip(hash1, hash2) if a == b)
         return matches / len(hash1)
     
+    # ------------------------------------------------------------------
+    # Vectorized rule variants used by analyze_claims
+    # Each must produce exactly the scores of its scalar _check_* method
+    # ------------------------------------------------------------------
+    
+    def _round_number_scores(self, amounts: np.ndarray) -> np.ndarray:
+        """Vectorized _check_round_numbers"""
+        magnitude = np.abs(np.trunc(amounts))
+        scores = np.full(len(amounts), 0.05)
+        
+        # Ascending so the roundest matching level wins, like the elif chain
+        for zeros, score in ((2, 0.3), (3, 0.6), (4, 0.8), (5, 0.95)):
+            scores[self._trailing_zeros_mask(magnitude, zeros)] = score
+        return scores
+    
+    @staticmethod
+    def _trailing_zeros_mask(magnitude: np.ndarray, zeros: int) -> np.ndarray:
+        """Whether str(int(amount)) ends with `zeros` zeros"""
+        unit = 10.0 ** zeros
+        return (magnitude >= unit) & (np.fmod(magnitude, unit) == 0)
+    
+    def _price_inflation_scores(self, claims: List, amounts: np.ndarray) -> np.ndarray:
+        """Vectorized _check_price_inflation"""
+        rates = np.array([self.market_rates.get(c.area, np.nan) for c in claims], dtype=float)
+        estimated_cost = rates * 100
+        
+        scores = np.select(
+            [amounts > estimated_cost * 2, amounts > estimated_cost * 1.5, amounts > estimated_cost * 1.2],
+            [0.9, 0.7, 0.4],
+            default=0.1
+        )
+        scores[np.isnan(rates)] = 0.2  # Unknown area, moderate suspicion
+        return scores
+    
+    def _budget_maxing_scores(self, amounts: np.ndarray) -> np.ndarray:
+        """Vectorized _check_budget_maxing"""
+        estimated_budgets = amounts * 1.1
+        utilization = np.divide(amounts, estimated_budgets, out=np.zeros_like(amounts), where=estimated_budgets != 0)
+        return np.select(
+            [utilization > 0.99, utilization > 0.95, utilization > 0.90],
+            [0.95, 0.8, 0.5],
+            default=0.1
+        )
+    
+    def _timeline_anomaly_scores(self, timestamps: List[datetime]) -> np.ndarray:
+        """Vectorized _check_timeline_anomalies"""
+        count = len(timestamps)
+        hours = np.fromiter((t.hour for t in timestamps), dtype=int, count=count)
+        weekdays = np.fromiter((t.weekday() for t in timestamps), dtype=int, count=count)
+        months = np.fromiter((t.month for t in timestamps), dtype=int, count=count)
+        days = np.fromiter((t.day for t in timestamps), dtype=int, count=count)
+        
+        holiday = ((months == 12) & ((days == 25) | (days == 26))) | ((months == 1) & (days == 1))
+        
+        # Same accumulation order as the scalar rule
+        scores = np.zeros(count)
+        scores += np.where((hours < 8) | (hours > 18), 0.4, 0.0)
+        scores += np.where(weekdays >= 5, 0.3, 0.0)
+        scores += np.where((hours < 6) | (hours > 22), 0.3, 0.0)
+        scores += np.where(holiday, 0.4, 0.0)
+        return np.minimum(0.95, scores)
+    
+    def _phantom_project_scores(self, claims: List, amounts: np.ndarray) -> np.ndarray:
+        """Vectorized _check_phantom_project"""
+        limits = np.array([AREA_RISK_THRESHOLDS.get(c.area, np.inf) for c in claims], dtype=float)
+        short_invoice = np.fromiter((len(c.invoice_hash) < 20 for c in claims), dtype=bool, count=len(claims))
+        new_vendor = np.fromiter((c.vendor_id not in self.vendor_stats for c in claims), dtype=bool, count=len(claims))
+        very_round = self._trailing_zeros_mask(np.abs(np.trunc(amounts)), 5)
+        
+        scores = np.zeros(len(claims))
+        scores += np.where(very_round, 0.3, 0.0)
+        scores += np.where(amounts > limits, 0.4, 0.0)
+        scores += np.where(short_invoice, 0.2, 0.0)
+        scores += np.where(new_vendor & (amounts > 1000000), 0.3, 0.0)
+        return np.minimum(0.95, scores)
+    
     def get_rule_explanations(self) -> Dict[str, Dict[str, str]]:
         """Get detailed explanations of all fraud detection rules"""
         explanations = {}
@@ -596,13 +922,13 @@ class FraudRulesEngine:
         risk_score = 0
         
         # Age factor
-        vendor_age_days = (datetime.now() - stats['first_seen']).days
+        vendor_age_days = (self.clock.now() - stats['first_seen']).days
         if vendor_age_days < 90:
             risk_factors.append("Very new vendor")
             risk_score += 30
         
         # Frequency factor
-        if stats['recent_submissions'] > 5:
+        if self._refresh_recent_submissions(stats) > 5:
             risk_factors.append("High submission frequency")
             risk_score += 25
         
@@ -616,11 +942,10 @@ class FraudRulesEngine:
             risk_factors.append("Limited business diversification")
             risk_score += 15
         
-        # Amount volatility
-        vendor_claims = [c for c in self.historical_claims if c.vendor_id == vendor_id]
-        if len(vendor_claims) > 2:
-            amounts = [c.amount for c in vendor_claims]
-            volatility = np.std(amounts) / np.mean(amounts)
+        # Amount volatility (population std / mean from running aggregates)
+        if stats['total_claims'] > 2:
+            amount_std = np.sqrt(stats['amount_m2'] / stats['total_claims'])
+            volatility = amount_std / stats['avg_amount']
             if volatility > 1.5:
                 risk_factors.append("High amount volatility")
                 risk_score += 20
@@ -651,4 +976,72 @@ class FraudRulesEngine:
                 "first_seen": stats['first_seen'].isoformat(),
                 "last_seen": stats['last_seen'].isoformat()
             }
-        }
\ No newline at end of file
+        }
+
+# ================================================================================
+# Check registry: reporting order of flags and reasoning follows this list
+# ================================================================================
+
+RULE_CHECKS = [
+    RuleCheck(
+        "cost_variance", "cost_variance", "COST_VARIANCE", 0.8, cost=3,
+        min_score=0.1, max_score=0.95,
+        evaluate=FraudRulesEngine._check_cost_variance,
+        reason=lambda claim, score: f"Cost variance: {score:.2f}"
+    ),
+    RuleCheck(
+        "round_numbers", "round_numbers", "ROUND_NUMBERS", 0.9, cost=1,
+        min_score=0.05, max_score=0.95,
+        evaluate=lambda engine, claim: engine._check_round_numbers(claim.amount),
+        reason=lambda claim, score: f"Suspicious round amount: ₹{claim.amount:,.0f}",
+        evaluate_batch=lambda engine, claims, amounts: engine._round_number_scores(amounts)
+    ),
+    RuleCheck(
+        "price_inflation", "price_inflation", "PRICE_INFLATION", 0.85, cost=1,
+        min_score=0.1, max_score=0.9,
+        evaluate=FraudRulesEngine._check_price_inflation,
+        reason=lambda claim, score: "Prices above market rates",
+        evaluate_batch=FraudRulesEngine._price_inflation_scores
+    ),
+    RuleCheck(
+        "budget_maxing", "budget_maxing", "BUDGET_MAXING", 0.75, cost=1,
+        min_score=0.1, max_score=0.95,
+        evaluate=FraudRulesEngine._check_budget_maxing,
+        reason=lambda claim, score: "Amount close to budget limit",
+        evaluate_batch=lambda engine, claims, amounts: engine._budget_maxing_scores(amounts)
+    ),
+    RuleCheck(
+        "vendor_pattern", "vendor_pattern", "VENDOR_PATTERN", 0.8, cost=2,
+        min_score=0.15, max_score=0.85,
+        evaluate=FraudRulesEngine._check_vendor_patterns,
+        reason=lambda claim, score: "Unusual vendor behavior"
+    ),
+    RuleCheck(
+        "shell_company", "shell_company", "SHELL_COMPANY", 0.95, cost=2,
+        min_score=0.1, max_score=0.9,
+        evaluate=FraudRulesEngine._check_shell_company,
+        reason=lambda claim, score: "Shell company indicators"
+    ),
+    RuleCheck(
+        "timeline", "after_hours", "TIMELINE_ANOMALY", 0.7, cost=1,
+        min_score=0.0, max_score=0.95,
+        evaluate=FraudRulesEngine._check_timeline_anomalies,
+        reason=lambda claim, score: "Suspicious timing",
+        evaluate_batch=lambda engine, claims, amounts: engine._timeline_anomaly_scores(
+            [c.timestamp for c in claims]
+        )
+    ),
+    RuleCheck(
+        "phantom_project", "phantom_project", "PHANTOM_PROJECT", 0.9, cost=1,
+        min_score=0.0, max_score=0.95,
+        evaluate=FraudRulesEngine._check_phantom_project,
+        reason=lambda claim, score: "Possible phantom project",
+        evaluate_batch=FraudRulesEngine._phantom_project_scores
+    ),
+    RuleCheck(
+        "duplicate_invoice", "duplicate_invoice", "DUPLICATE_INVOICE", 0.95, cost=3,
+        min_score=0.05, max_score=0.98,
+        evaluate=FraudRulesEngine._check_duplicates,
+        reason=lambda claim, score: "Similar invoice detected"
+    )
+]
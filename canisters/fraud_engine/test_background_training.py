@@ -0,0 +1,77 @@
+"""
+Unit tests for background ML retraining
+
+To run: `pytest test_background_training.py`
+"""
+
+import asyncio
+import os
+import runpy
+
+from background_training import BackgroundTrainer
+from claim_store import ClaimStore
+from ml_detector import MLFraudDetector
+from test_rules_engine import make_claims
+
+def test_retrain_runs_off_the_event_loop_and_swaps_models(tmp_path):
+    store = ClaimStore.from_claims(make_claims(300, seed=171))
+    labels = [i % 8 == 0 for i in range(len(store))]
+    probes = make_claims(20, seed=172)
+    swaps = []
+
+    serving = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    serving.train(store, [i % 10 == 0 for i in range(len(store))])
+    old_artifact = serving.artifact
+
+    async def on_swap():
+        await asyncio.sleep(0)
+        swaps.append(serving.artifact)
+
+    trainer = BackgroundTrainer(serving, on_swap=on_swap)
+
+    async def run():
+        job = trainer.start(store, labels)
+        assert trainer.start(store, labels) is job  # One job at a time
+
+        # The loop keeps serving while the worker process fits models
+        ticks = 0
+        while job.active:
+            serving.predict_fraud_probability(probes[0], store)
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await trainer.wait(job.job_id)
+        return job, ticks
+
+    job, ticks = asyncio.run(run())
+    assert job.status == "succeeded", job.error
+    assert ticks > 1
+    assert job.artifact == serving.artifact != old_artifact
+    assert swaps == [job.artifact]
+    assert trainer.jobs[job.job_id].to_dict()["status"] == "succeeded"
+
+    reference = MLFraudDetector(model_dir=str(tmp_path / "reference"))
+    reference.train(store, labels)
+    assert serving.predict_fraud_probability_many(probes, store).tolist() == \
+        reference.predict_fraud_probability_many(probes, store).tolist()
+
+def test_failed_retrain_keeps_serving_models(tmp_path):
+    store = ClaimStore.from_claims(make_claims(300, seed=173))
+    serving = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    serving.train(store, [i % 10 == 0 for i in range(len(store))])
+    artifact = serving.artifact
+
+    async def run():
+        job = BackgroundTrainer(serving).start(store, [])  # Label count mismatch
+        while job.active:
+            await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert serving.artifact == artifact and serving.is_trained
+
+def test_retrain_children_do_not_start_another_service():
+    # Retrain processes are spawned, re-running the service's __main__ module as __mp_main__
+    namespace = runpy.run_path(os.path.join(os.path.dirname(__file__), "main.py"), run_name="__mp_main__")
+    assert namespace["model_retrainer"] is None
+    assert namespace["fraud_service"] is None
@@ -0,0 +1,44 @@
+"""
+Unit tests for multi-process bulk re-scoring
+
+To run: `pytest test_bulk_rescore.py`
+"""
+
+import os
+import random
+import runpy
+from datetime import timedelta
+
+from bulk_rescore import _result, bulk_rescore
+from evaluation_clock import ReplayClock
+from ml_detector import MLFraudDetector
+from rules_engine import FraudRulesEngine
+from test_rules_engine import make_claims
+
+def _score(engine, detector, claim):
+    probability = detector.predict_fraud_probability(claim, engine.historical_claims)
+    return _result(claim, engine.analyze_claim(claim), probability)
+
+def test_sharded_rescore_matches_sequential_scoring(tmp_path):
+    history = sorted(make_claims(120, seed=121), key=lambda c: c.timestamp)
+    clock = ReplayClock(history[-1].timestamp + timedelta(days=1))
+    engine = FraudRulesEngine(clock=clock)
+    for claim in history:
+        engine.add_historical_claim(claim)
+    detector = MLFraudDetector(clock=clock, model_dir=str(tmp_path / "models"))
+    rng = random.Random(4)
+    detector.train(engine.historical_claims, [rng.random() < 0.2 for _ in history])
+
+    expected = [_score(engine, detector, claim) for claim in engine.historical_claims]
+    assert bulk_rescore(engine, detector, workers=2, chunk_size=50) == expected
+
+    probes = make_claims(10, seed=122)
+    for claim in probes:
+        claim.claim_id += 1000
+    expected = [_score(engine, detector, claim) for claim in probes]
+    assert bulk_rescore(engine, detector, probes, workers=2, chunk_size=4) == expected
+
+def test_spawned_workers_do_not_start_the_service():
+    # Spawned workers re-run the service's __main__ module as __mp_main__
+    namespace = runpy.run_path(os.path.join(os.path.dirname(__file__), "main.py"), run_name="__mp_main__")
+    assert namespace["fraud_service"] is None
@@ -0,0 +1,72 @@
+"""
+Unit tests for fraud engine state snapshots
+
+To run: `pytest test_engine_snapshot.py`
+"""
+
+import random
+from datetime import timedelta
+
+import numpy as np
+
+from engine_snapshot import capture_snapshot, load_snapshot, save_snapshot, write_snapshot
+from ml_detector import MLFraudDetector
+from rules_engine import FraudRulesEngine
+from test_rules_engine import make_claims
+
+def test_snapshot_round_trip_restores_scoring_state(tmp_path):
+    engine = FraudRulesEngine()
+    for claim in make_claims(300):
+        claim.timestamp -= timedelta(days=claim.claim_id % 3 * 365)
+        engine.add_historical_claim(claim)
+    engine.update_rules({"round_numbers": {"weight": 0.2}})
+
+    detector = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    rng = random.Random(3)
+    detector.train(engine.historical_claims, [rng.random() < 0.2 for _ in range(len(engine.historical_claims))])
+    assert detector.is_trained
+
+    save_snapshot(str(tmp_path / "snapshots"), engine, detector)
+    restored_engine, restored_detector = load_snapshot(str(tmp_path / "snapshots"))
+
+    store, restored_store = engine.historical_claims, restored_engine.historical_claims
+    assert list(restored_store) == list(store)
+    assert restored_engine.rules["round_numbers"].weight == 0.2
+
+    probes = make_claims(50, seed=5)
+    for claim in probes:
+        claim.claim_id += 1000
+        assert restored_engine.analyze_claim(claim) == engine.analyze_claim(claim)
+        assert restored_detector.predict_fraud_probability(claim, restored_store) == \
+            detector.predict_fraud_probability(claim, store)
+
+    # Memory-mapped columns stay usable for ingestion and eviction
+    for claim in probes:
+        assert restored_engine.add_historical_claim(claim)
+        engine.add_historical_claim(claim)
+    assert restored_engine.evict_expired() == engine.evict_expired()
+    assert np.array_equal(restored_engine.historical_claims.amounts, engine.historical_claims.amounts)
+
+def test_captured_snapshot_is_written_as_of_capture(tmp_path):
+    engine = FraudRulesEngine(hash_similarity_bands=2)
+    claims = make_claims(200)
+    for claim in claims[:150]:
+        engine.add_historical_claim(claim)
+    detector = MLFraudDetector(model_dir=str(tmp_path / "models"))
+
+    captured = capture_snapshot(engine, detector)
+    for claim in claims[150:]:
+        engine.add_historical_claim(claim)
+    write_snapshot(str(tmp_path / "snapshots"), captured)
+
+    restored_engine, _ = load_snapshot(str(tmp_path / "snapshots"))
+    assert list(restored_engine.historical_claims) == list(engine.historical_claims)[:150]
+    assert restored_engine.invoice_similarity_index.bands == 2
+    late = claims[150]
+    assert not restored_engine.invoice_index.has_duplicate(late.invoice_hash, -1)
+    assert sum(s["total_claims"] for s in restored_engine.vendor_stats.values()) == 150
+
+def test_missing_or_partial_snapshot_falls_back(tmp_path):
+    assert load_snapshot(str(tmp_path)) is None
+    (tmp_path / "CURRENT").write_text("snapshot-missing")
+    assert load_snapshot(str(tmp_path)) is None
@@ -0,0 +1,240 @@
+"""
+Unit tests for the ML fraud detector's feature extraction
+
+To run: `pytest test_ml_detector.py`
+"""
+
+import warnings
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from claim_store import ClaimStore
+from ml_detector import MLFraudDetector
+from rules_engine import FraudRulesEngine
+from test_rules_engine import make_claims
+
+def _scan_features(claim, history):
+    """Reference history features computed by scanning every stored claim"""
+    amounts = np.array([c.amount for c in history])
+    vendor_claims = [c for c in history if c.vendor_id == claim.vendor_id]
+    features = {
+        "amount_zscore": (claim.amount - amounts.mean()) / (amounts.std() + 1e-8),
+        "vendor_submissions_count": len(vendor_claims),
+        "area_frequency": sum(1 for c in history if c.area == claim.area)
+    }
+    if vendor_claims:
+        first = min(c.timestamp for c in vendor_claims)
+        last = max(c.timestamp for c in vendor_claims)
+        features.update({
+            "vendor_age_days": min((claim.timestamp - first).days, 3650),
+            "vendor_avg_amount": np.mean([c.amount for c in vendor_claims]),
+            "vendor_area_diversity": len({c.area for c in vendor_claims}),
+            "time_since_last_submission": min((claim.timestamp - last).days, 730.0),
+            "days_since_first_claim": (claim.timestamp - first).days
+        })
+    else:
+        features.update({
+            "vendor_age_days": 0.0, "vendor_avg_amount": claim.amount, "vendor_area_diversity": 1,
+            "time_since_last_submission": 365.0, "days_since_first_claim": 0
+        })
+    return features
+
+def _assert_features_match_scan(detector, store, probes):
+    history = list(store)
+    columns = detector.feature_columns
+    for claim in probes:
+        vector = detector.prepare_features(claim, store).flatten()
+        for name, expected in _scan_features(claim, history).items():
+            assert vector[columns.index(name)] == pytest.approx(expected, rel=1e-9), name
+
+def test_feature_aggregates_match_history_scan_through_ingest_and_eviction(tmp_path):
+    detector = MLFraudDetector()
+    engine = FraudRulesEngine()
+    for claim in make_claims(600, seed=131):
+        claim.timestamp -= timedelta(days=claim.claim_id % 3 * 365)
+        engine.add_historical_claim(claim)
+    store = engine.historical_claims
+
+    probes = make_claims(60, seed=132)
+    for i, claim in enumerate(probes):
+        claim.claim_id += 1000
+        if i % 5 == 0:
+            claim.vendor_id = f"vendor_new_{i}"
+    _assert_features_match_scan(detector, store, probes)
+
+    assert engine.evict_expired() > 0
+    _assert_features_match_scan(detector, store, probes)
+
+    store.save(str(tmp_path / "claims"))
+    _assert_features_match_scan(detector, ClaimStore.load(str(tmp_path / "claims")), probes)
+
+def test_empty_history_features_are_defaults():
+    detector = MLFraudDetector()
+    claim = make_claims(1, seed=133)[0]
+    vector = detector.prepare_features(claim, ClaimStore()).flatten()
+    assert vector[detector.feature_columns.index("amount_zscore")] == 0
+    assert vector[detector.feature_columns.index("time_since_last_submission")] == 365.0
+
+def test_feature_matrix_matches_per_row_features_exactly():
+    detector = MLFraudDetector()
+    claims = make_claims(700, seed=141)
+    for i, claim in enumerate(claims):
+        if i % 9 == 0:
+            claim.amount = float((i % 7) * 10 ** (i % 6))  # Round amounts, including zero
+        if i % 13 == 0:
+            claim.invoice_hash = claim.invoice_hash[:-2] + "xy"
+        if i % 17 == 0:
+            claim.area = "Unlisted Area"
+    # Near-duplicates of the similarity window in the rest of the history
+    for i in range(0, 600, 7):
+        claims[i].invoice_hash = claims[650 + i % 50].invoice_hash
+    store = ClaimStore.from_claims(claims)
+
+    expected = np.vstack([detector.prepare_features(claim, store) for claim in store])
+    assert np.array_equal(detector.prepare_feature_matrix(store), expected)
+
+def test_duplicate_similarity_of_zero_amounts_has_no_nan():
+    detector = MLFraudDetector()
+    claims = make_claims(10, seed=143)
+    for claim in claims:
+        claim.amount = 0.0
+    store = ClaimStore.from_claims(claims)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        expected = [detector._calculate_duplicate_similarity(claim, store) for claim in store]
+        column = detector._duplicate_similarity_column(store)
+    assert column.tolist() == expected
+    assert min(expected) >= 0.4  # Equal (zero) amounts are fully similar
+
+def test_batch_prediction_matches_single_claim_prediction(tmp_path):
+    detector = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    store = ClaimStore.from_claims(make_claims(300, seed=151))
+    labels = [i % 10 == 0 for i in range(len(store))]
+    probes = make_claims(40, seed=152)
+
+    assert np.array_equal(detector.predict_fraud_probability_many(probes, store), np.full(len(probes), 0.5))
+
+    detector.train(store, labels)
+    expected = [detector.predict_fraud_probability(claim, store) for claim in probes]
+    assert detector.predict_fraud_probability_many(probes, store).tolist() == pytest.approx(expected, abs=1e-12)
+    assert detector.predict_fraud_probability_many([], store).shape == (0,)
+
+def test_model_artifacts_are_versioned_memory_mapped_and_hot_swapped(tmp_path):
+    store = ClaimStore.from_claims(make_claims(300, seed=161))
+    labels = [i % 10 == 0 for i in range(len(store))]
+    probes = make_claims(20, seed=162)
+
+    trainer = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    trainer.train(store, labels)
+    first = trainer.artifact
+    assert (tmp_path / "models" / "CURRENT").read_text() == first
+
+    server = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    assert server.load_models()
+    assert server.artifact == first
+    assert isinstance(server.scaler.center_, np.memmap)
+    before = server.predict_fraud_probability_many(probes, store)
+    assert before.tolist() == trainer.predict_fraud_probability_many(probes, store).tolist()
+
+    # A new artifact only reaches the server when it swaps to the pointer
+    trainer.train(store, [i % 7 == 0 for i in range(len(store))])
+    assert trainer.artifact != first
+    assert server.predict_fraud_probability_many(probes, store).tolist() == before.tolist()
+    assert server.load_models()
+    assert server.artifact == trainer.artifact
+    assert server.predict_fraud_probability_many(probes, store).tolist() == \
+        trainer.predict_fraud_probability_many(probes, store).tolist()
+
+    for _ in range(3):
+        trainer.train(store, labels)
+    artifacts = [p.name for p in (tmp_path / "models").iterdir() if p.name.startswith("model-")]
+    assert len(artifacts) == 3 and trainer.artifact in artifacts
+
+def test_load_models_without_artifact_keeps_detector_untrained(tmp_path):
+    detector = MLFraudDetector(model_dir=str(tmp_path / "missing"))
+    assert not detector.load_models()
+    assert not detector.is_trained
+
+def test_online_detector_scores_without_batch_training_and_tracks_ingest(tmp_path):
+    import joblib
+
+    claims = make_claims(400, seed=181)
+    store = ClaimStore.from_claims(claims[:300])
+    detector = MLFraudDetector()
+    online = detector.enable_online_learning(store, window_size=128)
+    assert online.ready and online.windows_completed == 2 and online.window_fill == 44
+    assert not detector.is_trained and detector.can_predict
+
+    probes = make_claims(30, seed=182)
+    typical = detector.predict_fraud_probability_many(probes, store)
+    for claim in probes:
+        claim.amount *= 1000
+    inflated = detector.predict_fraud_probability_many(probes, store)
+    assert inflated.mean() > typical.mean()
+    assert detector.predict_fraud_probability(probes[0], store) == inflated[0]
+
+    # Per-claim updates complete a window after bounded, fixed-size buffering
+    for claim in claims[300:384]:
+        detector.observe(claim, store)
+        store.append(claim)
+    assert online.windows_completed == 3 and online.window_fill == 0
+
+    # Restored (memory-mapped) detectors keep learning
+    joblib.dump(online, tmp_path / "online.joblib")
+    restored = joblib.load(tmp_path / "online.joblib", mmap_mode="r")
+    restored.learn_one(np.ones(len(detector.feature_columns)))
+    assert restored.window_fill == 1
+    assert np.array_equal(restored.score_many(np.ones((1, 20))), online.score_many(np.ones((1, 20))))
+
+def test_path_contributions_sum_to_classifier_probability(tmp_path):
+    store = ClaimStore.from_claims(make_claims(300, seed=191))
+    detector = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    detector.train(store, [i % 6 == 0 for i in range(len(store))])
+    probes = make_claims(25, seed=192)
+
+    explanations = detector.explain_predictions(probes, store)
+    assert [e["claim_id"] for e in explanations] == [c.claim_id for c in probes]
+    assert explanations[3] == detector.explain_prediction(probes[3], store)  # Served from cache
+    assert len(detector._explanations) == len(probes)
+
+    features = np.vstack([detector.prepare_features(claim, store) for claim in probes])
+    scaled = detector.scaler.transform(features)
+    flat = detector._compiled_models(detector.models).classifier
+    contributions = flat.contributions(scaled)
+    expected = detector.classification_model.predict_proba(scaled)[:, 1]
+    assert np.allclose(flat.bias + contributions.sum(axis=1), expected, atol=1e-12)
+
+    for explanation, row in zip(explanations, contributions):
+        factors = explanation["top_factors"]
+        assert [f["contribution"] for f in factors] == sorted((f["contribution"] for f in factors), reverse=True)
+        for factor in factors:
+            assert factor["contribution"] == round(row[detector.feature_columns.index(factor["feature"])], 3)
+
+    # Retraining swaps the model set and invalidates cached attributions
+    detector.train(store, [i % 5 == 0 for i in range(len(store))])
+    detector.explain_prediction(probes[0], store)
+    assert len(detector._explanations) == 1
+
+def test_compiled_models_match_sklearn_scores_exactly(tmp_path):
+    store = ClaimStore.from_claims(make_claims(400, seed=201))
+    detector = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    detector.train(store, [i % 7 == 0 for i in range(len(store))])
+    probes = make_claims(200, seed=202)
+    for i, claim in enumerate(probes):
+        claim.amount *= 10 ** (i % 4)  # Reach sparse regions of the trees
+
+    features = np.vstack([detector.prepare_features(claim, store) for claim in probes])
+    models = detector.models
+    compiled = detector._compiled_models(models)
+    scaled = models.scaler.transform(features)
+    assert np.array_equal(compiled.transform(features), scaled)
+    assert np.array_equal(compiled.anomaly.decision_function(scaled), models.anomaly_model.decision_function(scaled))
+    assert np.array_equal(compiled.classifier.predict(scaled), models.classification_model.predict_proba(scaled)[:, 1])
+
+    fast = detector.predict_fraud_probability_many(probes, store)
+    detector.use_compiled_models = False
+    assert np.array_equal(detector.predict_fraud_probability_many(probes, store), fast)
+    assert detector.predict_fraud_probability(probes[0], store) == fast[0]
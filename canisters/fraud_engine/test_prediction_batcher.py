@@ -0,0 +1,55 @@
+"""
+Unit tests for ML prediction micro-batching
+
+To run: `pytest test_prediction_batcher.py`
+"""
+
+import asyncio
+
+from claim_store import ClaimStore
+from ml_detector import MLFraudDetector
+from prediction_batcher import PredictionBatcher
+from test_rules_engine import make_claims
+
+def test_concurrent_predictions_share_batched_model_calls(tmp_path):
+    store = ClaimStore.from_claims(make_claims(300, seed=211))
+    detector = MLFraudDetector(model_dir=str(tmp_path / "models"))
+    detector.train(store, [i % 9 == 0 for i in range(len(store))])
+    probes = make_claims(50, seed=212)
+
+    calls = []
+    def predict_many(claims, historical_data):
+        calls.append(len(claims))
+        return detector.predict_fraud_probability_many(claims, historical_data)
+
+    batcher = PredictionBatcher(predict_many, max_batch_size=16, max_wait_ms=50)
+
+    async def run():
+        results = await asyncio.gather(*(batcher.predict(claim, store) for claim in probes))
+        # A lone request is released by the wait deadline, not a full batch
+        single = await batcher.predict(probes[0], store)
+        batcher.close()
+        return results, single
+
+    results, single = asyncio.run(run())
+    assert results == [detector.predict_fraud_probability(claim, store) for claim in probes]
+    assert single == results[0]
+    assert calls == [16, 16, 16, 2, 1]
+
+    stats = batcher.snapshot()
+    assert stats["batch_size"]["count"] == 5 and stats["queued"] == 0
+    assert stats["batch_size"]["buckets"]["le_2"] == 2
+    assert stats["queue_depth"]["count"] == 51
+    assert 'fraud_ml_batcher_batch_size_bucket{le="+Inf"} 5' in batcher.to_prometheus()
+
+def test_prediction_failure_reaches_every_caller():
+    def predict_many(claims, historical_data):
+        raise RuntimeError("model unavailable")
+
+    batcher = PredictionBatcher(predict_many, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict(claim, None) for claim in make_claims(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
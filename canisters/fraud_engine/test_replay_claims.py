@@ -0,0 +1,88 @@
+"""
+Unit tests for the claim-stream replay tool
+
+To run: `pytest test_replay_claims.py`
+"""
+
+import csv
+import json
+from dataclasses import asdict
+
+from replay_claims import ClaimReplay, main, read_claims, replay
+from test_rules_engine import make_claims
+
+def _write_claims(tmp_path):
+    claims = sorted(make_claims(300, seed=111), key=lambda c: c.timestamp)
+    rows = []
+    for claim in claims:
+        row = asdict(claim)
+        del row["vendor_history"]
+        row["timestamp"] = claim.timestamp.isoformat()
+        rows.append(row)
+
+    ndjson_path = tmp_path / "claims.ndjson"
+    ndjson_path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    csv_path = tmp_path / "claims.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return claims, ndjson_path, csv_path
+
+def test_csv_and_ndjson_streams_parse_identically(tmp_path):
+    claims, ndjson_path, csv_path = _write_claims(tmp_path)
+    parsed = list(read_claims(str(ndjson_path)))
+    assert parsed == list(read_claims(str(csv_path)))
+    assert [c.claim_id for c, _ in parsed] == [c.claim_id for c in claims]
+    assert all(label is None for _, label in parsed)
+
+def test_replay_is_reproducible_and_reports_stages(tmp_path):
+    _, ndjson_path, _ = _write_claims(tmp_path)
+
+    runs = []
+    for run in range(2):
+        scores_path = tmp_path / f"scores_{run}.ndjson"
+        main([str(ndjson_path), "--warmup", "100", "--scores", str(scores_path),
+              "--report", str(tmp_path / f"report_{run}.json"), "--model-dir", str(tmp_path / f"models_{run}")])
+        runs.append(scores_path.read_text().splitlines())
+    assert runs[0] == runs[1]
+    assert len(runs[0]) == 200
+
+    report = json.loads((tmp_path / "report_0.json").read_text())
+    assert report["claims_scored"] == 200
+    assert report["warmup_claims"] == 100
+    assert set(report["stages"]) == {"rules", "ml", "llm", "ingest"}
+    assert report["claims_per_second"] > 0
+    assert report["peak_rss_mb"] > 0
+    # Unlabelled warm-up claims only need a risk band, so expensive rules may be skipped
+    assert 200 <= report["rules"]["duplicate_invoice"]["calls"] < 300
+    assert (tmp_path / "models_0" / "CURRENT").exists()
+
+def test_replay_never_saves_into_the_service_model_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    replay_engine = ClaimReplay(warmup_claims=100)
+    claims = sorted(make_claims(150, seed=113), key=lambda c: c.timestamp)
+    replay(((c, None) for c in claims), replay_engine)
+    assert replay_engine.ml_detector.is_trained
+    assert not (tmp_path / "models").exists()
+
+def test_replay_without_warmup_uses_neutral_ml_score():
+    replay_engine = ClaimReplay(warmup_claims=0)
+    claims = sorted(make_claims(50, seed=112), key=lambda c: c.timestamp)
+    report = replay(((c, None) for c in claims), replay_engine)
+    assert report["claims_scored"] == 50
+    assert not replay_engine.ml_detector.is_trained
+
+def test_replay_learns_new_claims_online_like_the_service():
+    replay_engine = ClaimReplay(warmup_claims=100)
+    claims = sorted(make_claims(150, seed=114), key=lambda c: c.timestamp)
+    replay(((c, None) for c in claims), replay_engine)
+
+    online_model = replay_engine.ml_detector.online_model
+    learned = lambda: online_model.windows_completed * online_model.window_size + online_model.window_fill
+    assert learned() == 150  # Seeded with the warm-up history, then each scored claim
+
+    # A resubmitted claim_id is scored but neither stored nor learned again
+    assert replay_engine.process(claims[-1]) is not None
+    assert learned() == 150
+    assert len(replay_engine.rules_engine.historical_claims) == 150
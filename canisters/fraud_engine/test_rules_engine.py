@@ -0,0 +1,412 @@
+"""
+Unit tests for the rule-based fraud detection engine
+
+These tests exercise FraudRulesEngine directly and do not need the service running.
+To run: `pytest test_rules_engine.py`
+"""
+
+import asyncio
+import random
+import warnings
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Dict
+
+import numpy as np
+import pytest
+
+import claim_indexes
+from evaluation_clock import ReplayClock
+from rules_engine import FraudRulesEngine
+
+AREAS = [
+    "Road Construction", "School Building", "Hospital Equipment",
+    "IT Infrastructure", "Water Supply", "Public Transport",
+    "Government Buildings", "Educational Technology"
+]
+
+@dataclass
+class Claim:
+    claim_id: int
+    vendor_id: str
+    amount: float
+    budget_id: int
+    allocation_id: int
+    invoice_hash: str
+    deputy_id: str
+    area: str
+    timestamp: datetime
+    vendor_history: Optional[Dict] = None
+
+def make_claims(count: int, seed: int = 7):
+    """Generate demo-style claims spread over the last year"""
+    rng = random.Random(seed)
+    base_date = datetime.now() - timedelta(days=365)
+    return [
+        Claim(
+            claim_id=i,
+            vendor_id=f"vendor_{rng.randint(0, 9)}",
+            amount=rng.choice([rng.uniform(50000, 5000000), float(rng.randint(1, 50) * 100000)]),
+            budget_id=rng.randint(1, 10),
+            allocation_id=rng.randint(0, 5),
+            invoice_hash=f"hash_{i}_{rng.randint(1000, 9999)}",
+            deputy_id=f"deputy_{rng.randint(1, 15)}",
+            area=rng.choice(AREAS),
+            timestamp=base_date + timedelta(days=rng.randint(0, 365), hours=rng.randint(0, 23))
+        )
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def engine():
+    engine = FraudRulesEngine()
+    for claim in make_claims(300):
+        engine.add_historical_claim(claim)
+    return engine
+
+def test_vendor_stats_match_full_history_scan(engine):
+    """Incremental vendor aggregates must agree with a scan over all history"""
+    now = datetime.now()
+    for vendor_id, stats in engine.vendor_stats.items():
+        vendor_claims = [c for c in engine.historical_claims if c.vendor_id == vendor_id]
+        amounts = [c.amount for c in vendor_claims]
+
+        assert stats['total_claims'] == len(vendor_claims)
+        assert stats['avg_amount'] == pytest.approx(np.mean(amounts))
+        assert np.sqrt(stats['amount_m2'] / stats['total_claims']) == pytest.approx(np.std(amounts))
+        assert stats['first_seen'] == min(c.timestamp for c in vendor_claims)
+        assert stats['last_seen'] == max(c.timestamp for c in vendor_claims)
+        assert stats['areas'] == {c.area for c in vendor_claims}
+
+        recent = sum(1 for c in vendor_claims if (now - c.timestamp).days <= 30)
+        assert engine._refresh_recent_submissions(stats) == recent
+
+def test_vendor_risk_profile_reports_statistics(engine):
+    profile = engine.get_vendor_risk_profile("vendor_1")
+    assert profile["vendor_id"] == "vendor_1"
+    assert profile["statistics"]["total_claims"] == engine.vendor_stats["vendor_1"]['total_claims']
+    assert engine.get_vendor_risk_profile("vendor_unknown")["risk_level"] == "unknown"
+
+def _scan_cost_variance(engine, claim):
+    """Reference cost-variance rule computed by scanning all history"""
+    similar = [
+        c.amount for c in engine.historical_claims
+        if c.area == claim.area and
+        abs(c.amount - claim.amount) / max(claim.amount, 1) < 3.0 and
+        (datetime.now() - c.timestamp).days < 730
+    ]
+    if len(similar) < 3:
+        return 0.2
+    std_amount = np.std(similar)
+    if std_amount == 0:
+        return 0.1
+    z_score = abs(claim.amount - np.mean(similar)) / std_amount
+    if z_score > 3:
+        return 0.95
+    elif z_score > 2.5:
+        return 0.8
+    elif z_score > 2:
+        return 0.6
+    elif z_score > 1.5:
+        return 0.3
+    return 0.1
+
+def test_cost_variance_index_matches_history_scan(monkeypatch):
+    # Small merge threshold so both sorted and pending entries are exercised
+    monkeypatch.setattr(claim_indexes._AmountBucket, "MERGE_THRESHOLD", 4)
+    engine = FraudRulesEngine()
+    # Spread history over three years so the 2-year horizon expires buckets
+    for claim in make_claims(2000, seed=11):
+        claim.timestamp -= timedelta(days=claim.claim_id % 3 * 365)
+        engine.add_historical_claim(claim)
+
+    for claim in make_claims(200, seed=12):
+        assert engine._check_cost_variance(claim) == _scan_cost_variance(engine, claim)
+
+def test_cost_variance_of_tight_cluster_of_large_amounts(monkeypatch):
+    monkeypatch.setattr(claim_indexes._AmountBucket, "MERGE_THRESHOLD", 4)
+    engine = FraudRulesEngine()
+    claims = make_claims(40, seed=13)
+    for i, claim in enumerate(claims):
+        claim.area = "Road Construction"
+        claim.amount = 1e9 + (i % 5) * 0.25  # std of a few tenths on a billion
+        engine.add_historical_claim(claim)
+
+    count, mean, std = engine.area_index.window_stats("Road Construction", 0.0, 4e9, engine.clock.now())
+    amounts = [claim.amount for claim in claims]
+    assert count == len(amounts)
+    assert std == pytest.approx(np.std(amounts), rel=1e-6)
+
+    probe = make_claims(1, seed=14)[0]
+    probe.area, probe.amount = "Road Construction", 1e9 + 5.0
+    assert engine._check_cost_variance(probe) == _scan_cost_variance(engine, probe) == 0.95
+
+def _scan_duplicates(engine, claim):
+    """Reference duplicate-invoice rule computed by scanning all history"""
+    if not engine.historical_claims:
+        return 0.05
+    if any(c.invoice_hash == claim.invoice_hash and c.claim_id != claim.claim_id
+           for c in engine.historical_claims):
+        return 0.98
+    similar_amounts = [
+        c for c in engine.historical_claims
+        if c.vendor_id == claim.vendor_id and
+        abs(c.amount - claim.amount) < 1000 and
+        c.claim_id != claim.claim_id and
+        (claim.timestamp - c.timestamp).days < 365
+    ]
+    if len(similar_amounts) > 3:
+        return 0.8
+    elif len(similar_amounts) > 1:
+        return 0.5
+    if any(engine._calculate_hash_similarity(claim.invoice_hash, c.invoice_hash) > 0.8 and
+           c.claim_id != claim.claim_id for c in engine.historical_claims):
+        return 0.7
+    return 0.05
+
+def test_duplicate_indexes_match_history_scan():
+    engine = FraudRulesEngine()
+    history = make_claims(1000, seed=21)
+    for claim in history:
+        # Cluster amounts so the vendor amount-range lookups find matches
+        claim.amount = float(round(claim.amount, -4))
+        engine.add_historical_claim(claim)
+
+    probes = make_claims(150, seed=22)
+    for i, claim in enumerate(probes):
+        claim.claim_id += 5000
+        claim.amount = float(round(claim.amount, -4)) + (i % 3) * 400
+        if i % 5 == 0:
+            claim.invoice_hash = history[i].invoice_hash
+        elif i % 5 == 1:
+            claim.invoice_hash = history[i].invoice_hash[:-1] + "x"
+
+    for claim in probes + history[:50]:
+        assert engine._check_duplicates(claim) == _scan_duplicates(engine, claim)
+
+def test_invoice_similarity_index_finds_every_near_duplicate():
+    rng = random.Random(31)
+    alphabet = "0123456789abcdef"
+    corpus = ["".join(rng.choice(alphabet) for _ in range(rng.choice([16, 32]))) for _ in range(500)]
+    index = claim_indexes.InvoiceSimilarityIndex(threshold=0.8)
+    for claim_id, invoice_hash in enumerate(corpus):
+        index.add(invoice_hash, claim_id)
+
+    engine = FraudRulesEngine()
+    for i in range(300):
+        # Mutate 0-6 positions of a stored hash, or draw a fresh one
+        probe = list(corpus[i]) if i % 4 else [rng.choice(alphabet) for _ in range(16)]
+        for position in rng.sample(range(len(probe)), rng.randint(0, 6)):
+            probe[position] = rng.choice(alphabet)
+        probe = "".join(probe)
+
+        expected = any(
+            engine._calculate_hash_similarity(probe, other) > 0.8
+            for other in corpus
+        )
+        assert index.has_similar(probe, -1) == expected
+
+def test_indexes_rebuilt_from_columns_match_ingested_indexes():
+    engine = FraudRulesEngine()
+    history = make_claims(1200, seed=23)
+    for i, claim in enumerate(history):
+        claim.timestamp -= timedelta(days=i % 4 * 300)
+        if i % 9 == 0:
+            claim.invoice_hash = history[i // 2].invoice_hash
+        engine.add_historical_claim(claim)
+    engine.evict_expired()
+
+    rebuilt = FraudRulesEngine()
+    rebuilt.historical_claims = engine.historical_claims
+    rebuilt.vendor_stats = engine.vendor_stats
+    rebuilt.rebuild_indexes()
+    assert rebuilt.invoice_index.claim_ids == engine.invoice_index.claim_ids
+    assert rebuilt.vendor_amount_index.vendors == engine.vendor_amount_index.vendors
+
+    probes = make_claims(200, seed=24)
+    for i, claim in enumerate(probes):
+        claim.claim_id += 5000
+        if i % 2:
+            claim.invoice_hash = history[i * 5].invoice_hash[:-2] + "xy"
+    assert [rebuilt.analyze_claim(c) for c in probes] == [engine.analyze_claim(c) for c in probes]
+
+def test_batch_scoring_matches_scalar_path(engine):
+    claims = make_claims(400, seed=41)
+    for i, claim in enumerate(claims):
+        claim.claim_id += 10000
+        if i % 7 == 0:
+            claim.vendor_id = f"vendor_new_{i}"
+        if i % 11 == 0:
+            claim.amount = float((i + 1) * 10 ** (i % 6))
+        if i % 13 == 0:
+            claim.area = "Unlisted Area"
+            claim.invoice_hash = f"{claim.invoice_hash}_with_long_description"
+        if i % 17 == 0:
+            claim.timestamp = claim.timestamp.replace(month=12, day=25, hour=23)
+
+    assert engine.analyze_claims(claims) == [engine.analyze_claim(c) for c in claims]
+    assert engine.analyze_claims([]) == []
+
+def test_batch_scoring_matches_scalar_path_for_zero_amounts(engine):
+    claims = make_claims(20, seed=42)
+    for i, claim in enumerate(claims):
+        claim.claim_id += 10000
+        claim.amount = 0.0
+        if i % 2:
+            claim.vendor_id = f"vendor_new_{i}"
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        scores = engine.analyze_claims(claims)
+    assert scores == [engine.analyze_claim(c) for c in claims]
+    assert engine._check_budget_maxing(claims[0]) == 0.1
+    assert engine._budget_maxing_scores(np.zeros(3)).tolist() == [0.1] * 3
+
+def test_history_dedupes_claim_ids_and_evicts_past_retention():
+    engine = FraudRulesEngine()
+    history = make_claims(1500, seed=51)
+    for claim in history:
+        claim.timestamp -= timedelta(days=claim.claim_id % 3 * 365)
+        claim.amount = float(round(claim.amount, -4))
+        assert engine.add_historical_claim(claim)
+    assert not engine.add_historical_claim(history[0])
+    totals = {v: s['total_claims'] for v, s in engine.vendor_stats.items()}
+
+    cutoff = datetime.now() - timedelta(days=730)
+    expected = sum(1 for c in history if c.timestamp <= cutoff)
+    assert engine.evict_expired() == expected
+    assert len(engine.historical_claims) == len(history) - expected
+    assert all(c.timestamp > cutoff for c in engine.historical_claims)
+    # Vendor aggregates keep lifetime totals
+    assert {v: s['total_claims'] for v, s in engine.vendor_stats.items()} == totals
+
+    for claim in make_claims(100, seed=52) + history[:100]:
+        claim.amount = float(round(claim.amount, -4))
+        assert engine._check_duplicates(claim) == _scan_duplicates(engine, claim)
+        assert engine._check_cost_variance(claim) == _scan_cost_variance(engine, claim)
+
+def test_background_eviction_keeps_claims_ingested_meanwhile():
+    history = make_claims(1500, seed=53)
+    for claim in history:
+        claim.timestamp -= timedelta(days=claim.claim_id % 3 * 365)
+    late = make_claims(300, seed=54)
+    for claim in late:
+        claim.claim_id += 5000
+
+    background, reference = FraudRulesEngine(), FraudRulesEngine()
+    for claim in history:
+        background.add_historical_claim(claim)
+        reference.add_historical_claim(claim)
+
+    async def run():
+        async def ingest():
+            for claim in late:
+                background.add_historical_claim(claim)
+                await asyncio.sleep(0)
+        evicted, _ = await asyncio.gather(background.evict_expired_in_background(batch_size=50), ingest())
+        return evicted
+
+    evicted = asyncio.run(run())
+    assert evicted == reference.evict_expired() > 0
+    for claim in late:
+        reference.add_historical_claim(claim)
+
+    store, expected = background.historical_claims, reference.historical_claims
+    assert list(store) == list(expected)
+    assert [store.has_claim(c.claim_id) for c in history + late] == \
+        [expected.has_claim(c.claim_id) for c in history + late]
+    assert store.features.amount_stats() == pytest.approx(expected.features.amount_stats())
+    probes = make_claims(100, seed=55)
+    for claim in probes:
+        claim.claim_id += 10000
+    assert background.analyze_claims(probes) == reference.analyze_claims(probes)
+
+def test_plan_runs_cheap_checks_first_and_skips_zero_weight(engine):
+    engine.update_rules({"shell_company": {"weight": 0}})
+    plan = engine.plan
+    costs = [step.cost for step in plan.steps]
+    assert costs == sorted(costs)
+    assert "shell_company" in plan.skipped_checks
+    assert "shell_company" not in [step.name for step in plan.steps]
+
+    for claim in make_claims(50, seed=61):
+        assert "SHELL_COMPANY" not in engine.analyze_claim(claim).flags
+
+def test_classify_claim_matches_full_analysis_band(engine, monkeypatch):
+    claims = make_claims(400, seed=71)
+    for i, claim in enumerate(claims):
+        claim.claim_id += 20000
+        if i % 3 == 0:
+            claim.amount = float((i % 50 + 1) * 10 ** 7)
+            claim.timestamp = claim.timestamp.replace(hour=23)
+            claim.area = "Unlisted Area"
+
+    evaluated = []
+    evaluate_step = engine._evaluate_step
+    monkeypatch.setattr(engine, "_evaluate_step", lambda *args: evaluated.append(1) or evaluate_step(*args))
+    for claim in claims:
+        assert engine.classify_claim(claim) == engine.analyze_claim(claim).risk_level
+    # analyze_claim evaluates every step, so any shortfall is classify_claim exiting early
+    assert len(evaluated) < 2 * len(claims) * len(engine.plan.steps)
+
+def test_rule_update_swaps_plan_and_validates(engine):
+    claim = make_claims(1, seed=81)[0]
+    before = engine.analyze_claim(claim)
+    old_plan = engine.plan
+
+    engine.update_rules({"round_numbers": {"weight": 0.5, "threshold": 0.0}})
+    assert engine.plan is not old_plan
+    assert engine.rules["round_numbers"].weight == 0.5
+    assert old_plan.rules["round_numbers"].weight == 0.15
+    assert "ROUND_NUMBERS" in engine.analyze_claim(claim).flags
+
+    with pytest.raises(ValueError):
+        engine.update_rules({"no_such_rule": {"weight": 1.0}})
+    with pytest.raises(ValueError):
+        engine.update_rules({"round_numbers": {"severity": 1.0}})
+    engine.plan = old_plan
+    assert engine.analyze_claim(claim) == before
+
+def test_rule_stats_count_evaluations_and_triggers(engine):
+    engine.rule_stats.reset()
+    claims = make_claims(60, seed=91)
+    scores = [engine.analyze_claim(c) for c in claims]
+    engine.analyze_claims(claims)
+
+    stats = engine.rule_stats.snapshot()
+    assert set(stats) == {step.name for step in engine.plan.steps}
+    assert all(s["calls"] == 120 for s in stats.values())
+    flagged = sum("ROUND_NUMBERS" in s.flags for s in scores)
+    assert stats["round_numbers"]["trigger_rate"] == round(2 * flagged / 120, 4)
+
+    text = engine.rule_stats.to_prometheus()
+    assert 'fraud_rule_latency_seconds_count{rule="round_numbers"} 120' in text
+    assert f'fraud_rule_triggers_total{{rule="round_numbers"}} {2 * flagged}' in text
+
+def test_replay_clock_scores_claims_as_of_submission():
+    history = sorted(make_claims(400, seed=101), key=lambda c: c.timestamp)
+    # Shift a year back: wall-clock scoring would now see every vendor as old and inactive
+    for claim in history:
+        claim.timestamp -= timedelta(days=365)
+
+    def replay():
+        clock = ReplayClock()
+        engine = FraudRulesEngine(clock=clock)
+        scores = []
+        for claim in history:
+            clock.advance_to(claim.timestamp)
+            scores.append(engine.analyze_claim(claim))
+            engine.add_historical_claim(claim)
+        return engine, scores
+
+    engine, scores = replay()
+    assert replay()[1] == scores
+
+    # As of the last claim, recent-submission windows count the final 30 days of the replay
+    cutoff = history[-1].timestamp - timedelta(days=31)
+    for vendor_id, stats in engine.vendor_stats.items():
+        recent = sum(1 for c in history if c.vendor_id == vendor_id and c.timestamp > cutoff)
+        assert engine._refresh_recent_submissions(stats) == recent
+
+    with pytest.raises(ValueError):
+        engine.clock.advance_to(history[0].timestamp)
@@ -0,0 +1,141 @@
+"""
+Flattened Tree Ensembles
+Nodes of every tree in a fitted scikit-learn forest concatenated into flat
+NumPy arrays, so whole batches can be routed through all trees at once
+
+Leaves point back to themselves with an infinite threshold, so every row
+takes exactly max_depth steps with no per-row branching. Scores reproduce
+sklearn's own arithmetic (float32 split inputs, trees summed in order), so
+the sklearn estimators remain the reference and these are drop-in evaluators.
+"""
+
+from typing import Iterator, List, Optional
+
+import numpy as np
+from sklearn.ensemble._iforest import _average_path_length
+
+class FlatTreeEnsemble:
+    """
+    One flat node table for a list of fitted sklearn trees
+    value holds the per-node quantity being predicted or attributed (for
+    classifiers, the positive-class probability of the node's samples).
+    feature_maps, when given, map each tree's feature indices to columns of X.
+    """
+
+    def __init__(self, trees: List, values: List[np.ndarray], feature_maps: Optional[List[np.ndarray]] = None):
+        features, thresholds, lefts, rights, missing_left = [], [], [], [], []
+        roots = []
+        offset = 0
+        for i, tree in enumerate(trees):
+            nodes = np.arange(offset, offset + tree.node_count)
+            leaf = tree.children_left == -1
+            left = np.where(leaf, nodes, tree.children_left + offset)
+            right = np.where(leaf, nodes, tree.children_right + offset)
+            feature = np.where(leaf, 0, tree.feature)
+            if feature_maps is not None:
+                feature = np.asarray(feature_maps[i])[feature]
+
+            features.append(feature)
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(left)
+            rights.append(right)
+            missing_left.append(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8)))
+            roots.append(offset)
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features).astype(np.int64)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.left = np.concatenate(lefts).astype(np.int64)
+        self.right = np.concatenate(rights).astype(np.int64)
+        self.missing_left = np.concatenate(missing_left).astype(bool)
+        self.value = np.concatenate(values).astype(np.float64)
+        self.roots = np.array(roots, dtype=np.int64)
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+    @classmethod
+    def from_classifier(cls, model, positive_class=1) -> "FlatTreeEnsemble":
+        """Flatten a fitted forest classifier with node values = P(positive_class)"""
+        column = list(model.classes_).index(positive_class)
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        values = []
+        for tree in trees:
+            counts = tree.value[:, 0, :]
+            values.append(counts[:, column] / counts.sum(axis=1))
+        return cls(trees, values)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _walk(self, X: np.ndarray) -> Iterator[tuple]:
+        """(node, child) index arrays of shape (rows, trees) for every level of descent"""
+        # sklearn evaluates splits on float32 inputs
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.repeat(self.roots[None], len(X), axis=0)
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+            child = np.where(go_left, self.left[node], self.right[node])
+            yield node, child
+            node = child
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf reached in every tree, shape (rows, trees)"""
+        node = np.repeat(self.roots[None], len(X), axis=0)
+        for _, node in self._walk(X):
+            pass
+        return node
+
+    def leaf_sum(self, X: np.ndarray) -> np.ndarray:
+        """Sum of leaf values over trees, added tree by tree as sklearn does"""
+        leaf_values = self.value[self.apply(X)]
+        return np.cumsum(leaf_values, axis=1)[:, -1]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Mean leaf value per row (predict_proba[:, positive] for classifiers)"""
+        return self.leaf_sum(X) / self.n_trees
+
+    @property
+    def bias(self) -> float:
+        """Mean root value: the baseline that path contributions move away from"""
+        return float(self.value[self.roots].mean())
+
+    def contributions(self, X: np.ndarray) -> np.ndarray:
+        """
+        Path-based (Saabas) attribution for a batch of rows
+        Returns a (rows, features) array where bias + contributions.sum(axis=1)
+        equals the mean leaf value reached by each row.
+        """
+        n_rows, n_features = X.shape
+        totals = np.zeros(n_rows * n_features)
+        row_offsets = (np.arange(n_rows) * n_features)[:, None]
+        for node, child in self._walk(X):
+            # Each split credits the change in node value to the feature it tested
+            delta = self.value[child] - self.value[node]
+            totals += np.bincount(
+                (row_offsets + self.feature[node]).ravel(), weights=delta.ravel(),
+                minlength=n_rows * n_features
+            )
+        return totals.reshape(n_rows, n_features) / self.n_trees
+
+class FlatIsolationForest:
+    """IsolationForest.decision_function over a flattened ensemble"""
+
+    def __init__(self, model):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        # Leaf value: path length to the leaf plus the expected depth of its unsplit samples
+        values = [
+            path_lengths + average_lengths - 1.0
+            for path_lengths, average_lengths in zip(model._decision_path_lengths, model._average_path_length_per_tree)
+        ]
+        subsampled = model._max_features != model.n_features_in_
+        self.ensemble = FlatTreeEnsemble(trees, values, model.estimators_features_ if subsampled else None)
+        self.denominator = len(trees) * _average_path_length([model._max_samples])
+        self.offset = model.offset_
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        depths = self.ensemble.leaf_sum(X)
+        # For a single training sample, denominator and depth are 0 and the score is 1
+        scores = 2 ** (-np.divide(depths, self.denominator, out=np.ones_like(depths), where=self.denominator != 0))
+        return -scores - self.offset